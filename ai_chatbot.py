@@ -9,12 +9,22 @@ Date: 2024-07-25
 
 import os
 from pathlib import Path
-import re
-from time import sleep
+import uuid
+import asyncio
 import helpers as helpers
+from tts_pipeline import TtsPipeline
+from chat_engine import ChatEngine
+from history_writer import HistoryWriter
+from history_store import create_history_store, NEW_CHAT
+from text_normalizer import StreamNormalizer, strip_unwanted_chars
 import keyboard
 import threading
-from langchain_core.messages import HumanMessage, AIMessage
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable
+from chat_memory import ChatMemory, get_token_counter
+from resilient_worker import ResilientWorker
+from speculation import Speculation, Speculator
+from tracing import TRACER, CURRENT_TURN, TurnTrace, current_turn
 
 # import config
 from config_loader import get_config
@@ -57,32 +67,147 @@ class AiChatbot:
         self.recording = False
         self.exit_chat = {'value': False}  # use a dict to pass flag by reference to helpers
 
-        # thread object to handle chat tasks
-        self.chat_thread = None
+        # chat history writer, running on a background thread
+        self.session_id = uuid.uuid4().hex
+        self.history = HistoryWriter(create_history_store(CHAT_HISTORY_CSV))
 
-        # chat history
-        self.messages = []
+        # asyncio engine running the chat stages
+        self.engine = ChatEngine(self)
+
+        # chat history sent to the LLM, bounded by a token budget. The tokenizer loads in the background.
+        self.memory = ChatMemory(
+            token_budget=config['history_token_budget'],
+            count_tokens=get_token_counter(config['openai_model'], background=True),
+            summarize=helpers.build_summarizer() if config['history_summary'] else None,
+        )
 
         # chat settings (can be overridden by command line arguments)
         self.input_method = config['input_method']
         self.language = config['chat_language']
 
-        # langchain worker (chain or agent)
+        # langchain worker (chain or agent), or the future of a worker built in the background
         self.worker = None
+        self.worker_future = None
+        # function building the worker, called again when the config is reloaded
+        self.build_worker = None
+
+        # speculative answers on partial transcripts, created when a voice chat starts
+        self.speculator = None
+
+    @property
+    def messages(self) -> list:
+        ''' Chat history within token budget '''
+        return self.memory.messages
 
-    def create_worker_chain(self) -> None:
-        ''' Create langchain chain '''
+    def create_worker_chain(self, background: bool = False) -> None:
+        ''' Create langchain chain
+
+        Args:
+            background (bool): if true, build the chain on a background thread while the chat starts
+        '''
 
-        self.worker = helpers.build_chain()
+        self.create_worker(helpers.build_chain, background)
 
-    def create_worker_agent(self, placeholders: list[str] = None) -> None:
+    def create_worker_agent(self, placeholders: list[str] = None, background: bool = False) -> None:
         ''' Create langchain agent
 
         Args:
             placeholders (list[str]): optional list of placeholder variables added to the prompt
+            background (bool): if true, build the agent on a background thread while the chat starts
+        '''
+
+        self.create_worker(lambda: helpers.build_agent(placeholders), background)
+
+    def create_worker(self, build: Callable[[], Any], background: bool = False) -> None:
+        '''Create the langchain worker, wrapped in the response cache if enabled.
+
+        Args:
+            build (Callable[[], Any]): function returning the chain or agent
+            background (bool): if true, build the worker on a background thread, the first turn waits for it
+        '''
+
+        self.build_worker = build
+
+        if not background:
+            self.worker = self.cache_worker(build())
+            return
+
+        self.worker_future = Future()
+
+        def build_worker() -> None:
+            # importing langchain and building the worker takes a moment, the user can start typing meanwhile
+            try:
+                self.worker_future.set_result(self.cache_worker(build()))
+            except BaseException as e:
+                LOG.error(f'Error building worker: {e}')
+                self.worker_future.set_exception(e)
+
+        threading.Thread(target=build_worker, daemon=True).start()
+
+    def rebuild_worker(self) -> Any:
+        ''' Returns a new worker built from the current config, when it is reloaded '''
+        return self.cache_worker(self.build_worker())
+
+    def swap_worker(self, worker: Any) -> None:
+        '''Replace the worker between turns, turns in progress keep the worker they started with.
+
+        Args:
+            worker (Any): the new worker
+        '''
+
+        self.worker = worker
+
+        if self.speculator:
+            # answers requested with the previous worker are dropped
+            self.speculator.cancel()
+
+    def check_config(self, new_config: dict) -> None:
+        '''Check a reloaded config can be used by the running chat.
+
+        Args:
+            new_config (dict): the new config
+
+        Raises:
+            ValueError: if the chat language has no voice anymore
         '''
 
-        self.worker = helpers.build_agent(placeholders)
+        if self.language not in new_config['edgetts_voices']:
+            raise ValueError(f"no voice for language {self.language} used by the chat")
+
+    async def get_worker(self) -> Any:
+        ''' Returns the worker, waiting for it if it is built in the background '''
+
+        if self.worker is None and self.worker_future is not None:
+            self.worker = await asyncio.wrap_future(self.worker_future)
+
+        return self.worker
+
+    def cache_worker(self, worker: Any) -> Any:
+        '''Wrap the worker in the resilient call layer and the response cache, if enabled in config.
+
+        Args:
+            worker (Any): chain or agent
+
+        Return:
+            (Any): the wrapped worker or the worker itself
+        '''
+
+        if config['llm_resilience']:
+            # deadlines, retries and hedging of the LLM calls, cached answers skip them
+            worker = ResilientWorker(worker, stream_answer=helpers.stream_answer, astream_answer=helpers.astream_answer)
+
+        if not config['response_cache']:
+            return worker
+
+        from response_cache import CachedWorker
+
+        return CachedWorker(
+            worker,
+            cache=helpers.build_response_cache(),
+            stream_answer=helpers.stream_answer,
+            astream_answer=helpers.astream_answer,
+            history_messages=config['response_cache_history'],
+        )
 
     def chat_with_avatar(self, input_method: str = None, language: str = None) -> None:
         '''Entry point to chat with the avatar.
@@ -95,7 +220,7 @@ class AiChatbot:
             ValueError: if worker is not defined before starting chat
         '''
 
-        if self.worker is None:
+        if self.worker is None and self.worker_future is None:
             LOG.error('self.worker is None. Call create_worker_chain or create_worker_agent before chat_with_avatar.')
             raise ValueError('Worker not defined. Please create a worker chain or agent before starting chat.')
 
@@ -121,11 +246,25 @@ class AiChatbot:
 
         LOG.debug(f'Language: {self.language}')
 
+        # warm up tts cache with common phrases in the background
+        if not self.input_method == 'text':
+            threading.Thread(target=helpers.prerender_tts, args=[self.language], daemon=True).start()
+
+        # request answers while the user is still talking
+        if not self.input_method == 'text' and config['speculative_prefetch']:
+            self.speculator = Speculator(
+                self.speculative_answer,
+                count_tokens=self.memory.count_tokens,
+                threshold=config['speculation_threshold'],
+                stable_time=config['speculation_stable_time'],
+                history_version=lambda: self.memory.version,
+            )
+
         # define keyboard event to exit chat at any time
         keyboard.on_press_key("esc", self.on_esc_pressed)
 
         print(f'\n{GREY}Starting chat, please wait...{RESET}')
-        helpers.write_to_csv(CHAT_HISTORY_CSV, 'NEW CHAT')
+        self.history.write(self.session_id, NEW_CHAT)
 
         if self.exit_chat['value']:
             # exit program before starting chat if esc was pressed during setup
@@ -136,117 +275,244 @@ class AiChatbot:
         # prompt for a new user input
         print(f'\n{USER_CLR}{USER_NAME}:{RESET}')
 
-        if self.input_method == 'text':
-            while not self.exit_chat['value']:
-                # get user message
-                new_message = input()
-                if new_message.strip() == '':
-                    # skip empty message or only spaces
-                    continue
-                if new_message in {'quit', 'exit'}:
-                    # raise exit flag and exit loop on keywords
-                    self.exit_chat['value'] = True
-                    break
-                # send message to chatGPT and get answer on separate thread
-                self.chat_thread = threading.Thread(target=self.generate_model_answer, args=[new_message])
-                self.chat_thread.start()
-
-        elif self.input_method == 'voice_k':
-            # define keyboard event to trigger audio inpout
+        if self.input_method == 'voice_k':
+            # define keyboard event to trigger audio input
             keyboard.on_press_key("space", self.on_space_pressed)
 
-            while not self.exit_chat['value']:
-                sleep(1)  # wait 1 second before checking again
-
-        else:  # self.input_method == 'voice'
-            # use direct chat input
-            while not self.exit_chat['value']:
-                if self.recording is False:
-                    self.record_message()
-                sleep(1)  # wait 1 second before checking again
+        # run input and answer stages until exit
+        asyncio.run(self.engine.run())
 
-        # stop keyboard listener
+        # stop keyboard listener and close the microphone
         keyboard.unhook_all()
+        helpers.close_audio_capture()
+
+        # write remaining chat history
+        self.history.close()
 
         # make sure temp files are deleted
         if os.path.exists(config['temp_audio_filepath']):
             os.remove(config['temp_audio_filepath'])
 
+        resilient_worker = self.worker
+        if config['response_cache']:
+            # numpy and langchain are only loaded if the cache is used
+            from response_cache import CachedWorker
+            if isinstance(self.worker, CachedWorker):
+                LOG.debug(f'Response cache stats: {self.worker.cache.stats()}')
+                resilient_worker = self.worker.worker
+
+        if isinstance(resilient_worker, ResilientWorker):
+            LOG.debug(f'LLM call stats: {resilient_worker.stats()}')
+
+        if helpers.TTS_CACHE:
+            LOG.debug(f'TTS cache stats: {helpers.TTS_CACHE.stats()}')
+
+        if self.speculator:
+            LOG.debug(f'Speculation stats: {self.speculator.stats()}')
+
         print(f'\n{GREY}# CHAT ENDED #{GREY}')
 
     def on_space_pressed(self, e) -> None:
-        ''' When space is pressed, start a thread to record your voice message '''
+        ''' When space is pressed, ask the chat engine to record your voice message '''
         if e.event_type == keyboard.KEY_DOWN and self.recording is False:
-            self.chat_thread = threading.Thread(target=self.record_message)
-            self.chat_thread.start()
+            self.engine.request_recording()
 
     def on_esc_pressed(self, e) -> None:
         ''' When esc is pressed, raise exit_flag to terminate chat and any chat thread running '''
         if e.event_type == keyboard.KEY_DOWN and not self.exit_chat['value']:
             LOG.debug('Raising exit flag to terminate chat')
             self.exit_chat['value'] = True
-            message = 'Ending chat, PRESS ENTER to close' if self.input_method == 'text' else 'Ending chat, please wait...'
-            print(f'{CLEAR}{GREY}{message}{RESET}', flush=True)
-
-    def record_message(self) -> None:
-        ''' Record voice and transcribe message '''
-
-        self.recording = True
-
-        new_message = helpers.record_audio_message(self.exit_chat, input_method=self.input_method, language=self.language)
+            print(f'{CLEAR}{GREY}Ending chat, please wait...{RESET}', flush=True)
+            self.engine.stop()
 
-        # Process new message on success or ask user to try again if no message was recorded
-        if new_message:
-            self.generate_model_answer(new_message)
-        else:
-            self.recording = False
-
-    def generate_model_answer(self, user_message: str) -> None:
+    async def generate_model_answer(self, user_message: str, trace: TurnTrace = None) -> None:
         '''Send new message and get answer from the LLM.
 
         Args:
             message (str): message to send to the LLM
+            trace (TurnTrace): optional trace of the turn, started when the message was entered
         '''
 
+        from langchain_core.messages import HumanMessage
+
+        # stages running for this turn (tasks, threads, tools) add their spans to the trace
+        trace = trace or TRACER.start_turn(self.session_id)
+        CURRENT_TURN.set(trace)
+
         # print message in speech mode
         if not self.input_method == 'text':
             print(f'{CLEAR}{USER_CLR}{user_message.capitalize()}{RESET}')
 
+        # answer requested while the user was talking, if it matches the message and the history
+        speculation = self.speculator.take(user_message) if self.speculator else None
+
         # add message to prompt and chat history
-        self.messages.append(HumanMessage(content=user_message))
-        helpers.write_to_csv(CHAT_HISTORY_CSV, USER_NAME, user_message)
+        self.memory.append(HumanMessage(content=user_message))
+        self.history.write(self.session_id, USER_NAME, user_message)
         LOG.debug(f'Human Message: {user_message}')
 
         # print avatar feedback
         print(f'\n{CLEAR}{AI_CLR}{CHATBOT_NAME}:{RESET}')
         print(f'{CLEAR}{GREY}(generate){RESET}', end=' ', flush=True)
 
-        # invoke langchain worker and get answer
-        answer = self.worker.invoke({"input": user_message, "chat_history": self.messages})
-
-        # extract answer from dict when using an agent
-        if isinstance(answer, dict):
-            if 'output' in answer:
-                answer = answer['output']
-
-        # remove any unwanted characters
-        ai_message = re.sub(r'[*|/|\\]', '', answer)
+        # in speech mode, start a tts pipeline to speak sentences as soon as they are generated
+        tts_pipeline = None
+        if not self.input_method == 'text':
+            tts_pipeline = helpers.create_tts_pipeline(self.language)
+
+        # invoke langchain worker and get answer, unless it was requested while the user was talking
+        inputs = {"input": user_message, "chat_history": self.memory.messages}
+
+        try:
+            if config['stream_answer']:
+                # chunks are cleaned while streaming
+                with trace.span('llm', speculative=speculation is not None):
+                    ai_message = await self.stream_model_answer(inputs, tts_pipeline, speculation)
+
+            else:
+                with trace.span('llm', speculative=speculation is not None):
+                    if speculation:
+                        answer = await speculation.result()
+                    else:
+                        worker = await self.get_worker()
+                        answer = await worker.ainvoke(inputs)
+                trace.mark('first_token')
+
+                # extract answer from dict when using an agent
+                if isinstance(answer, dict):
+                    if 'output' in answer:
+                        answer = answer['output']
+
+                # remove any unwanted characters
+                ai_message = strip_unwanted_chars(answer)
+
+            if tts_pipeline:
+                if not config['stream_answer']:
+                    print(f'{CLEAR}{GREY}(transcribe){RESET}', end=' ', flush=True)
+                    await tts_pipeline.feed(ai_message)
+                # wait until the full answer is spoken
+                await tts_pipeline.close()
+                await tts_pipeline.join()
+
+        except asyncio.CancelledError:
+            if tts_pipeline:
+                # interrupted by the user, keep only what the avatar said
+                tts_pipeline.cancel()
+                spoken = tts_pipeline.spoken_text()
+                if spoken:
+                    self.record_answer(spoken)
+                print(f'{GREY}(interrupted){RESET}')
+                print(f'\n{USER_CLR}{USER_NAME}:{RESET}')
+            trace.end('interrupted')
+            raise
+
+        except Exception:
+            trace.end('error')
+            # an unanswered message would be sent again with every next message
+            self.memory.pop()
+            raise
+
+        finally:
+            # stop speaking if the turn was cancelled or failed
+            if tts_pipeline:
+                tts_pipeline.cancel()
+            if speculation:
+                speculation.cancel()
+
+        # the answer is fully printed or spoken
+        trace.end()
 
         # add answer to prompt and chat history
-        self.messages.append(AIMessage(content=ai_message))
+        self.record_answer(ai_message)
 
-        helpers.write_to_csv(CHAT_HISTORY_CSV, CHATBOT_NAME, ai_message)
-        LOG.debug(f'AI Message: {ai_message}')
+        if tts_pipeline:
+            print(RESET)
 
-        if not self.input_method == 'text':
-            # generate tts
-            print(f'{CLEAR}{GREY}(transcribe){RESET}', end=' ', flush=True)
-            helpers.generate_tts(text=ai_message, language=self.language)
+        elif config['stream_answer']:
+            # answer was already printed while streaming
+            print(RESET)
 
         else:
             # print answer
             print(f'{CLEAR}{AI_CLR}{ai_message}{RESET}')
 
+        # summarize turns dropped from the history before the next message
+        self.memory.summarize_in_background()
+
         # prompt for a new chat
-        self.recording = False
         print(f'\n{USER_CLR}{USER_NAME}:{RESET}')
+
+    def record_answer(self, ai_message: str) -> None:
+        '''Add an answer to the prompt and chat history.
+
+        Args:
+            ai_message (str): answer, or the part of it spoken before an interruption
+        '''
+
+        from langchain_core.messages import AIMessage
+
+        self.memory.append(AIMessage(content=ai_message))
+        self.history.write(self.session_id, CHATBOT_NAME, ai_message)
+        LOG.debug(f'AI Message: {ai_message}')
+
+    async def stream_model_answer(self, inputs: dict, tts_pipeline: TtsPipeline = None, speculation: Speculation = None) -> str:
+        '''Stream the answer from the LLM, printing chunks as they arrive in text mode
+        or sending them to the tts pipeline in speech mode.
+
+        Args:
+            inputs (dict): input variables to send to the worker
+            tts_pipeline (TtsPipeline): optional pipeline speaking the answer sentence by sentence
+            speculation (Speculation): optional answer already requested, streamed instead of calling the worker
+
+        Return:
+            (str): the full answer, without unwanted characters
+        '''
+
+        # remove unwanted characters chunk by chunk. Speech does not need the line
+        # breaks and indentation of the answer, so whitespace is also collapsed.
+        normalizer = StreamNormalizer(collapse_whitespace=tts_pipeline is not None)
+        chunks = []
+
+        if speculation:
+            answer = speculation.stream()
+        else:
+            answer = helpers.astream_answer(await self.get_worker(), inputs)
+
+        async for chunk in answer:
+            current_turn().mark('first_token')
+            safe_chunk = normalizer.feed(chunk)
+            if not safe_chunk:
+                continue
+            if tts_pipeline:
+                await tts_pipeline.feed(safe_chunk)
+            else:
+                # clear the generate feedback on the first chunk
+                if not chunks:
+                    print(f'{CLEAR}{AI_CLR}', end='', flush=True)
+                print(safe_chunk, end='', flush=True)
+            chunks.append(safe_chunk)
+
+        chunks.append(normalizer.flush())
+
+        return ''.join(chunks)
+
+    def speculative_answer(self, text: str) -> AsyncIterator[str]:
+        '''Request an answer to a partial transcript, before the user stops talking.
+
+        Args:
+            text (str): partial transcript
+
+        Return:
+            (AsyncIterator[str]): answer chunks
+        '''
+
+        from langchain_core.messages import HumanMessage
+
+        # same history the turn will send once the message is added, taken now to match the history version
+        inputs = {"input": text, "chat_history": self.memory.messages + [HumanMessage(content=text)]}
+
+        async def answer() -> AsyncIterator[str]:
+            async for chunk in helpers.astream_answer(await self.get_worker(), inputs):
+                yield chunk
+
+        return answer()
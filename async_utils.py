@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: async_utils.py
+Description: Helpers to run blocking calls (audio, speech recognition, keyboard input) from the asyncio chat engine.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+import threading
+import contextvars
+from typing import Any, Callable
+
+
+def run_in_daemon_thread(func: Callable, *args: Any) -> asyncio.Future:
+    ''' Runs a blocking function on a daemon thread and returns a future to await its result.
+    Unlike asyncio.to_thread, a call still blocking (microphone, audio playback) does not
+    keep the process alive once the chat is cancelled. Like asyncio.to_thread, the function
+    runs in a copy of the caller's context variables (current turn trace).
+
+    Args:
+        func (Callable): blocking function to run
+        *args (Any): arguments passed to the function
+
+    Return:
+        (asyncio.Future): future resolved with the function result or exception
+    '''
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    context = contextvars.copy_context()
+
+    def resolve(result: Any, error: BaseException = None) -> None:
+        # the awaiting task may have been cancelled in the meantime
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run() -> None:
+        try:
+            result, error = context.run(func, *args), None
+        except BaseException as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            # event loop already closed
+            pass
+
+    threading.Thread(target=run, daemon=True).start()
+
+    return future
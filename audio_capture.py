@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: audio_capture.py
+Description: Long-lived audio capture service with an energy based voice activity detector and a pre-roll ring buffer.
+Example: capture = AudioCapture(MicrophoneSource()).start(); audio = capture.listen(timeout=10, phrase_time_limit=10)
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import queue
+import wave
+import threading
+from time import monotonic, sleep
+from pathlib import Path
+from collections import deque
+from typing import Callable, Iterator
+import numpy as np
+import speech_recognition as sr
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# 16-bit mono pcm, as recorded by speech_recognition
+SAMPLE_WIDTH = 2
+
+
+def rms(chunk: bytes) -> float:
+    ''' Returns the energy of a chunk of 16-bit pcm audio '''
+
+    samples = np.frombuffer(chunk, dtype=np.int16)
+    if not samples.size:
+        return 0.0
+
+    return float(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
+
+
+class MicrophoneSource:
+    '''
+    Default microphone, opened once and kept open until closed.
+    '''
+
+    def __init__(self, device_index: int = None) -> None:
+        '''Create class instance and open the audio stream
+
+        Args:
+            device_index (int): optional microphone index, default microphone otherwise
+
+        Raises:
+            OSError: if the microphone could not be opened
+        '''
+
+        self.microphone = sr.Microphone(device_index=device_index)
+        self.microphone.__enter__()
+
+        if self.microphone.stream is None:
+            raise OSError('Could not open microphone stream.')
+
+        self.sample_rate = self.microphone.SAMPLE_RATE
+        self.chunk_size = self.microphone.CHUNK
+
+    def read(self) -> bytes:
+        ''' Read the next chunk, blocks until it is recorded '''
+        return self.microphone.stream.read(self.chunk_size)
+
+    def close(self) -> None:
+        ''' Close the audio stream '''
+        self.microphone.__exit__(None, None, None)
+
+
+class WavFileSource:
+    '''
+    Fake microphone playing 16-bit mono wav files one after the other, separated and
+    followed by silence. Used to test voice input without a microphone.
+    '''
+
+    def __init__(self, *paths: str, chunk_size: int = 1024, gap: float = 1.0, speed: float = 1.0) -> None:
+        '''Create class instance
+
+        Args:
+            *paths (str): wav files to play, in order
+            chunk_size (int): number of frames per chunk
+            gap (float): seconds of silence before each file
+            speed (float): playback speed, 1.0 reads chunks as fast as a microphone records them
+
+        Raises:
+            ValueError: if a file is not 16-bit mono or sample rates differ
+        '''
+
+        self.chunk_size = chunk_size
+        self.speed = speed
+        self.sample_rate = None
+
+        self.chunks = deque()
+
+        for path in paths:
+            with wave.open(str(path), 'rb') as wav:
+                if wav.getnchannels() != 1 or wav.getsampwidth() != SAMPLE_WIDTH:
+                    raise ValueError(f'{path} is not a 16-bit mono wav file.')
+
+                if self.sample_rate is None:
+                    self.sample_rate = wav.getframerate()
+                elif wav.getframerate() != self.sample_rate:
+                    raise ValueError(f'{path} sample rate differs from previous files.')
+
+                self.chunks.extend(self._silence(gap))
+                while frames := wav.readframes(chunk_size):
+                    self.chunks.append(frames)
+
+        self.sample_rate = self.sample_rate or 16000
+
+    def read(self) -> bytes:
+        ''' Read the next chunk, silence once all files are played '''
+
+        sleep(self.chunk_size / self.sample_rate / self.speed)
+
+        if self.chunks:
+            return self.chunks.popleft()
+
+        return self._silence(self.chunk_size / self.sample_rate)[0]
+
+    def close(self) -> None:
+        ''' Nothing to close '''
+        self.chunks.clear()
+
+    def _silence(self, duration: float) -> list[bytes]:
+        ''' Return chunks of silence lasting duration seconds '''
+
+        count = round(duration * (self.sample_rate or 16000) / self.chunk_size)
+        return [bytes(self.chunk_size * SAMPLE_WIDTH)] * count
+
+
+class AudioCapture:
+    '''
+    Reads an audio source continuously on a background thread, so the stream is opened
+    once and never overflows between turns. While nobody listens, the last chunks are
+    kept in a ring buffer and prepended to the next phrase, so its onset is not clipped.
+
+    The energy threshold separating speech from silence is calibrated on ambient noise
+    when listening starts (again after recalibrate_interval seconds), then adjusted on
+    the silent chunks heard while waiting for speech. Listening can go on while the
+    avatar speaks, to detect when the user interrupts it.
+    '''
+
+    def __init__(
+        self,
+        source,
+        pre_roll: float = 0.5,
+        pause_threshold: float = 0.8,
+        min_speech: float = 0.0,
+        calibration_duration: float = 1.0,
+        recalibrate_interval: float = 300,
+        min_energy: float = 300,
+        energy_ratio: float = 1.5,
+        damping: float = 0.15
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            source (MicrophoneSource | WavFileSource): audio source with sample_rate, chunk_size, read() and close()
+            pre_roll (float): seconds of audio kept before speech is detected
+            pause_threshold (float): seconds of silence ending a phrase
+            min_speech (float): seconds of speech needed to start a phrase, shorter sounds are ignored
+            calibration_duration (float): seconds of ambient noise used for calibration
+            recalibrate_interval (float): seconds after which the threshold is calibrated again, 0 to calibrate once
+            min_energy (float): minimum energy threshold
+            energy_ratio (float): threshold over ambient energy, speech must be louder than noise * ratio
+            damping (float): how much of the previous threshold is kept after one second of silence
+        '''
+
+        self.source = source
+        self.pause_threshold = pause_threshold
+        self.min_speech = min_speech
+        self.calibration_duration = calibration_duration
+        self.recalibrate_interval = recalibrate_interval
+        self.min_energy = min_energy
+        self.energy_ratio = energy_ratio
+        self.damping = damping
+
+        self.sample_rate = source.sample_rate
+        self.chunk_duration = source.chunk_size / source.sample_rate
+        self.energy_threshold = min_energy
+        self.calibrated_at = None
+
+        # raises the threshold while the avatar is speaking, so its own voice picked up by
+        # the microphone is not taken for the user's
+        self.echo_guard = 1.0
+
+        # chunks recorded while nobody listens, oldest dropped first
+        self.pre_roll = deque(maxlen=max(1, round(pre_roll / self.chunk_duration)))
+        # chunks recorded while listening
+        self.chunks = queue.Queue()
+        self.listening = False
+        self.lock = threading.Lock()
+
+        self.running = False
+        self.thread = None
+
+    def start(self) -> 'AudioCapture':
+        ''' Start reading the source on a background thread '''
+
+        self.running = True
+        self.thread = threading.Thread(target=self._read_source, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def close(self) -> None:
+        ''' Stop reading and close the source '''
+
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        self.source.close()
+
+    def listen(self, timeout: float = None, phrase_time_limit: float = None, should_stop: Callable[[], bool] = None) -> sr.AudioData | None:
+        '''Wait for a phrase and return its audio.
+
+        Args:
+            timeout (float): seconds to wait for speech to start, no limit if None
+            phrase_time_limit (float): maximum phrase duration in seconds, no limit if None
+            should_stop (Callable[[], bool]): optional callback checked on every chunk, stops listening if it returns True
+
+        Return:
+            (sr.AudioData | None): the phrase, None if stopped
+
+        Raises:
+            sr.WaitTimeoutError: if no speech started before timeout
+        '''
+
+        frames = list(self.stream_phrase(timeout, phrase_time_limit, should_stop))
+
+        if not frames or (should_stop and should_stop()):
+            return None
+
+        return sr.AudioData(b''.join(frames), self.sample_rate, SAMPLE_WIDTH)
+
+    def stream_phrase(
+        self,
+        timeout: float = None,
+        phrase_time_limit: float = None,
+        should_stop: Callable[[], bool] = None,
+        on_speech_start: Callable[[], None] = None
+    ) -> Iterator[bytes]:
+        '''Wait for a phrase and yield its chunks while it is recorded, starting with the
+        chunks preceding speech. Ends on a pause, on the phrase time limit or when stopped.
+
+        Args:
+            timeout (float): seconds to wait for speech to start, no limit if None
+            phrase_time_limit (float): maximum phrase duration in seconds, no limit if None
+            should_stop (Callable[[], bool]): optional callback checked on every chunk, stops listening if it returns True
+            on_speech_start (Callable[[], None]): optional callback called as soon as speech is detected
+
+        Yield:
+            (bytes): 16-bit mono pcm chunks at sample_rate
+
+        Raises:
+            sr.WaitTimeoutError: if no speech started before timeout
+        '''
+
+        with self.lock:
+            # continue from the chunks recorded while idle
+            pending = deque(self.pre_roll)
+            self.pre_roll.clear()
+            self.listening = True
+
+        try:
+            if self._needs_calibration():
+                self._calibrate(pending)
+
+            yield from self._phrase_chunks(pending, timeout, phrase_time_limit, should_stop, on_speech_start)
+
+        finally:
+            with self.lock:
+                self.listening = False
+                # chunks recorded after the phrase ended go back to the ring buffer
+                while not self.chunks.empty():
+                    self.pre_roll.append(self.chunks.get_nowait())
+
+    def _read_source(self) -> None:
+        ''' Reader thread: send chunks to the listener, or to the ring buffer while nobody listens '''
+
+        while self.running:
+            try:
+                chunk = self.source.read()
+            except Exception as e:
+                LOG.error(f'Error reading audio source: {e}')
+                sleep(self.chunk_duration)
+                continue
+
+            with self.lock:
+                if self.listening:
+                    self.chunks.put(chunk)
+                else:
+                    self.pre_roll.append(chunk)
+
+    def _next_chunk(self, pending: deque) -> bytes:
+        ''' Return the next chunk, buffered ones first '''
+
+        if pending:
+            return pending.popleft()
+
+        while True:
+            try:
+                return self.chunks.get(timeout=1.0)
+            except queue.Empty:
+                if not self.running:
+                    raise OSError('Audio capture is closed.')
+
+    def _needs_calibration(self) -> bool:
+        ''' Returns True if the threshold was never calibrated or the last calibration is too old '''
+
+        if self.calibrated_at is None:
+            return True
+
+        if self.echo_guard > 1:
+            # never calibrate on the avatar's voice
+            return False
+
+        return bool(self.recalibrate_interval) and monotonic() - self.calibrated_at >= self.recalibrate_interval
+
+    def _calibrate(self, pending: deque) -> None:
+        ''' Set the energy threshold from ambient noise. Chunks read are kept for the phrase. '''
+
+        count = max(1, round(self.calibration_duration / self.chunk_duration))
+        chunks = [self._next_chunk(pending) for _ in range(count)]
+
+        ambient = float(np.median([rms(chunk) for chunk in chunks]))
+        self.energy_threshold = max(self.min_energy, ambient * self.energy_ratio)
+        self.calibrated_at = monotonic()
+        LOG.debug(f'Energy threshold calibrated: {self.energy_threshold:.0f}')
+
+        # speech may have started during calibration
+        pending.extendleft(reversed(chunks))
+
+    def _phrase_chunks(
+        self,
+        pending: deque,
+        timeout: float,
+        phrase_time_limit: float,
+        should_stop: Callable[[], bool],
+        on_speech_start: Callable[[], None]
+    ) -> Iterator[bytes]:
+        ''' Wait for speech, then yield chunks until a pause or the phrase time limit '''
+
+        # keep the chunks preceding speech, like the idle ring buffer
+        frames = deque(maxlen=self.pre_roll.maxlen)
+        # chunks since speech was first heard, until it lasts min_speech
+        candidate = []
+        voiced = silence = 0.0
+        waited = 0.0
+
+        # wait for speech to start
+        while True:
+            if should_stop and should_stop():
+                return
+
+            chunk = self._next_chunk(pending)
+            energy = rms(chunk)
+            loud = energy > self.energy_threshold * self.echo_guard
+
+            if loud or candidate:
+                candidate.append(chunk)
+                if loud:
+                    voiced += self.chunk_duration
+                    silence = 0.0
+                else:
+                    silence += self.chunk_duration
+
+                if voiced >= self.min_speech:
+                    break
+
+                if silence >= self.pause_threshold:
+                    # too short to be speech, a noise or an echo
+                    frames.extend(candidate)
+                    candidate = []
+                    voiced = silence = 0.0
+
+                continue
+
+            frames.append(chunk)
+
+            waited += self.chunk_duration
+            if timeout is not None and waited > timeout:
+                raise sr.WaitTimeoutError('listening timed out while waiting for phrase to start')
+
+            if self.echo_guard == 1:
+                # follow slow changes of ambient noise
+                damping = self.damping ** self.chunk_duration
+                target = max(self.min_energy, energy * self.energy_ratio)
+                self.energy_threshold = self.energy_threshold * damping + target * (1 - damping)
+
+        if on_speech_start:
+            on_speech_start()
+
+        yield from frames
+        yield from candidate
+
+        # record until enough silence
+        phrase_duration = len(candidate) * self.chunk_duration
+
+        while silence < self.pause_threshold:
+            if should_stop and should_stop():
+                return
+
+            if phrase_time_limit is not None and phrase_duration >= phrase_time_limit:
+                return
+
+            chunk = self._next_chunk(pending)
+            yield chunk
+            phrase_duration += self.chunk_duration
+
+            if rms(chunk) > self.energy_threshold * self.echo_guard:
+                silence = 0.0
+            else:
+                silence += self.chunk_duration
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: audio_player.py
+Description: Interruptible audio playback, writing audio in small blocks so it can be stopped from another thread.
+Example: player = AudioPlayer(); player.play(segment); player.close()  # player.stop() from another thread
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import threading
+from time import sleep
+from pathlib import Path
+from typing import Callable
+from pydub import AudioSegment
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+
+class PyAudioOutput:
+    '''
+    Default sound output.
+    '''
+
+    def __init__(self, sample_width: int, channels: int, frame_rate: int) -> None:
+        '''Create class instance and open the output stream
+
+        Args:
+            sample_width (int): bytes per sample
+            channels (int): number of channels
+            frame_rate (int): frames per second
+        '''
+
+        import pyaudio
+
+        self.audio = pyaudio.PyAudio()
+        self.stream = self.audio.open(
+            format=self.audio.get_format_from_width(sample_width),
+            channels=channels,
+            rate=frame_rate,
+            output=True,
+        )
+
+    def write(self, data: bytes) -> None:
+        ''' Play a block of audio, blocks until the output accepted it '''
+        self.stream.write(data)
+
+    def close(self) -> None:
+        ''' Close the output stream '''
+
+        try:
+            self.stream.stop_stream()
+            self.stream.close()
+        finally:
+            self.audio.terminate()
+
+
+class SimulatedOutput:
+    '''
+    Fake sound output taking as long as the audio to play it. Used to test playback
+    and barge-in without a sound card.
+    '''
+
+    def __init__(self, sample_width: int, channels: int, frame_rate: int) -> None:
+        '''Create class instance
+
+        Args:
+            sample_width (int): bytes per sample
+            channels (int): number of channels
+            frame_rate (int): frames per second
+        '''
+
+        self.bytes_per_second = sample_width * channels * frame_rate
+
+    def write(self, data: bytes) -> None:
+        ''' Wait for the duration of the block '''
+        sleep(len(data) / self.bytes_per_second)
+
+    def close(self) -> None:
+        ''' Nothing to close '''
+
+
+class AudioPlayer:
+    '''
+    Plays audio segments block by block. Stopping the player interrupts the current
+    segment within one block and skips all later ones, so create one player per answer.
+
+    The output stream is opened on the first segment and kept open for the next ones,
+    so consecutive sentences play without a gap. It is reopened only if the audio
+    format changes, and closed when the player is closed or stopped.
+    '''
+
+    def __init__(self, block_duration: float = 0.05, output: Callable = PyAudioOutput, on_playing: Callable[[bool], None] = None) -> None:
+        '''Create class instance
+
+        Args:
+            block_duration (float): seconds of audio written at once, the maximum stop latency
+            output (Callable): output class, called with sample_width, channels and frame_rate
+            on_playing (Callable[[bool], None]): optional callback called with True when a segment starts playing and False when it ends
+        '''
+
+        self.block_duration = block_duration
+        self.output = output
+        self.on_playing = on_playing
+
+        self.stopped = threading.Event()
+        self.progress = None
+
+        # open output stream and its (sample_width, channels, frame_rate) format
+        self.stream = None
+        self.format = None
+        # held while the output stream is used, so it is closed by one thread only
+        self.lock = threading.Lock()
+
+    def play(self, audio: AudioSegment) -> float:
+        '''Play a segment, blocks until it is played or the player is stopped.
+
+        Args:
+            audio (AudioSegment): audio to play
+
+        Return:
+            (float): fraction of the segment played, from 0 to 1
+        '''
+
+        if self.stopped.is_set() or not len(audio.raw_data):
+            return 0.0
+
+        data = audio.raw_data
+        block_size = max(audio.frame_width, int(audio.frame_rate * self.block_duration) * audio.frame_width)
+        played = 0
+        self.progress = 0.0
+
+        with self.lock:
+            output = self._open(audio.sample_width, audio.channels, audio.frame_rate)
+            if self.on_playing:
+                self.on_playing(True)
+
+            try:
+                while played < len(data) and not self.stopped.is_set():
+                    output.write(data[played:played + block_size])
+                    played = min(played + block_size, len(data))
+                    self.progress = played / len(data)
+
+            finally:
+                if self.stopped.is_set():
+                    # stopped from another thread while playing, drop the rest of the answer
+                    self._close()
+                if self.on_playing:
+                    self.on_playing(False)
+
+        return played / len(data)
+
+    def close(self) -> None:
+        ''' Close the output stream, once the answer is played '''
+
+        with self.lock:
+            self._close()
+
+    def stop(self) -> float | None:
+        '''Stop playback. Safe to call from any thread.
+
+        Return:
+            (float | None): fraction of the current segment played, None if nothing played yet
+        '''
+
+        self.stopped.set()
+
+        # a segment playing closes the output itself, within one block
+        if self.lock.acquire(blocking=False):
+            try:
+                self._close()
+            finally:
+                self.lock.release()
+
+        return self.progress
+
+    def _open(self, sample_width: int, channels: int, frame_rate: int):
+        ''' Returns the output stream, opening it or reopening it for a new format. The lock must be held. '''
+
+        audio_format = (sample_width, channels, frame_rate)
+
+        if self.stream is not None and self.format != audio_format:
+            self._close()
+
+        if self.stream is None:
+            self.stream = self.output(sample_width, channels, frame_rate)
+            self.format = audio_format
+
+        return self.stream
+
+    def _close(self) -> None:
+        ''' Close the output stream if open. The lock must be held. '''
+
+        if self.stream is not None:
+            stream, self.stream, self.format = self.stream, None, None
+            stream.close()
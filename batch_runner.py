@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: batch_runner.py
+Description: Headless batch mode running scripted conversations from jsonl files through a shared worker, many conversations at a time.
+Example: run_batch(['conversations.jsonl'], output='results.jsonl', worker_type='chain')
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import json
+import asyncio
+from time import monotonic, perf_counter
+from pathlib import Path
+from typing import Any, Iterator, TextIO
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+import helpers as helpers
+from chat_memory import ChatMemory, get_token_counter
+from text_normalizer import strip_unwanted_chars
+from tracing import TRACER, CURRENT_TURN
+from resilient_worker import status_code, retry_after, backoff_delay
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# backoff before retrying a rate limited request, when the api does not say how long to wait
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class Conversation:
+    '''
+    A scripted conversation read from a jsonl file. Human messages are the turns sent to
+    the worker. An ai message following a human message is the expected answer, saved
+    with the result for comparison. Ai messages before the first human message (opening
+    lines of the avatar) and system messages are sent as chat history.
+    '''
+
+    __slots__ = ('conversation_id', 'history', 'turns')
+
+    def __init__(self, conversation_id: str) -> None:
+        self.conversation_id = conversation_id
+        self.history = []
+        self.turns = []  # [human message, expected answer or None]
+
+    def add(self, role: str, content: str) -> None:
+        ''' Add a message of the script '''
+
+        if role == 'human':
+            self.turns.append([content, None])
+        elif role == 'ai' and self.turns:
+            self.turns[-1][1] = content
+        elif role == 'ai':
+            self.history.append(AIMessage(content=content))
+        elif role == 'system':
+            self.history.append(SystemMessage(content=content))
+        else:
+            raise ValueError(f'Invalid role {role}')
+
+
+def read_conversations(filepaths: list[str]) -> Iterator[Conversation]:
+    '''Stream the conversations of jsonl files, one at a time. Each line is a message
+    {"conversation": str, "role": "system" | "human" | "ai", "content": str}, like the
+    prompt file. The messages of a conversation must be contiguous: a new conversation id
+    ends the previous conversation. Without conversation ids, a file is one conversation.
+
+    Only the conversation being read is held in memory, whatever the size of the files.
+
+    Args:
+        filepaths (list[str]): jsonl files to read, in order
+
+    Yield:
+        (Conversation): the conversations in file order
+    '''
+
+    for filepath in filepaths:
+        conversation = None
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    message = json.loads(line)
+                    conversation_id = str(message.get('conversation', Path(filepath).stem))
+
+                    if conversation is None or conversation.conversation_id != conversation_id:
+                        if conversation is not None:
+                            yield conversation
+                        conversation = Conversation(conversation_id)
+
+                    conversation.add(message['role'], message['content'])
+
+                except (ValueError, KeyError, AttributeError) as e:
+                    LOG.warning(f'Skipping invalid message {filepath}:{line_number}: {e}')
+
+        if conversation is not None:
+            yield conversation
+
+
+class AdaptiveLimiter:
+    '''
+    Caps the number of requests in flight to the OpenAI API. When a request is rate
+    limited, the cap is halved and all new requests wait for the delay the api asked
+    for. After a full cap of successful requests, the cap grows by one, back up to the
+    maximum (additive increase, multiplicative decrease).
+    '''
+
+    def __init__(self, max_requests: int) -> None:
+        '''Create class instance
+
+        Args:
+            max_requests (int): maximum number of requests in flight
+        '''
+
+        self.max_requests = max_requests
+        self.limit = max_requests
+        self.in_flight = 0
+        self.successes = 0
+        self.rate_limits = 0
+        self.resume_at = 0.0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        ''' Wait for a free request slot '''
+
+        while True:
+            delay = self.resume_at - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.in_flight < self.limit)
+
+                # another request may have been rate limited while we were waiting
+                if self.resume_at <= monotonic():
+                    self.in_flight += 1
+                    return
+
+    async def release(self, delay: float = None, success: bool = True) -> None:
+        '''Free a request slot.
+
+        Args:
+            delay (float): seconds to wait if the request was rate limited, None if it was not
+            success (bool): false if the request failed or was cancelled for another reason, the cap is left as is
+        '''
+
+        async with self.condition:
+            self.in_flight -= 1
+
+            if delay is None and success:
+                self.successes += 1
+                if self.limit < self.max_requests and self.successes >= self.limit:
+                    self.limit += 1
+                    self.successes = 0
+
+            elif delay is not None:
+                self.rate_limits += 1
+                self.successes = 0
+
+                # requests sent before the pause get rate limited together, only shrink once
+                now = monotonic()
+                if self.resume_at <= now:
+                    self.limit = max(1, self.limit // 2)
+                    LOG.warning(f'Rate limited, pausing {delay:.1f}s and lowering requests in flight to {self.limit}')
+                self.resume_at = max(self.resume_at, now + delay)
+
+            self.condition.notify_all()
+
+
+def rate_limit_delay(error: Exception, attempt: int) -> float | None:
+    '''Returns how long to wait before retrying a request, if it was rate limited.
+
+    Args:
+        error (Exception): error raised by the worker
+        attempt (int): number of attempts so far, from 1
+
+    Return:
+        (float | None): seconds to wait, None if the error is not a rate limit
+    '''
+
+    if status_code(error) != 429:
+        return None
+
+    return retry_after(error) or backoff_delay(attempt, BACKOFF_BASE, BACKOFF_MAX)
+
+
+class BatchRunner:
+    '''
+    Runs conversations through a worker shared by all of them. Conversations run
+    concurrently, the turns of a conversation run in order, each with the history of
+    the previous ones. A result line is written for each turn as soon as it is answered,
+    so results of different conversations are interleaved.
+    '''
+
+    def __init__(
+        self,
+        worker: Any,
+        output: TextIO,
+        conversations: int,
+        max_requests: int,
+        max_retries: int,
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            worker (Any): langchain worker shared by all conversations
+            output (TextIO): stream the results are written to, as json lines
+            conversations (int): maximum number of conversations running at once
+            max_requests (int): maximum number of requests in flight to the api
+            max_retries (int): maximum number of retries of a rate limited turn
+        '''
+
+        self.worker = worker
+        self.output = output
+        self.conversations = conversations
+        self.max_retries = max_retries
+        self.limiter = AdaptiveLimiter(max_requests)
+
+        self.count_tokens = get_token_counter(config['openai_model'])
+        self.summarize = helpers.build_summarizer() if config['history_summary'] else None
+
+        # running totals for the summary
+        self.statuses = {}
+        self.latency_sum = 0.0
+        self.first_token_sum = 0.0
+
+    async def run(self, filepaths: list[str]) -> dict:
+        '''Run all the conversations of the files.
+
+        Args:
+            filepaths (list[str]): jsonl files of conversations
+
+        Return:
+            (dict): summary of the run
+        '''
+
+        start = perf_counter()
+        slots = asyncio.Semaphore(self.conversations)
+        tasks = set()
+
+        def done(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            slots.release()
+
+        # the next conversation is only read when a slot is free, so memory stays constant
+        for conversation in read_conversations(filepaths):
+            await slots.acquire()
+            task = asyncio.create_task(self.run_conversation(conversation))
+            tasks.add(task)
+            task.add_done_callback(done)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+        wall_time = perf_counter() - start
+        answered = self.statuses.get('ok', 0)
+        total = sum(self.statuses.values())
+
+        return {
+            'turns': total,
+            **self.statuses,
+            'wall_time': round(wall_time, 3),
+            'turns_per_second': round(total / wall_time, 2) if wall_time else 0,
+            'mean_latency': round(self.latency_sum / answered, 3) if answered else None,
+            'mean_first_token': round(self.first_token_sum / answered, 3) if answered else None,
+            'rate_limits': self.limiter.rate_limits,
+        }
+
+    async def run_conversation(self, conversation: Conversation) -> None:
+        '''Run the turns of a conversation in order. If a turn fails, the following ones
+        are skipped, as their history would be wrong.
+
+        Args:
+            conversation (Conversation): conversation to run
+        '''
+
+        memory = ChatMemory(config['history_token_budget'], self.count_tokens, self.summarize)
+        for message in conversation.history:
+            memory.append(message)
+
+        failed = False
+
+        for turn, (user_message, expected) in enumerate(conversation.turns, 1):
+            result = {'conversation': conversation.conversation_id, 'turn': turn, 'input': user_message}
+            if expected is not None:
+                result['expected'] = expected
+
+            if failed:
+                result['status'] = 'skipped'
+            else:
+                memory.append(HumanMessage(content=user_message))
+                result.update(await self.run_turn(conversation.conversation_id, memory.messages, user_message))
+
+                if result['status'] == 'ok':
+                    memory.append(AIMessage(content=result['output']))
+                    memory.summarize_in_background()
+                else:
+                    failed = True
+
+            self.write(result)
+
+    async def run_turn(self, conversation_id: str, chat_history: list, user_message: str) -> dict:
+        '''Send a message and get the answer, retrying when rate limited.
+
+        Args:
+            conversation_id (str): conversation of the turn
+            chat_history (list): history of the conversation, ending with the message
+            user_message (str): message to send
+
+        Return:
+            (dict): status, output or error, attempts and timings in seconds
+        '''
+
+        trace = TRACER.start_turn(conversation_id)
+        CURRENT_TURN.set(trace)
+
+        inputs = {'input': user_message, 'chat_history': chat_history}
+        queued = 0.0
+
+        for attempt in range(1, self.max_retries + 2):
+            wait_start = perf_counter()
+            await self.limiter.acquire()
+            queued += perf_counter() - wait_start
+
+            start = perf_counter()
+            first_token = None
+            chunks = []
+            delay = None
+            success = False
+
+            try:
+                with trace.span('llm', attempt=attempt):
+                    async for chunk in helpers.astream_answer(self.worker, inputs):
+                        if first_token is None:
+                            first_token = perf_counter() - start
+                            trace.mark('first_token')
+                        chunks.append(strip_unwanted_chars(chunk))
+                success = True
+
+            except asyncio.CancelledError:
+                trace.end('interrupted')
+                raise
+
+            except Exception as e:
+                delay = rate_limit_delay(e, attempt)
+                if delay is None or attempt > self.max_retries:
+                    LOG.error(f'Turn failed in conversation {conversation_id}: {e}')
+                    trace.end('error')
+                    return {'status': 'error', 'error': f'{type(e).__name__}: {e}', 'attempts': attempt, 'queued': round(queued, 3)}
+
+            finally:
+                # a cancelled or failed request frees its slot without counting as a success
+                await self.limiter.release(delay, success)
+
+            if delay is None:
+                break
+
+            LOG.debug(f'Retrying turn of conversation {conversation_id} in {delay:.1f}s (attempt {attempt})')
+            await asyncio.sleep(delay)
+
+        latency = perf_counter() - start
+        trace.end()
+
+        self.latency_sum += latency
+        self.first_token_sum += first_token or latency
+
+        return {
+            'status': 'ok',
+            'output': ''.join(chunks),
+            'attempts': attempt,
+            'queued': round(queued, 3),
+            'first_token': round(first_token, 3) if first_token is not None else None,
+            'latency': round(latency, 3),
+        }
+
+    def write(self, result: dict) -> None:
+        ''' Write a turn result to the output and count it '''
+
+        self.statuses[result['status']] = self.statuses.get(result['status'], 0) + 1
+        self.output.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self.output.flush()
+
+
+def run_batch(
+    filepaths: list[str],
+    output: str = None,
+    worker_type: str = None,
+    conversations: int = None,
+    max_requests: int = None,
+) -> dict:
+    '''Run conversation files through a new shared worker and write the results as json lines.
+
+    Args:
+        filepaths (list[str]): jsonl files of conversations
+        output (str): path of the results file, stdout if not given
+        worker_type (str): chain or agent. Defaults to config.
+        conversations (int): maximum number of conversations running at once. Defaults to config.
+        max_requests (int): maximum number of requests in flight to the api. Defaults to config.
+
+    Return:
+        (dict): summary of the run
+
+    Raises:
+        ValueError: if worker type is invalid
+    '''
+
+    conversations = conversations or config['batch_conversations']
+    max_requests = max_requests or config['batch_max_requests']
+
+    # rate limits are handled here, by lowering the requests in flight
+    # agent steps are not printed, stdout may be the results stream
+    worker, http_client = helpers.build_shared_worker(
+        worker_type or config['batch_worker'],
+        max_connections=max_requests,
+        retry_rate_limits=False,
+        verbose=False,
+    )
+
+    async def main() -> dict:
+        try:
+            runner = BatchRunner(worker, stream, conversations, max_requests, config['batch_max_retries'])
+            return await runner.run(filepaths)
+        finally:
+            await http_client.aclose()
+
+    stream = open(output, 'w', encoding='utf-8') if output else sys.stdout
+
+    try:
+        summary = asyncio.run(main())
+    finally:
+        if output:
+            stream.close()
+
+    LOG.info(f'Batch done: {summary}')
+    print(json.dumps(summary), file=sys.stderr)
+
+    return summary
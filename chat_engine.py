@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: chat_engine.py
+Description: Asyncio engine running the chat input and answer stages, linked by a bounded queue.
+Example: asyncio.run(ChatEngine(avatar).run())
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+import threading
+from pathlib import Path
+import helpers as helpers
+from async_utils import run_in_daemon_thread
+from tracing import TRACER, CURRENT_TURN
+from hot_reload import HotReloader
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+# terminal colors
+from terminal_colors import GREY, RESET, CLEAR
+
+
+class ChatEngine:
+    '''
+    Runs a chat session on a single event loop. An input stage (keyboard or microphone)
+    puts user messages into a bounded queue, and a single answer stage processes them
+    one at a time, so turns never overlap. Keyboard callbacks signal the loop through
+    events instead of being polled, and stopping cancels all stages at once.
+
+    With barge-in, the microphone keeps listening while the avatar answers, and the
+    user starting to talk cancels the current turn (LLM request and speech).
+    '''
+
+    def __init__(self, chatbot) -> None:
+        '''Create class instance
+
+        Args:
+            chatbot (AiChatbot): the chatbot answering the messages
+        '''
+
+        self.chatbot = chatbot
+        self.barge_in = False
+
+        # created in run, bound to the running event loop
+        self.loop = None
+        self.input_queue = None
+        self.exit_event = None
+        self.record_event = None
+        self.turn_done = None
+        self.turn_task = None
+        # held while a turn is answered, config reloads wait for it
+        self.turn_lock = None
+
+    async def run(self) -> None:
+        ''' Run the chat until stop is called '''
+
+        self.loop = asyncio.get_running_loop()
+        self.barge_in = config['barge_in'] and self.chatbot.input_method != 'text'
+        self.input_queue = asyncio.Queue(maxsize=config['input_queue_size'])
+        self.exit_event = asyncio.Event()
+        self.record_event = asyncio.Event()
+        self.turn_done = asyncio.Event()
+        self.turn_done.set()
+        self.turn_lock = asyncio.Lock()
+
+        tasks = [asyncio.create_task(self._process_turns())]
+
+        if config['hot_reload']:
+            # apply changes of the config, prompt and tools files between turns
+            reloader = HotReloader(
+                rebuild=self.chatbot.rebuild_worker,
+                swap=self.chatbot.swap_worker,
+                interval=config['hot_reload_interval'],
+                check=self.chatbot.check_config,
+            )
+            tasks.append(asyncio.create_task(reloader.watch(self.turn_lock)))
+
+        if self.chatbot.input_method == 'text':
+            # input() can't be cancelled, read it on a daemon thread so exiting does not wait for enter
+            threading.Thread(target=self._read_keyboard, daemon=True).start()
+        else:
+            tasks.append(asyncio.create_task(self._record_voice()))
+
+        await self.exit_event.wait()
+
+        # cancel input, llm and tts stages
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self) -> None:
+        ''' Stop the chat. Safe to call from any thread. '''
+
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.exit_event.set)
+
+    def request_recording(self) -> None:
+        ''' Start recording a voice message unless the avatar is still answering. Safe to call from any thread. '''
+
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._set_record_event)
+
+    def _set_record_event(self) -> None:
+        ''' Raise record event if ready to listen, interrupting the avatar with barge-in '''
+
+        if self.chatbot.recording:
+            return
+
+        if not self.turn_done.is_set():
+            if not self.barge_in:
+                return
+            self._interrupt()
+
+        self.record_event.set()
+
+    def _interrupt(self) -> None:
+        ''' Cancel the current turn, the user is talking '''
+
+        if self.turn_task and not self.turn_task.done():
+            LOG.debug('Barge-in: turn interrupted')
+            self.turn_task.cancel()
+
+    def _read_keyboard(self) -> None:
+        ''' Read text messages from the terminal and put them into the input queue (runs on a daemon thread) '''
+
+        while not self.chatbot.exit_chat['value']:
+            try:
+                new_message = input()
+            except EOFError:
+                self.stop()
+                return
+
+            if new_message.strip() == '':
+                # skip empty message or only spaces
+                continue
+
+            if new_message in {'quit', 'exit'}:
+                # raise exit flag and exit loop on keywords
+                self.chatbot.exit_chat['value'] = True
+                self.stop()
+                return
+
+            # the turn latency counts from the moment the message is entered
+            trace = TRACER.start_turn(self.chatbot.session_id)
+
+            try:
+                # blocks while the queue is full
+                asyncio.run_coroutine_threadsafe(self.input_queue.put((new_message, trace)), self.loop).result()
+            except (RuntimeError, asyncio.CancelledError):
+                # chat ended in the meantime
+                return
+
+    async def _record_voice(self) -> None:
+        ''' Record voice messages and put them into the input queue '''
+
+        while True:
+            if self.chatbot.input_method == 'voice_k':
+                # wait for space key
+                await self.record_event.wait()
+                self.record_event.clear()
+
+            if not self.barge_in:
+                # never listen while the avatar is answering
+                await self.turn_done.wait()
+
+            speculator = self.chatbot.speculator
+            on_partial = None
+            if speculator:
+                # partial transcripts arrive on the recording thread
+                on_partial = lambda text: self.loop.call_soon_threadsafe(speculator.on_partial, text)
+
+            on_speech_start = None
+            if self.barge_in:
+                # interrupt the avatar as soon as the user talks
+                on_speech_start = lambda: self.loop.call_soon_threadsafe(self._interrupt)
+
+            # the recording thread adds the listen and stt spans to the turn trace
+            trace = TRACER.start_turn(self.chatbot.session_id)
+            CURRENT_TURN.set(trace)
+
+            self.chatbot.recording = True
+            try:
+                new_message = await run_in_daemon_thread(
+                    helpers.record_audio_message,
+                    self.chatbot.exit_chat,
+                    self.chatbot.input_method,
+                    self.chatbot.language,
+                    on_partial,
+                    on_speech_start,
+                    self.turn_done.is_set()
+                )
+            finally:
+                self.chatbot.recording = False
+
+            if new_message:
+                self.turn_done.clear()
+                await self.input_queue.put((new_message, trace))
+
+            elif speculator:
+                # nothing was understood, drop the answer requested for this phrase
+                speculator.cancel()
+
+    async def _process_turns(self) -> None:
+        ''' Answer messages and their turn traces from the input queue, one at a time and in order '''
+
+        while True:
+            new_message, trace = await self.input_queue.get()
+
+            async with self.turn_lock:
+                # run the turn as a task, so barge-in can cancel it without stopping this stage
+                self.turn_task = asyncio.create_task(self.chatbot.generate_model_answer(new_message, trace))
+
+                try:
+                    await asyncio.wait([self.turn_task])
+
+                except asyncio.CancelledError:
+                    self.turn_task.cancel()
+                    raise
+
+                finally:
+                    self.turn_done.set()
+
+            if not self.turn_task.cancelled() and self.turn_task.exception():
+                LOG.error(f'Error generating answer: {self.turn_task.exception()}')
+                print(f'{CLEAR}{GREY}Error generating answer. Please try again.{RESET}', flush=True)
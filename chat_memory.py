@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: chat_memory.py
+Description: Token-budgeted chat history sent to the LLM, dropping or summarizing the oldest turns first.
+Example: memory = ChatMemory(2000, get_token_counter('gpt-4o-mini')); memory.append(HumanMessage(content='Hi')); memory.messages
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+from __future__ import annotations
+import threading
+from pathlib import Path
+from collections import deque
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Callable
+# langchain is imported on first use, off the startup path
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# tokens added by the chat format around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def get_token_counter(model: str, background: bool = False) -> Callable[[str], int]:
+    ''' Returns a function counting the tokens of a string for the given model.
+    Uses tiktoken if installed, approximates with 4 characters per token otherwise.
+
+    Args:
+        model (str): name of the openai model
+        background (bool): if true, load the encoding on a background thread, the first count waits for it
+
+    Return:
+        (Callable[[str], int]): token counter
+    '''
+
+    if background:
+        # loading tiktoken and its encoding takes a moment, the chat can start meanwhile
+        future = Future()
+        threading.Thread(target=lambda: future.set_result(get_token_counter(model)), daemon=True).start()
+        return lambda text: future.result()(text)
+
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('o200k_base')
+
+    except Exception as e:
+        # tiktoken not installed or encoding files could not be downloaded
+        LOG.debug(f'Error loading tiktoken encoding: {e}. Approximating token counts.')
+        return lambda text: len(text) // 4 + 1
+
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+class ChatMemory:
+    '''
+    Holds the chat history within a token budget. Each message is tokenized once when
+    added and a running total is kept, so trimming does not re-tokenize the history.
+    Whole turns (a human message and the answers to it) are dropped, oldest first.
+
+    If a summarize function is given, dropped turns are compressed into a running
+    summary on a background thread, sent as a system message before the history.
+
+    The system and few-shot messages from the prompt file are part of the prompt
+    template, not of this history, so they are always sent.
+    '''
+
+    def __init__(
+        self,
+        token_budget: int,
+        count_tokens: Callable[[str], int],
+        summarize: Callable[[str, list[BaseMessage]], str] = None
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            token_budget (int): maximum number of tokens in the history, 0 for unlimited
+            count_tokens (Callable[[str], int]): returns the number of tokens in a string
+            summarize (Callable[[str, list[BaseMessage]], str]): optional function returning
+                a new summary from the current summary and the dropped messages
+        '''
+
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.summarize = summarize
+
+        # (message, token count) pairs, oldest first
+        self.entries = deque()
+        self.total_tokens = 0
+
+        # incremented on every change, so answers requested ahead can tell their history is outdated
+        self.version = 0
+
+        # running summary of dropped turns and turns waiting to be summarized
+        self.summary = ''
+        self.pending = []
+        self.summary_thread = None
+        self.lock = threading.Lock()
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        ''' Return the summary and the messages within budget, oldest first '''
+
+        messages = [message for message, _ in self.entries]
+
+        if self.summary:
+            from langchain_core.messages import SystemMessage
+            summary = SystemMessage(content=f'Summary of the earlier conversation: {self.summary}')
+            messages.insert(0, summary)
+
+        return messages
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def append(self, message: BaseMessage) -> list[BaseMessage]:
+        '''Add a message to the history and drop the oldest turns above the token budget.
+
+        Args:
+            message (BaseMessage): message to add
+
+        Return:
+            (list[BaseMessage]): messages dropped from the history, oldest first
+        '''
+
+        tokens = self.count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+        self.entries.append((message, tokens))
+        self.total_tokens += tokens
+        self.version += 1
+
+        dropped = self.trim()
+
+        if dropped and self.summarize:
+            with self.lock:
+                self.pending.extend(dropped)
+
+        return dropped
+
+    def pop(self) -> BaseMessage:
+        '''Remove the latest message, like a question the model failed to answer.
+
+        Return:
+            (BaseMessage): the removed message
+        '''
+
+        message, tokens = self.entries.pop()
+        self.total_tokens -= tokens
+        self.version += 1
+
+        return message
+
+    def summarize_in_background(self) -> None:
+        ''' Start summarizing the dropped turns on a background thread. Call it between
+        turns so it never delays an answer. Only one summarization runs at a time, turns
+        dropped in the meantime are summarized on the next call. '''
+
+        with self.lock:
+            if not self.pending or (self.summary_thread and self.summary_thread.is_alive()):
+                return
+
+            dropped, self.pending = self.pending, []
+            self.summary_thread = threading.Thread(target=self._update_summary, args=[dropped], daemon=True)
+            self.summary_thread.start()
+
+    def _update_summary(self, dropped: list[BaseMessage]) -> None:
+        '''Merge dropped messages into the running summary.
+
+        Args:
+            dropped (list[BaseMessage]): messages dropped from the history, oldest first
+        '''
+
+        try:
+            summary = self.summarize(self.summary, dropped)
+
+        except Exception as e:
+            LOG.error(f'Error summarizing chat history: {e}')
+            # put messages back to try again between the next turns
+            with self.lock:
+                self.pending = dropped + self.pending
+            return
+
+        self.summary = summary
+        LOG.debug(f'Chat history summary updated with {len(dropped)} messages: {summary}')
+
+    def trim(self) -> list[BaseMessage]:
+        '''Drop the oldest turns until the history fits in the token budget. The latest
+        turn is always kept, even if it exceeds the budget on its own.
+
+        Return:
+            (list[BaseMessage]): messages dropped from the history, oldest first
+        '''
+
+        dropped = []
+
+        if not self.token_budget:
+            return dropped
+
+        while self.total_tokens > self.token_budget and self._turn_length() < len(self.entries):
+            for _ in range(self._turn_length()):
+                message, tokens = self.entries.popleft()
+                self.total_tokens -= tokens
+                dropped.append(message)
+
+        if dropped:
+            LOG.debug(f'Dropped {len(dropped)} messages from chat history ({self.total_tokens} tokens left)')
+
+        return dropped
+
+    def clear(self) -> None:
+        ''' Remove all messages '''
+
+        self.entries.clear()
+        self.total_tokens = 0
+        self.version += 1
+
+        with self.lock:
+            self.summary = ''
+            self.pending = []
+
+    def _turn_length(self) -> int:
+        ''' Return the number of messages in the oldest turn '''
+
+        length = 1
+        while length < len(self.entries) and self.entries[length][0].type != 'human':
+            length += 1
+
+        return length
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: chat_server.py
+Description: Defines the ChatServer class hosting many isolated chat sessions over HTTP and WebSocket.
+Sessions share one pooled HTTP client to the OpenAI API and one compiled langchain worker.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import uuid
+import asyncio
+from time import monotonic
+from pathlib import Path
+from typing import Any
+from aiohttp import web, WSMsgType
+from langchain_core.messages import HumanMessage, AIMessage
+import helpers as helpers
+from chat_memory import ChatMemory, get_token_counter
+from history_writer import HistoryWriter
+from text_normalizer import strip_unwanted_chars
+from history_store import create_history_store, NEW_CHAT
+from tracing import TRACER, CURRENT_TURN
+from hot_reload import HotReloader, SharedTurnLock
+
+# import config
+from config_loader import get_config
+config = get_config()
+
+# define logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# load user and chatbot names
+USER_NAME = config['user_name']
+CHATBOT_NAME = config['chatbot_name']
+
+# folder storing the chat history of each session, with the csv history backend
+SESSION_HISTORY_DIR = Path(__file__).parent / Path(config['server_history_dir'])
+
+
+class ChatSession:
+    '''
+    A chat with one user. Holds its own history and answers one message at a time.
+    '''
+
+    def __init__(self, session_id: str, worker, memory: ChatMemory, history: HistoryWriter, turn_lock: SharedTurnLock = None) -> None:
+        '''Create class instance
+
+        Args:
+            session_id (str): unique session id
+            worker (Any): langchain worker shared by all sessions
+            memory (ChatMemory): chat history of this session
+            history (HistoryWriter): chat history writer shared by all sessions
+            turn_lock (SharedTurnLock): optional lock shared by all sessions, held while answering so config reloads wait for the turn
+        '''
+
+        self.session_id = session_id
+        self.worker = worker
+        self.memory = memory
+        self.history = history
+        self.turn_lock = turn_lock or SharedTurnLock()
+
+        # messages of a session are answered in order
+        self.lock = asyncio.Lock()
+        self.last_active = monotonic()
+
+        # open websockets of the session, a connected session does not expire
+        self.connections = 0
+
+    async def answer(self, user_message: str, on_chunk=None) -> str:
+        '''Send new message and get answer from the LLM.
+
+        Args:
+            user_message (str): message to send to the LLM
+            on_chunk (Callable[[str], Awaitable]): optional coroutine function called with each answer chunk
+
+        Return:
+            (str): the answer
+        '''
+
+        async with self.lock, self.turn_lock.turn():
+            self.last_active = monotonic()
+
+            trace = TRACER.start_turn(self.session_id)
+            CURRENT_TURN.set(trace)
+
+            # add message to prompt and chat history
+            self.memory.append(HumanMessage(content=user_message))
+            self.history.write(self.session_id, USER_NAME, user_message)
+
+            # stream answer to the session output
+            chunks = []
+            inputs = {"input": user_message, "chat_history": self.memory.messages}
+
+            try:
+                with trace.span('llm'):
+                    async for chunk in helpers.astream_answer(self.worker, inputs):
+                        trace.mark('first_token')
+                        # remove any unwanted characters
+                        chunk = strip_unwanted_chars(chunk)
+                        chunks.append(chunk)
+                        if on_chunk:
+                            await on_chunk(chunk)
+
+            except asyncio.CancelledError:
+                trace.end('interrupted')
+                # the client left, an unanswered message would be sent again with every next message of the session
+                self.memory.pop()
+                raise
+
+            except Exception:
+                trace.end('error')
+                self.memory.pop()
+                raise
+
+            trace.end()
+            ai_message = ''.join(chunks)
+
+            # add answer to prompt and chat history
+            self.memory.append(AIMessage(content=ai_message))
+            self.history.write(self.session_id, CHATBOT_NAME, ai_message)
+
+            # summarize turns dropped from the history before the next message
+            self.memory.summarize_in_background()
+
+            self.last_active = monotonic()
+
+            return ai_message
+
+
+class ChatServer:
+    '''
+    Headless server hosting chat sessions. Routes:
+        POST   /sessions                  create a session, returns {"session_id": str}
+        DELETE /sessions/{session_id}     close a session
+        POST   /sessions/{session_id}/messages  send {"input": str}, returns {"output": str}
+        GET    /sessions/{session_id}/ws  websocket, send {"input": str}, receive
+                                          {"type": "chunk", "text": str} messages then {"type": "done", "text": str}
+        GET    /metrics                   latency percentiles of the chat stages, Prometheus text format (tracing enabled)
+    '''
+
+    def __init__(self, worker_type: str = None) -> None:
+        '''Create class instance
+
+        Args:
+            worker_type (str): langchain worker shared by all sessions, chain or agent. Defaults to config.
+
+        Raises:
+            ValueError: if worker type is invalid
+        '''
+
+        # workers are stateless (history is passed on each call), so one is shared by all sessions
+        self.worker_type = worker_type or config['server_worker']
+        self.worker, self.http_client = helpers.build_shared_worker(
+            self.worker_type,
+            max_connections=config['server_max_connections'],
+            # agent steps of every session would be printed to the server output
+            verbose=False,
+        )
+
+        self.count_tokens = get_token_counter(config['openai_model'])
+        self.summarize = helpers.build_summarizer() if config['history_summary'] else None
+
+        # one background writer for the chat history of all sessions
+        self.history = HistoryWriter(create_history_store(SESSION_HISTORY_DIR, per_session=True))
+
+        self.sessions = {}
+        # held by the turns of all sessions, a config reload waits until none is running
+        self.turn_lock = SharedTurnLock()
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.post('/sessions', self.create_session),
+            web.delete('/sessions/{session_id}', self.delete_session),
+            web.post('/sessions/{session_id}/messages', self.post_message),
+            web.get('/sessions/{session_id}/ws', self.websocket),
+            web.get('/metrics', self.metrics),
+        ])
+        self.app.cleanup_ctx.append(self._lifespan)
+
+    def run(self, host: str = None, port: int = None) -> None:
+        '''Start serving until interrupted.
+
+        Args:
+            host (str): host address, defaults to config
+            port (int): port, defaults to config
+        '''
+
+        web.run_app(self.app, host=host or config['server_host'], port=port or config['server_port'])
+
+    def new_session(self) -> ChatSession:
+        ''' Create and register a new session '''
+
+        session_id = uuid.uuid4().hex
+        memory = ChatMemory(config['history_token_budget'], self.count_tokens, self.summarize)
+        session = ChatSession(session_id, self.worker, memory, self.history, self.turn_lock)
+        self.sessions[session_id] = session
+
+        self.history.write(session_id, NEW_CHAT)
+        LOG.debug(f'Session created: {session_id} ({len(self.sessions)} active)')
+
+        return session
+
+    async def create_session(self, request: web.Request) -> web.Response:
+        ''' POST /sessions '''
+
+        session = self.new_session()
+        return web.json_response({'session_id': session.session_id}, status=201)
+
+    async def delete_session(self, request: web.Request) -> web.Response:
+        ''' DELETE /sessions/{session_id} '''
+
+        session = self._get_session(request)
+        del self.sessions[session.session_id]
+        LOG.debug(f'Session closed: {session.session_id}')
+
+        return web.Response(status=204)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        ''' GET /metrics '''
+
+        if not TRACER.enabled:
+            raise web.HTTPNotFound(reason='Tracing is disabled')
+
+        return web.Response(text=TRACER.prometheus_text(), content_type='text/plain')
+
+    async def post_message(self, request: web.Request) -> web.Response:
+        ''' POST /sessions/{session_id}/messages '''
+
+        session = self._get_session(request)
+        user_message = await self._read_input(request)
+
+        try:
+            answer = await session.answer(user_message)
+        except Exception as e:
+            LOG.error(f'Error generating answer in session {session.session_id}: {e}')
+            raise web.HTTPBadGateway(text='Error generating answer.')
+
+        return web.json_response({'output': answer})
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ''' GET /sessions/{session_id}/ws '''
+
+        session = self._get_session(request)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def send_chunk(chunk: str) -> None:
+            await ws.send_json({'type': 'chunk', 'text': chunk})
+
+        session.connections += 1
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+
+                try:
+                    user_message = str(msg.json()['input']).strip()
+                except (ValueError, KeyError, TypeError):
+                    await ws.send_json({'type': 'error', 'text': 'Expected {"input": str}.'})
+                    continue
+
+                if not user_message:
+                    continue
+
+                try:
+                    answer = await session.answer(user_message, on_chunk=send_chunk)
+                except Exception as e:
+                    LOG.error(f'Error generating answer in session {session.session_id}: {e}')
+                    # the client may be gone, which is why sending the answer failed
+                    if ws.closed:
+                        break
+                    try:
+                        await ws.send_json({'type': 'error', 'text': 'Error generating answer.'})
+                    except ConnectionResetError:
+                        break
+                    continue
+
+                await ws.send_json({'type': 'done', 'text': answer})
+
+        finally:
+            # the session ttl counts from the disconnection
+            session.connections -= 1
+            session.last_active = monotonic()
+
+        return ws
+
+    def _get_session(self, request: web.Request) -> ChatSession:
+        ''' Return the session from the request url or raise 404 '''
+
+        session = self.sessions.get(request.match_info['session_id'])
+        if session is None:
+            raise web.HTTPNotFound(text='Session not found.')
+
+        return session
+
+    async def _read_input(self, request: web.Request) -> str:
+        ''' Return the user message from a json request body or raise 400 '''
+
+        try:
+            user_message = str((await request.json())['input']).strip()
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text='Expected {"input": str}.')
+
+        if not user_message:
+            raise web.HTTPBadRequest(text='Empty input.')
+
+        return user_message
+
+    def rebuild_worker(self) -> Any:
+        ''' Returns a new shared worker built from the current config, using the same http client '''
+
+        worker, _ = helpers.build_shared_worker(self.worker_type, http_client=self.http_client, verbose=False)
+        return worker
+
+    def swap_worker(self, worker: Any) -> None:
+        '''Replace the worker of the server and of all sessions.
+
+        Args:
+            worker (Any): the new worker
+        '''
+
+        self.worker = worker
+        for session in self.sessions.values():
+            session.worker = worker
+
+    async def _lifespan(self, app: web.Application):
+        ''' Expire idle sessions while serving, close the shared http client and history writer on shutdown '''
+
+        tasks = [asyncio.create_task(self._expire_sessions())]
+
+        if config['hot_reload']:
+            # sessions answering a message keep the previous worker until their answer is done
+            reloader = HotReloader(rebuild=self.rebuild_worker, swap=self.swap_worker, interval=config['hot_reload_interval'])
+            tasks.append(asyncio.create_task(reloader.watch(self.turn_lock)))
+
+        yield
+
+        for task in tasks:
+            task.cancel()
+        await self.http_client.aclose()
+        self.history.close()
+
+    async def _expire_sessions(self) -> None:
+        ''' Close sessions inactive for longer than the session ttl, unless a websocket is still open '''
+
+        ttl = config['server_session_ttl']
+
+        while True:
+            await asyncio.sleep(min(ttl, 60))
+
+            now = monotonic()
+            expired = [
+                session_id for session_id, session in self.sessions.items()
+                if now - session.last_active > ttl and not session.lock.locked() and not session.connections
+            ]
+
+            for session_id in expired:
+                del self.sessions[session_id]
+
+            if expired:
+                LOG.debug(f'Expired {len(expired)} idle sessions ({len(self.sessions)} active)')
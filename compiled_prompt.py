@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: compiled_prompt.py
+Description: Prompt file parsed once and memoized by modification time, laid out so the provider can cache its static prefix, and reporting of cached prompt tokens.
+Example: prompt = load_compiled_prompt(); template = prompt.template(CHAIN_TAIL); ChatOpenAI(callbacks=[PROMPT_USAGE], **prompt.model_options())
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.prompts import ChatPromptTemplate
+from chat_memory import get_token_counter
+from tracing import current_turn
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# OpenAI only caches prompts from this many tokens, by blocks of 128 tokens
+PROVIDER_CACHE_MIN_TOKENS = 1024
+
+# messages following the static prefix, which change on every turn
+CHAIN_TAIL = (("placeholder", "{chat_history}"), ("human", "{input}"))
+AGENT_TAIL = CHAIN_TAIL + (("placeholder", "{agent_scratchpad}"),)
+
+# prompt files already parsed: path -> (modification time, size, compiled prompt)
+_compiled = {}
+_lock = threading.Lock()
+
+
+class CompiledPrompt:
+    '''
+    The system and few-shot messages of a prompt file. They form the static prefix of
+    every request: they come first, are sent byte for byte the same on every turn, and
+    the history and user message are appended after them. The provider caches a prompt
+    prefix it has seen recently, so only the history and new message are processed again.
+    '''
+
+    def __init__(self, messages: list[tuple[str, str]], source: str = '') -> None:
+        '''Create class instance
+
+        Args:
+            messages (list[tuple[str, str]]): role and content of the static messages
+            source (str): prompt file path, for logging
+        '''
+
+        # surrounding whitespace would make identical prompts differ after an edit of the file
+        self.messages = tuple((role, content.strip()) for role, content in messages)
+        self.source = source
+        self.digest = hashlib.sha1(json.dumps(self.messages).encode('utf-8')).hexdigest()[:16]
+
+        count_tokens = get_token_counter(config['openai_model'])
+        self.prefix_tokens = sum(count_tokens(content) for _, content in self.messages)
+
+        # tail of the prompt -> template, templates are immutable and shared by all workers
+        self.templates = {}
+        self.lock = threading.Lock()
+
+        if self.prefix_tokens < PROVIDER_CACHE_MIN_TOKENS:
+            LOG.debug(f'Prompt prefix of {source} has {self.prefix_tokens} tokens, below the {PROVIDER_CACHE_MIN_TOKENS} tokens the provider caches')
+
+    def template(self, tail: tuple[tuple[str, str], ...] = CHAIN_TAIL) -> ChatPromptTemplate:
+        '''Returns the prompt template made of the static messages followed by the tail.
+
+        Args:
+            tail (tuple[tuple[str, str], ...]): messages and placeholders appended to the static prefix
+
+        Return:
+            (ChatPromptTemplate): the prompt template
+
+        Raises:
+            ValueError: if the static messages contain template variables
+        '''
+
+        with self.lock:
+            template = self.templates.get(tail)
+
+            if template is None:
+                template = ChatPromptTemplate.from_messages(list(self.messages) + list(tail))
+                self._check_prefix(template, tail)
+                self.templates[tail] = template
+
+        return template
+
+    def model_options(self) -> dict[str, Any]:
+        '''Returns the chat model options for prompt caching: usage reported on streamed
+        answers, and a cache key routing requests with the same prefix to the same cache.
+
+        Return:
+            (dict[str, Any]): keyword arguments for ChatOpenAI
+        '''
+
+        options = {'stream_usage': True}
+
+        if config['openai_prompt_cache_key']:
+            options['extra_body'] = {'prompt_cache_key': f'ai_chatbot-{self.digest}'}
+
+        return options
+
+    def _check_prefix(self, template: ChatPromptTemplate, tail: tuple[tuple[str, str], ...]) -> None:
+        ''' Warn if the static messages use template variables, they would change the prefix on each turn '''
+
+        tail_variables = set(ChatPromptTemplate.from_messages(list(tail)).input_variables)
+        prefix_variables = set(template.input_variables) - tail_variables
+
+        if prefix_variables:
+            LOG.warning(f'Prompt file {self.source} uses variables {sorted(prefix_variables)}, its prefix cannot be cached')
+
+
+def load_compiled_prompt(prompt_filepath: str | Path = None) -> CompiledPrompt:
+    '''Returns the compiled prompt of a file, parsed again only if the file changed.
+
+    Args:
+        prompt_filepath (str | Path): path to jsonl file, prompt file from config if not given
+
+    Return:
+        (CompiledPrompt): the compiled prompt
+    '''
+
+    # imported here, helpers imports this module
+    from helpers import load_prompt_messages
+
+    if not prompt_filepath:
+        prompt_filepath = Path(__file__).parent / Path(config['prompt_filepath'])
+
+    path = str(Path(prompt_filepath).resolve())
+    stat = Path(path).stat()
+
+    with _lock:
+        entry = _compiled.get(path)
+        if entry and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            return entry[2]
+
+        prompt = CompiledPrompt(load_prompt_messages(path), source=path)
+        _compiled[path] = (stat.st_mtime_ns, stat.st_size, prompt)
+
+    LOG.debug(f'Prompt compiled from {path}: {len(prompt.messages)} messages, {prompt.prefix_tokens} tokens, digest {prompt.digest}')
+
+    return prompt
+
+
+class PromptUsageHandler(BaseCallbackHandler):
+    '''
+    Callback reading the token usage of each chat model call, and adding the cached and
+    uncached prompt tokens to the turn trace. An agent turn makes several calls, they add up.
+    '''
+
+    # runs in the context of the call, where the turn trace is set
+    run_inline = True
+
+    def on_llm_end(self, response: LLMResult, **kwargs) -> None:
+        ''' Report the prompt tokens of a finished call '''
+
+        prompt_tokens, cached_tokens = self.prompt_usage(response)
+        if prompt_tokens is None:
+            return
+
+        LOG.debug(f'Prompt tokens: {cached_tokens} cached, {prompt_tokens - cached_tokens} uncached')
+        current_turn().add_tokens(prompt=prompt_tokens, cached=cached_tokens, uncached=prompt_tokens - cached_tokens)
+
+    @staticmethod
+    def prompt_usage(response: LLMResult) -> tuple[int | None, int]:
+        '''Returns the prompt tokens and cached prompt tokens of a call.
+
+        Args:
+            response (LLMResult): result of the call
+
+        Return:
+            (tuple[int | None, int]): prompt tokens, None if the usage was not reported, and cached tokens
+        '''
+
+        # raw openai usage, only reported for non streamed calls
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        if 'prompt_tokens' in usage:
+            cached = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+            return usage['prompt_tokens'], cached
+
+        # standard usage of the message, cache details are only reported by recent langchain versions
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                if usage:
+                    cached = (usage.get('input_token_details') or {}).get('cache_read') or 0
+                    return usage['input_tokens'], cached
+
+        return None, 0
+
+
+# callback shared by all chat models
+PROMPT_USAGE = PromptUsageHandler()
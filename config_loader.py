@@ -8,13 +8,62 @@ Date: 2024-07-25
 """
 
 import yaml
-from typing import Optional, Dict
+import contextlib
+import contextvars
+from typing import Optional, Dict, Iterator
 
 _config: Optional[Dict] = None
+_config_file: Optional[str] = None
+
+# settings read instead of the loaded ones by the code running in config_snapshot()
+_snapshot = contextvars.ContextVar('config_snapshot', default=None)
+
+
+class Config(dict):
+    '''
+    The loaded settings. Code running in config_snapshot() reads the settings of the
+    snapshot instead, with [] and get(), while the rest of the process reads the loaded ones.
+    '''
+
+    def __getitem__(self, key):
+        snapshot = _snapshot.get()
+        return super().__getitem__(key) if snapshot is None else snapshot[key]
+
+    def get(self, key, default=None):
+        snapshot = _snapshot.get()
+        return super().get(key, default) if snapshot is None else snapshot.get(key, default)
+
+
+def read_config(config_file: str) -> Dict:
+    ''' Read a config file and return it as a dictionary, without loading it
+
+    Args:
+        config_file (str): path to the config file
+
+    Returns:
+        (Dict): the configuration as a dictionary
+
+    Raises:
+        FileNotFoundError: if config file is not found
+        ValueError: if error parsing the YAML file
+    '''
+
+    try:
+        with open(config_file, "r") as file:
+            config = yaml.safe_load(file)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Config file {config_file} not found.")
+    except yaml.YAMLError as e:
+        raise ValueError(f"Error parsing YAML file: {e}")
+
+    if not isinstance(config, dict):
+        raise ValueError(f"Config file {config_file} is not a mapping of settings.")
+
+    return config
 
 
 def load_config(config_file: str) -> Dict:
-    ''' Load config file and return it as a dictionary 
+    ''' Load config file and return it as a dictionary
 
     Args:
         config_file (str): path to the config file
@@ -27,16 +76,11 @@ def load_config(config_file: str) -> Dict:
         ValueError: if error parsing the YAML file
     '''
 
-    global _config
+    global _config, _config_file
 
     if _config is None:
-        try:
-            with open(config_file, "r") as file:
-                _config = yaml.safe_load(file)
-        except FileNotFoundError:
-            raise FileNotFoundError(f"Config file {config_file} not found.")
-        except yaml.YAMLError as e:
-            raise ValueError(f"Error parsing YAML file: {e}")
+        _config = Config(read_config(config_file))
+        _config_file = config_file
 
     return _config
 
@@ -52,3 +96,41 @@ def get_config() -> Dict:
         raise ValueError("Config not loaded. Call 'load_config' first.")
 
     return _config
+
+
+def get_config_file() -> Optional[str]:
+    ''' Return the path of the loaded config file '''
+    return _config_file
+
+
+def update_config(new_config: Dict) -> None:
+    ''' Replace the settings of the loaded config dict in place, so modules holding it see the new values
+
+    Args:
+        new_config (Dict): new settings, with all the keys of the loaded config
+
+    Raises:
+        ValueError: if config is not loaded
+    '''
+
+    config = get_config()
+    config.update(new_config)
+
+    for key in set(config) - set(new_config):
+        del config[key]
+
+
+@contextlib.contextmanager
+def config_snapshot(settings: Dict) -> Iterator[None]:
+    ''' Read settings instead of the loaded config in the current context, like to build objects from a new
+    config before it is applied. Threads started meanwhile read the loaded config, unless they copy the context.
+
+    Args:
+        settings (Dict): settings to read, with all the keys of the loaded config
+    '''
+
+    token = _snapshot.set(settings)
+    try:
+        yield
+    finally:
+        _snapshot.reset(token)
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: fact_index.py
+Description: Local embedding index of persona facts, memory-mapped from disk, built incrementally and searched by cosine similarity.
+Example: index = FactIndex('cache/facts/yourself', embeddings.embed_documents, embeddings.embed_query); index.build(facts); index.search('favourite movie')
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import os
+import json
+import mmap
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Iterable
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# index files
+MANIFEST = 'index.json'
+VECTORS = 'vectors.npy'
+HASHES = 'hashes.npy'
+TEXTS = 'facts.jsonl'
+OFFSETS = 'offsets.npy'
+CENTROIDS = 'centroids.npy'
+LIST_OFFSETS = 'lists.npy'
+
+# facts searched at once, bounds the memory used by brute force search
+SEARCH_BLOCK = 65536
+
+# fact indexes by subject, built on first use
+INDEXES = {}
+INDEXES_LOCK = threading.Lock()
+
+
+def fact_hash(fact: str) -> bytes:
+    ''' Returns the digest identifying a fact in the index '''
+    return hashlib.sha1(fact.encode('utf-8')).digest()
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    ''' Scales vectors to unit length, so dot products are cosine similarities '''
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return vectors / norms
+
+
+def train_centroids(sample: np.ndarray, lists: int, iterations: int = 10) -> np.ndarray:
+    '''Clusters unit vectors with spherical k-means.
+
+    Args:
+        sample (np.ndarray): unit vectors to cluster
+        lists (int): number of clusters
+        iterations (int): k-means iterations
+
+    Return:
+        (np.ndarray): unit length centroids
+    '''
+
+    rng = np.random.default_rng(0)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+
+        # sum the vectors of each cluster, empty clusters keep their centroid
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=lists)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        centroids = normalize_rows(centroids)
+
+    return centroids
+
+
+class FactIndex:
+    '''
+    Embedding index of facts stored in a directory and memory-mapped on load, so only
+    the parts read by a search stay in memory. Building it again only embeds the facts
+    that were added. Small indexes are searched exhaustively. Above ann_min_facts, the
+    vectors are clustered and stored cluster by cluster (inverted file), and a search
+    only scans the clusters closest to the query, which is approximate but much faster.
+    '''
+
+    def __init__(
+        self,
+        directory: str | Path,
+        embed_documents: Callable[[list[str]], list[list[float]]],
+        embed_query: Callable[[str], list[float]],
+        model: str = '',
+        ann_min_facts: int = 50000,
+        ann_probes: int = 16
+    ) -> None:
+        '''Create class instance and load the index if it exists
+
+        Args:
+            directory (str | Path): directory of the index files
+            embed_documents (Callable[[list[str]], list[list[float]]]): returns the embeddings of a list of facts
+            embed_query (Callable[[str], list[float]]): returns the embedding of a query
+            model (str): name of the embedding model, the index is rebuilt when it changes
+            ann_min_facts (int): number of facts from which the index is clustered for approximate search, 0 to never cluster
+            ann_probes (int): number of clusters scanned by an approximate search
+        '''
+
+        self.directory = Path(directory)
+        self.embed_documents = embed_documents
+        self.embed_query = embed_query
+        self.model = model
+        self.ann_min_facts = ann_min_facts
+        self.ann_probes = ann_probes
+
+        self.manifest = {}
+        self.vectors = None
+        self.hashes = None
+        self.texts = None
+        self.offsets = None
+        self.centroids = None
+        self.list_offsets = None
+
+        self.lock = threading.Lock()
+        self._load()
+
+    def __len__(self) -> int:
+        return self.manifest.get('count', 0)
+
+    def fact(self, row: int) -> str:
+        ''' Returns the fact stored at a row of the index '''
+        return json.loads(self.texts[self.offsets[row]:self.offsets[row + 1]])
+
+    def build(self, facts: Iterable[str], source: dict = None, batch_size: int = 256) -> int:
+        '''Update the index to contain exactly the given facts. Facts already indexed keep
+        their embedding, new ones are embedded in batches.
+
+        Args:
+            facts (Iterable[str]): all the facts, duplicates are ignored
+            source (dict): optional description of the facts source saved with the index, see is_built_from
+            batch_size (int): number of facts embedded per request
+
+        Return:
+            (int): number of facts embedded
+        '''
+
+        facts = list(dict.fromkeys(fact for fact in facts if fact))
+        hashes = np.array([fact_hash(fact) for fact in facts], dtype='S20')
+
+        with self.lock:
+            if self._contains_exactly(hashes):
+                self._save_manifest({**self.manifest, 'source': source})
+                return 0
+
+            known = {}
+            if self.manifest.get('model') == self.model:
+                known = {digest: row for row, digest in enumerate(self.hashes)}
+
+            staging = self.directory.with_name(self.directory.name + '.new')
+            shutil.rmtree(staging, ignore_errors=True)
+            staging.mkdir(parents=True)
+
+            # write the vectors in facts order, reusing the known embeddings
+            embedded = 0
+            vectors = None
+            # row of each fact in the current index, -1 for new facts
+            previous_rows = np.full(len(facts), -1, dtype=np.int64)
+
+            for start in range(0, len(facts), batch_size):
+                batch = range(start, min(start + batch_size, len(facts)))
+                new_rows = [row for row in batch if hashes[row] not in known]
+                reused_rows = [row for row in batch if hashes[row] in known]
+                new_vectors = None
+
+                if new_rows:
+                    new_vectors = normalize_rows(np.asarray(self.embed_documents([facts[row] for row in new_rows]), dtype=np.float32))
+                    embedded += len(new_rows)
+
+                if vectors is None:
+                    dimensions = new_vectors.shape[1] if new_vectors is not None else self.vectors.shape[1]
+                    vectors = np.lib.format.open_memmap(staging / VECTORS, mode='w+', dtype=np.float32, shape=(len(facts), dimensions))
+
+                if new_rows:
+                    vectors[new_rows] = new_vectors
+                if reused_rows:
+                    previous_rows[reused_rows] = [known[hashes[row]] for row in reused_rows]
+                    vectors[reused_rows] = self.vectors[previous_rows[reused_rows]]
+
+            order = None
+            if vectors is not None and self.ann_min_facts and len(facts) >= self.ann_min_facts:
+                order = self._cluster(vectors, staging, previous_rows)
+                vectors.flush()
+                del vectors
+                self._reorder(staging / VECTORS, order)
+
+            elif vectors is not None:
+                vectors.flush()
+                del vectors
+
+            if order is not None:
+                hashes = hashes[order]
+                facts = [facts[row] for row in order]
+
+            self._write_texts(staging, facts)
+            np.save(staging / HASHES, hashes)
+
+            manifest = {'model': self.model, 'count': len(facts), 'ann': order is not None, 'source': source}
+            with open(staging / MANIFEST, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+
+            # swap the index directories, the old files are closed first
+            self._close()
+            retired = self.directory.with_name(self.directory.name + '.old')
+            shutil.rmtree(retired, ignore_errors=True)
+            if self.directory.exists():
+                self.directory.rename(retired)
+            staging.rename(self.directory)
+            shutil.rmtree(retired, ignore_errors=True)
+
+            self._load()
+
+        LOG.info(f"Fact index {self.directory} built: {len(facts)} facts, {embedded} embedded, ann: {order is not None}")
+        return embedded
+
+    def is_built_from(self, source: dict) -> bool:
+        ''' Returns True if the index was built from the given source, to skip reading it again '''
+        return bool(self.manifest) and self.manifest.get('model') == self.model and self.manifest.get('source') == source
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0) -> list[tuple[str, float]]:
+        '''Find the facts closest to a query.
+
+        Args:
+            query (str): text to search for
+            k (int): maximum number of facts returned
+            min_score (float): minimum cosine similarity of a returned fact
+
+        Return:
+            (list[tuple[str, float]]): facts and their similarity, most similar first
+        '''
+
+        if not len(self):
+            return []
+
+        vector = normalize_rows(np.asarray([self.embed_query(query)], dtype=np.float32))[0]
+        return self.search_vector(vector, k, min_score)
+
+    def search_vector(self, vector: np.ndarray, k: int = 5, min_score: float = 0.0) -> list[tuple[str, float]]:
+        '''Find the facts closest to a unit query vector.
+
+        Args:
+            vector (np.ndarray): unit query vector
+            k (int): maximum number of facts returned
+            min_score (float): minimum cosine similarity of a returned fact
+
+        Return:
+            (list[tuple[str, float]]): facts and their similarity, most similar first
+        '''
+
+        with self.lock:
+            if not len(self):
+                return []
+
+            if self.centroids is not None:
+                # scan the closest clusters only, stored as contiguous blocks of rows
+                probes = min(self.ann_probes, len(self.centroids))
+                closest = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes]
+                blocks = [(self.list_offsets[i], self.list_offsets[i + 1]) for i in closest]
+            else:
+                blocks = [(start, min(start + SEARCH_BLOCK, len(self))) for start in range(0, len(self), SEARCH_BLOCK)]
+
+            rows = np.empty(0, dtype=np.int64)
+            scores = np.empty(0, dtype=np.float32)
+
+            for start, end in blocks:
+                if start == end:
+                    continue
+                # keep the best k of each block, so memory does not grow with the index
+                block_scores = self.vectors[start:end] @ vector
+                best = np.argpartition(-block_scores, min(k, len(block_scores)) - 1)[:k]
+                rows = np.concatenate([rows, best + start])
+                scores = np.concatenate([scores, block_scores[best]])
+
+            best = np.argsort(-scores)[:k]
+
+            return [(self.fact(rows[i]), float(scores[i])) for i in best if scores[i] >= min_score]
+
+    def _contains_exactly(self, hashes: np.ndarray) -> bool:
+        ''' Returns True if the index holds these facts and nothing else '''
+
+        if self.hashes is None or self.manifest.get('model') != self.model or len(hashes) != len(self.hashes):
+            return False
+
+        return bool(np.array_equal(np.sort(hashes), np.sort(self.hashes)))
+
+    def _cluster(self, vectors: np.ndarray, staging: Path, previous_rows: np.ndarray) -> np.ndarray:
+        ''' Cluster the vectors, save the centroids and cluster offsets, return the rows in cluster order.
+        While the index has not doubled in size since it was clustered, the clusters are kept
+        and only the new facts are assigned to them. '''
+
+        assignments = np.full(len(vectors), -1, dtype=np.int64)
+
+        if self.centroids is not None and len(vectors) <= 2 * len(self):
+            centroids = self.centroids
+            reused = previous_rows >= 0
+            assignments[reused] = np.searchsorted(self.list_offsets, previous_rows[reused], side='right') - 1
+        else:
+            lists = max(1, int(np.sqrt(len(vectors))))
+            sample_size = min(len(vectors), lists * 32)
+            sample = np.asarray(vectors[np.sort(np.random.default_rng(0).choice(len(vectors), sample_size, replace=False))])
+            centroids = train_centroids(sample, lists)
+
+        unassigned = np.flatnonzero(assignments < 0)
+        for start in range(0, len(unassigned), SEARCH_BLOCK):
+            rows = unassigned[start:start + SEARCH_BLOCK]
+            assignments[rows] = np.argmax(vectors[rows] @ centroids.T, axis=1)
+
+        counts = np.bincount(assignments, minlength=len(centroids))
+        np.save(staging / CENTROIDS, centroids)
+        np.save(staging / LIST_OFFSETS, np.concatenate([[0], np.cumsum(counts)]))
+
+        return np.argsort(assignments, kind='stable')
+
+    def _reorder(self, path: Path, order: np.ndarray) -> None:
+        ''' Rewrite a vectors file with its rows in the given order '''
+
+        source = np.load(path, mmap_mode='r')
+        target_path = path.with_name('ordered_' + path.name)
+        target = np.lib.format.open_memmap(target_path, mode='w+', dtype=source.dtype, shape=source.shape)
+
+        for start in range(0, len(order), SEARCH_BLOCK):
+            target[start:start + SEARCH_BLOCK] = source[order[start:start + SEARCH_BLOCK]]
+
+        target.flush()
+        del source, target
+        os.replace(target_path, path)
+
+    def _write_texts(self, directory: Path, facts: list[str]) -> None:
+        ''' Save the facts as json lines with their byte offsets '''
+
+        offsets = np.zeros(len(facts) + 1, dtype=np.int64)
+
+        with open(directory / TEXTS, 'wb') as f:
+            for row, fact in enumerate(facts):
+                line = json.dumps(fact, ensure_ascii=False).encode('utf-8') + b'\n'
+                f.write(line)
+                offsets[row + 1] = offsets[row] + len(line)
+
+        np.save(directory / OFFSETS, offsets)
+
+    def _save_manifest(self, manifest: dict) -> None:
+        ''' Update the manifest of the current index '''
+
+        self.manifest = manifest
+        with open(self.directory / MANIFEST, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+    def _load(self) -> None:
+        ''' Memory-map the index files, if the index exists '''
+
+        if not (self.directory / MANIFEST).exists():
+            return
+
+        with open(self.directory / MANIFEST, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        if not self.manifest['count']:
+            self.hashes = np.empty(0, dtype='S20')
+            return
+
+        self.vectors = np.load(self.directory / VECTORS, mmap_mode='r')
+        self.hashes = np.load(self.directory / HASHES, mmap_mode='r')
+        self.offsets = np.load(self.directory / OFFSETS, mmap_mode='r')
+        with open(self.directory / TEXTS, 'rb') as f:
+            self.texts = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.manifest['ann']:
+            self.centroids = np.load(self.directory / CENTROIDS)
+            self.list_offsets = np.load(self.directory / LIST_OFFSETS)
+
+    def _close(self) -> None:
+        ''' Release the memory-mapped files '''
+
+        if self.texts is not None:
+            self.texts.close()
+
+        self.manifest = {}
+        self.vectors = self.hashes = self.texts = self.offsets = self.centroids = self.list_offsets = None
+
+
+def read_facts(filepath: str | Path) -> dict[str, list[str]]:
+    '''Reads a facts file, one json object per line with the subject of the fact and the fact:
+    {"about": "yourself", "fact": "Your favourite color is yellow"}
+
+    Args:
+        filepath (str | Path): path of the facts file
+
+    Return:
+        (dict[str, list[str]]): facts by subject
+    '''
+
+    facts = {}
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                facts.setdefault(entry['about'], []).append(entry['fact'])
+
+    return facts
+
+
+def get_fact_index(about: str) -> FactIndex:
+    '''Returns the index of the facts about a subject, as configured. On first use, all the
+    indexes are loaded and updated if the facts file changed since they were built.
+
+    Args:
+        about (str): subject of the facts, as written in the facts file
+
+    Return:
+        (FactIndex): the index, empty if there are no facts about this subject
+    '''
+
+    with INDEXES_LOCK:
+        if not INDEXES:
+            filepath = Path(__file__).parent / Path(config['facts_filepath'])
+            stat = filepath.stat()
+            source = {'path': str(filepath), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+            embeddings = OpenAIEmbeddings(
+                model=config['facts_embedding_model'],
+                dimensions=config['facts_embedding_dimensions'] or None,
+                api_key=config['openai_api_key'],
+                base_url=config['openai_base_url'] or None,
+            )
+
+            def create_index(subject: str) -> FactIndex:
+                return FactIndex(
+                    Path(__file__).parent / Path(config['facts_index_dir']) / subject,
+                    embeddings.embed_documents,
+                    embeddings.embed_query,
+                    model=f"{config['facts_embedding_model']}:{config['facts_embedding_dimensions']}",
+                    ann_min_facts=config['facts_ann_min_facts'],
+                    ann_probes=config['facts_ann_probes'],
+                )
+
+            indexes = {subject: create_index(subject) for subject in ('yourself', 'interlocutor')}
+
+            if not all(index.is_built_from(source) for index in indexes.values()):
+                facts = read_facts(filepath)
+                for subject, index in indexes.items():
+                    index.build(facts.get(subject, []), source)
+
+            INDEXES.update(indexes)
+
+    return INDEXES.get(about)
+
+
+def reset_fact_indexes() -> None:
+    ''' Close the indexes, the next search loads them again from the current config '''
+
+    with INDEXES_LOCK:
+        for index in INDEXES.values():
+            index._close()
+        INDEXES.clear()
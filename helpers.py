@@ -8,29 +8,38 @@ Author: @alexdjulin
 Date: 2024-07-25
 """
 
+from __future__ import annotations
 import os
+import io
 from pathlib import Path
 import sys
 import csv
 import json
+import queue
+import threading
+import functools
 from datetime import datetime
-from time import sleep
-from textwrap import dedent
-# TTS
-import edge_tts
+from time import sleep, perf_counter
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator
 import asyncio
-# Audio playback
-from pydub import AudioSegment
-from pydub.playback import play
-# STT
-import speech_recognition as sr
-# langchain
-from langchain_core.runnables.base import RunnableSequence
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from text_normalizer import normalize_whitespace
+# tracing
+from tracing import current_turn
+# audio, speech and LLM packages are slow to import, so functions import them on first use:
+# text chats never load the audio stack, and the LLM stack loads on the thread building the worker
+if TYPE_CHECKING:
+    import httpx
+    import edge_tts
+    from pydub import AudioSegment
+    from audio_capture import AudioCapture
+    from stt import GoogleStt, VoskStt
+    from tts_pipeline import TtsPipeline
+    from tts_cache import TtsCache
+    from response_cache import ResponseCache
+    from langchain_core.messages import BaseMessage
+    from langchain_core.runnables.base import RunnableSequence
+    from langchain.agents import AgentExecutor
+    from langchain_openai import ChatOpenAI
 # config loader
 from config_loader import get_config
 config = get_config()
@@ -43,6 +52,19 @@ from importlib import import_module
 terminal_colors_md = import_module('terminal_colors')
 AI_CLR = getattr(terminal_colors_md, config['ai_color'], MAGENTA)
 
+# edge_tts streams mp3 audio at 24kHz mono
+EDGE_TTS_SAMPLE_RATE = 24000
+EDGE_TTS_CHANNELS = 1
+
+# cache of synthesized speech, created on first use so text chats never create its folder
+TTS_CACHE = None
+TTS_CACHE_LOCK = threading.Lock()
+
+# speech to text engine and audio capture service, kept for the whole chat
+STT_ENGINE = None
+AUDIO_CAPTURE = None
+AUDIO_CAPTURE_LOCK = threading.Lock()
+
 
 def format_string(prompt: str) -> str:
     ''' Removes tabs, line breaks and extra spaces from strings. This is useful
@@ -55,17 +77,8 @@ def format_string(prompt: str) -> str:
         (str): formatted string
     '''
 
-    # remove tabs and line breaks
-    prompt = dedent(prompt).replace('\n', ' ').replace('\t', ' ')
-
-    # remove extra spaces
-    while '  ' in prompt:
-        prompt = prompt.replace('  ', ' ')
-
-    # remove leading and trailing spaces
-    prompt = prompt.strip()
-
-    return prompt
+    # single pass, linear in the length of the string
+    return normalize_whitespace(prompt)
 
 
 def write_to_csv(csvfile: str, *strings: list) -> bool:
@@ -99,6 +112,27 @@ def write_to_csv(csvfile: str, *strings: list) -> bool:
     return True
 
 
+def get_tts_cache() -> TtsCache | None:
+    ''' Returns the cache of synthesized speech, creating it on first call. None if disabled in config. '''
+
+    from tts_cache import TtsCache
+
+    global TTS_CACHE
+
+    if not config['tts_cache']:
+        return None
+
+    with TTS_CACHE_LOCK:
+        if TTS_CACHE is None:
+            TTS_CACHE = TtsCache(
+                cache_dir=Path(__file__).parent / Path(config['tts_cache_dir']),
+                max_memory_bytes=config['tts_cache_memory_mb'] * 1024 * 1024,
+                max_disk_bytes=config['tts_cache_disk_mb'] * 1024 * 1024,
+            )
+
+        return TTS_CACHE
+
+
 def load_prompt_messages(prompt_filepath: str = None) -> list[tuple[str, str]]:
     ''' Loads messages from a jsonl file and returns them as a list of tuples.
 
@@ -116,35 +150,52 @@ def load_prompt_messages(prompt_filepath: str = None) -> list[tuple[str, str]]:
 
     with open(prompt_filepath, 'r', encoding='utf-8') as f:
         for line in f:
-            message = json.loads(line)['role'], json.loads(line)['content']
-            messages.append(message)
+            if line.strip():
+                message = json.loads(line)
+                messages.append((message['role'], message['content']))
 
     return messages
 
 
-def build_chain() -> RunnableSequence:
+def openai_max_retries() -> int:
+    ''' Returns how many times the openai client retries a failed request. Zero when the calls
+    go through the resilient worker: it retries them itself, within the turn deadlines, and
+    client retries would multiply the attempts and bypass its rate limit setting. '''
+
+    return 0 if config['llm_resilience'] else 2
+
+
+def build_chain(llm: ChatOpenAI = None) -> RunnableSequence:
     ''' Creates a langchain chain to chat with the avatar.
 
+    Args:
+        llm (ChatOpenAI): optional model to use, created from config if not provided
+
     Return:
         (RunnableSequence): chain instance
     '''
 
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_openai import ChatOpenAI
+    from compiled_prompt import load_compiled_prompt, PROMPT_USAGE, CHAIN_TAIL
+
+    # prompt file is parsed once, static messages first and history and input after them
+    compiled_prompt = load_compiled_prompt()
+
     # create openai model and link it to tools
-    llm_gpt4 = ChatOpenAI(
+    llm_gpt4 = llm or ChatOpenAI(
         model=config['openai_model'],
         api_key=config['openai_api_key'],
+        base_url=config['openai_base_url'] or None,
         temperature=config['openai_temperature'],
+        streaming=config['stream_answer'],
+        max_retries=openai_max_retries(),
+        callbacks=[PROMPT_USAGE],
+        **compiled_prompt.model_options(),
     )
 
-    # load messages
-    messages = load_prompt_messages()
-
-    # add placeholders
-    messages.append(("placeholder", "{chat_history}"))
-    messages.append(("human", "{input}"))
-
     # create prompt
-    prompt = ChatPromptTemplate.from_messages(messages)
+    prompt = compiled_prompt.template(CHAIN_TAIL)
 
     # create string output parser
     str_output_parser = StrOutputParser()
@@ -157,16 +208,23 @@ def build_chain() -> RunnableSequence:
     return chain
 
 
-def build_agent(placeholders: list[str] = None) -> AgentExecutor:
+def build_agent(placeholders: list[str] = None, llm: ChatOpenAI = None, verbose: bool = None) -> AgentExecutor:
     ''' Defines a langchain agent with access to a list of tools to perform a task.
 
     Args:
         placeholders (list): optional list of placeholder variables added to the prompt
+        llm (ChatOpenAI): optional model to use, created from config if not provided
+        verbose (bool): print the agent steps to stdout. Defaults to config.
 
     Return:
         (AgentExecutor): the agent instance
     '''
 
+    from langchain.agents import create_tool_calling_agent
+    from langchain_openai import ChatOpenAI
+    from tool_utils import ConcurrentAgentExecutor
+    from compiled_prompt import load_compiled_prompt, PROMPT_USAGE, AGENT_TAIL
+
     # import tools module
     try:
         sys.path.append(os.path.dirname(config['tools_filepath']))
@@ -176,133 +234,640 @@ def build_agent(placeholders: list[str] = None) -> AgentExecutor:
         LOG.error(f"Error importing tools module: {e}. Add a tool-")
         raise
 
-    # create openai model and link it to tools
-    llm_gpt4 = ChatOpenAI(model=config['openai_model'], api_key=config['openai_api_key'])
-
-    # create prompt
-    messages = load_prompt_messages()
+    # prompt file is parsed once, static messages first and history and input after them
+    compiled_prompt = load_compiled_prompt()
 
-    # add default placeholders
-    messages.append(("placeholder", "{chat_history}"))
-    messages.append(("human", "{input}"))
-    messages.append(("placeholder", "{agent_scratchpad}"))
+    # create openai model and link it to tools
+    llm_gpt4 = llm or ChatOpenAI(
+        model=config['openai_model'],
+        api_key=config['openai_api_key'],
+        base_url=config['openai_base_url'] or None,
+        streaming=config['stream_answer'],
+        max_retries=openai_max_retries(),
+        callbacks=[PROMPT_USAGE],
+        **compiled_prompt.model_options(),
+    )
 
-    # add custom placeholders
-    if placeholders:
-        for placeholder in placeholders:
-            messages.append(("placeholder", "{" + placeholder + "}"))
+    # add default and custom placeholders
+    tail = AGENT_TAIL + tuple(("placeholder", "{" + placeholder + "}") for placeholder in placeholders or [])
 
     # create prompt
-    prompt = ChatPromptTemplate.from_messages(messages)
+    prompt = compiled_prompt.template(tail)
 
     # create langchain agent
     agent = create_tool_calling_agent(llm_gpt4, tools.agent_tools, prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=tools.agent_tools, verbose=config['agent_verbose'])
+    agent_executor = ConcurrentAgentExecutor(agent=agent, tools=tools.agent_tools, verbose=config['agent_verbose'] if verbose is None else verbose)
 
     return agent_executor
 
 
-def generate_tts(text: str, language: str = None) -> None:
-    ''' Generates audio from text using edge_tts API and plays it
+def build_shared_worker(
+    worker_type: str,
+    max_connections: int = None,
+    http_client: httpx.AsyncClient = None,
+    retry_rate_limits: bool = True,
+    verbose: bool = None,
+) -> tuple[Any, httpx.AsyncClient]:
+    ''' Creates a chain or agent shared by many concurrent conversations, with one pooled
+    HTTP client to the OpenAI API. Workers are stateless (history is passed on each call).
+    The worker is wrapped in the resilient call layer and the response cache if enabled,
+    cache keys include the history digest so answers are not mixed between conversations.
+
+    Args:
+        worker_type (str): chain or agent
+        max_connections (int): size of the HTTP connection pool, if a new client is created
+        http_client (httpx.AsyncClient): optional client to reuse, like when rebuilding the worker
+        retry_rate_limits (bool): if false, failed requests are not retried by the openai client and rate limit errors are not
+            retried by the resilient worker, for callers pacing their requests
+        verbose (bool): print the agent steps to stdout. Defaults to config.
+
+    Return:
+        (tuple[Any, httpx.AsyncClient]): the worker and its HTTP client, to close when done
+
+    Raises:
+        ValueError: if worker type is invalid
+    '''
+
+    import httpx
+    from langchain_openai import ChatOpenAI
+    from response_cache import CachedWorker
+    from resilient_worker import ResilientWorker
+    from compiled_prompt import load_compiled_prompt, PROMPT_USAGE
+
+    valid_workers = {'chain', 'agent'}
+    if worker_type not in valid_workers:
+        LOG.error(f'Invalid worker {worker_type}. Chose from {valid_workers}')
+        raise ValueError(f'Invalid worker. Chose from: {valid_workers}')
+
+    http_client = http_client or httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=httpx.Timeout(60.0, connect=10.0),
+    )
+
+    llm = ChatOpenAI(
+        model=config['openai_model'],
+        api_key=config['openai_api_key'],
+        base_url=config['openai_base_url'] or None,
+        streaming=True,
+        # client retries would resend rate limited requests behind the back of a caller pacing them
+        max_retries=openai_max_retries() if retry_rate_limits else 0,
+        http_async_client=http_client,
+        callbacks=[PROMPT_USAGE],
+        **load_compiled_prompt().model_options(),
+    )
+
+    worker = build_chain(llm) if worker_type == 'chain' else build_agent(llm=llm, verbose=verbose)
+
+    if config['llm_resilience']:
+        worker = ResilientWorker(worker, stream_answer, astream_answer, retry_rate_limits=retry_rate_limits)
+
+    if config['response_cache']:
+        worker = CachedWorker(
+            worker,
+            cache=build_response_cache(),
+            stream_answer=stream_answer,
+            astream_answer=astream_answer,
+            history_messages=config['response_cache_history'],
+        )
+
+    return worker, http_client
+
+
+def build_response_cache() -> ResponseCache:
+    ''' Creates the response cache from config, with an embedding lookup if semantic matching is enabled.
+
+    Return:
+        (ResponseCache): the response cache
+    '''
+
+    from response_cache import ResponseCache
+
+    embed = None
+    if config['response_cache_semantic']:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(
+            model=config['response_cache_embedding_model'],
+            api_key=config['openai_api_key'],
+            base_url=config['openai_base_url'] or None,
+        )
+        embed = embeddings.embed_query
+
+    return ResponseCache(
+        max_entries=config['response_cache_size'],
+        ttl=config['response_cache_ttl'],
+        embed=embed,
+        threshold=config['response_cache_threshold'],
+    )
+
+
+def build_summarizer() -> Callable[[str, list[BaseMessage]], str]:
+    ''' Creates a function merging chat messages into a running summary using the LLM.
+    The model is created on the first summary, off the startup path.
+
+    Return:
+        (Callable[[str, list[BaseMessage]], str]): function returning the new summary from the current summary and new messages
+    '''
+
+    @functools.cache
+    def build_chain() -> RunnableSequence:
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_openai import ChatOpenAI
+
+        llm_gpt4 = ChatOpenAI(
+            model=config['openai_model'],
+            api_key=config['openai_api_key'],
+            base_url=config['openai_base_url'] or None,
+            temperature=0,
+        )
+
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", format_string(f'''
+                You maintain the summary of a conversation between {config['user_name']} (human) and {config['chatbot_name']} (ai).
+                Merge the new messages into the current summary. Keep facts, names, preferences and open questions.
+                Answer with the new summary only, in less than {config['history_summary_words']} words.
+            ''')),
+            ("human", "Current summary:\n{summary}\n\nNew messages:\n{messages}"),
+        ])
+
+        return prompt | llm_gpt4 | StrOutputParser()
+
+    def summarize(summary: str, messages: list[BaseMessage]) -> str:
+        transcript = '\n'.join(f'{message.type}: {message.content}' for message in messages)
+        return build_chain().invoke({"summary": summary or 'None', "messages": transcript})
+
+    return summarize
+
+
+def is_agent(worker: Any) -> bool:
+    ''' Returns True if the worker is an agent. Agents import langchain.agents, so a chain
+    is told apart without importing it on the first turn. '''
+
+    agents = sys.modules.get('langchain.agents')
+    return agents is not None and isinstance(worker, agents.AgentExecutor)
+
+
+def stream_answer(worker: RunnableSequence | AgentExecutor, inputs: dict) -> Iterator[str]:
+    ''' Invokes the langchain worker and yields the answer in chunks as they are generated.
+
+    Args:
+        worker (RunnableSequence | AgentExecutor): chain or agent created by build_chain or build_agent
+        inputs (dict): input variables of the prompt (input, chat_history, etc.)
+
+    Yield:
+        (str): answer chunks
+
+    Raises:
+        Exception: any error raised by the worker
+    '''
+
+    if not is_agent(worker):
+        # chains end with a string output parser and stream text chunks natively
+        yield from worker.stream(inputs)
+        return
+
+    from tool_utils import TokenQueueHandler
+
+    # agents only stream their intermediate steps, so we collect the llm tokens
+    # through a callback while the agent runs on a separate thread
+    token_queue = queue.Queue()
+    result = {}
+
+    def run_agent() -> None:
+        try:
+            result['answer'] = worker.invoke(inputs, config={'callbacks': [TokenQueueHandler(token_queue)]})
+        except Exception as e:
+            result['error'] = e
+        finally:
+            token_queue.put(None)
+
+    threading.Thread(target=run_agent, daemon=True).start()
+
+    streamed = False
+    while (token := token_queue.get()) is not None:
+        streamed = True
+        yield token
+
+    if 'error' in result:
+        raise result['error']
+
+    # model did not stream (streaming disabled or not supported), send full output at once
+    if not streamed:
+        yield result['answer'].get('output', '')
+
+
+def tts_communicate(text: str, language: str) -> edge_tts.Communicate:
+    ''' Creates an edge_tts communicate instance using the voice settings from config
+
+    Args:
+        text (str): text to generate audio from
+        language (str): the language to use for the voice
+
+    Return:
+        (edge_tts.Communicate): the communicate instance
+    '''
+
+    import edge_tts
+
+    return edge_tts.Communicate(
+        text=text,
+        voice=config['edgetts_voices'][language],
+        rate=config['tts_rate'],
+        volume=config['tts_volume'],
+        pitch=config['tts_pitch']
+    )
+
+
+@functools.cache
+def load_miniaudio():
+    ''' Imports the optional in-process mp3 decoder, returns None if not installed '''
+
+    try:
+        import miniaudio
+    except ImportError:
+        return None
+
+    return miniaudio
+
+
+def decode_mp3(data: bytes) -> AudioSegment:
+    ''' Decodes mp3 data in memory. Uses miniaudio in-process if installed, pydub
+    and ffmpeg through pipes otherwise.
+
+    Args:
+        data (bytes): mp3 encoded audio
+
+    Return:
+        (AudioSegment): the decoded audio
+    '''
+
+    from pydub import AudioSegment
+
+    miniaudio = load_miniaudio()
+    if miniaudio is None:
+        with current_turn().span('decode'):
+            return AudioSegment.from_file(io.BytesIO(data), format='mp3')
+
+    with current_turn().span('decode'):
+        decoded = miniaudio.decode(data, nchannels=EDGE_TTS_CHANNELS, sample_rate=EDGE_TTS_SAMPLE_RATE)
+
+    return AudioSegment(
+        data=decoded.samples.tobytes(),
+        sample_width=decoded.sample_width,
+        frame_rate=decoded.sample_rate,
+        channels=decoded.nchannels,
+    )
+
+
+def synthesize_speech(text: str, language: str) -> AudioSegment:
+    ''' Generates audio from text using edge_tts API. In memory mode, audio chunks are
+    streamed into a buffer and decoded without touching the disk. In file mode, audio
+    is saved to the temp audio file, loaded and deleted.
 
     Args:
         text (str): text to generate audio from
         language (str): the language to use for the voice
 
+    Return:
+        (AudioSegment): the generated audio
+
     Raises:
-        Exception: if error generating and playing audio
+        Exception: if error generating audio
     '''
 
-    voice = config['edgetts_voices'][language]
-    audio_file = config['temp_audio_filepath']
-    os.makedirs(Path(audio_file).parent, exist_ok=True)
-
-    async def text_to_audio() -> None:
-        """ Generate speech from text and save it to a file """
-        communicate = edge_tts.Communicate(
-            text=text,
-            voice=voice,
-            rate=config['tts_rate'],
-            volume=config['tts_volume'],
-            pitch=config['tts_pitch']
+    if config['tts_audio_mode'] == 'file':
+        from pydub import AudioSegment
+
+        audio_file = config['temp_audio_filepath']
+        os.makedirs(Path(audio_file).parent, exist_ok=True)
+
+        # generate audio file, load and delete it
+        asyncio.run(tts_communicate(text, language).save(audio_file))
+        audio = AudioSegment.from_file(audio_file)
+        os.remove(audio_file)
+
+        return audio
+
+    return decode_mp3(synthesize_mp3(text, language))
+
+
+def synthesize_mp3(text: str, language: str) -> bytes:
+    ''' Generates mp3 audio from text using edge_tts API, streaming the audio chunks into
+    a memory buffer. Audio is looked up in the TTS cache first if enabled.
+
+    Args:
+        text (str): text to generate audio from
+        language (str): the language to use for the voice
+
+    Return:
+        (bytes): mp3 encoded audio
+
+    Raises:
+        Exception: if error generating audio
+    '''
+
+    tts_cache = get_tts_cache()
+
+    if tts_cache:
+        key = tts_cache.make_key(
+            text,
+            config['edgetts_voices'][language],
+            config['tts_rate'],
+            config['tts_volume'],
+            config['tts_pitch']
         )
+        data = tts_cache.get(key)
+        if data is not None:
+            return data
 
-        await communicate.save(audio_file)
+    async def text_to_audio() -> bytes:
+        """ Stream speech audio chunks from text into a memory buffer """
+        buffer = io.BytesIO()
+        async for chunk in tts_communicate(text, language).stream():
+            if chunk['type'] == 'audio':
+                buffer.write(chunk['data'])
+        return buffer.getvalue()
 
-    # generate audio data
-    try:
-        asyncio.run(text_to_audio())
+    data = asyncio.run(text_to_audio())
 
-    except Exception as e:
-        LOG.error(f"Error generating and playing audio: {e}. Voice deactivated.")
-        # print answer and exit
-        print(f'{CLEAR}{AI_CLR}{text}')
+    if tts_cache and data:
+        tts_cache.put(key, data)
+
+    return data
+
+
+def prerender_tts(language: str) -> None:
+    ''' Synthesizes the phrases listed in config into the TTS cache, so they play
+    without a network round trip the first time they are spoken.
+
+    Args:
+        language (str): the language to use for the voice
+    '''
+
+    tts_cache = get_tts_cache()
+    if not tts_cache:
+        return
+
+    for phrase in config['tts_cache_prerender'] or []:
+        try:
+            synthesize_mp3(phrase, language)
+        except Exception as e:
+            LOG.warning(f"Error pre-rendering '{phrase}': {e}")
+
+    LOG.debug(f'TTS cache pre-rendered: {tts_cache.stats()}')
+
+
+def create_tts_pipeline(language: str) -> TtsPipeline:
+    ''' Creates and starts a TTS pipeline, printing each sentence when it starts playing.
+    Feed it text chunks, then close and join it to wait until the answer is spoken.
+    Cancelling the pipeline stops playback right away. Must be called from a running event loop.
+
+    Args:
+        language (str): the language to use for the voice
+
+    Return:
+        (TtsPipeline): the running pipeline
+    '''
+
+    from audio_player import AudioPlayer
+    from tts_pipeline import TtsPipeline
+
+    def print_sentence(sentence: str, index: int) -> None:
+        # clear the chat feedback before the first sentence
+        prefix = f'{CLEAR}{AI_CLR}' if index == 0 else f'{AI_CLR}'
+        print(f'{prefix}{sentence}', end=' ', flush=True)
+
+    # one player per answer, keeping its output open between sentences. Stopping it interrupts the answer
+    player = AudioPlayer(block_duration=config['barge_in_latency'], on_playing=set_echo_guard)
+
+    pipeline = TtsPipeline(
+        synthesize=lambda sentence: synthesize_speech(sentence, language),
+        play=player.play,
+        on_sentence=print_sentence,
+        stop=player.stop,
+        close=player.close,
+    )
+
+    return pipeline.start()
+
+
+async def astream_answer(worker: RunnableSequence | AgentExecutor, inputs: dict) -> AsyncIterator[str]:
+    ''' Invokes the langchain worker asynchronously and yields the answer in chunks as they are generated.
+
+    Args:
+        worker (RunnableSequence | AgentExecutor): chain or agent created by build_chain or build_agent
+        inputs (dict): input variables of the prompt (input, chat_history, etc.)
+
+    Yield:
+        (str): answer chunks
+
+    Raises:
+        Exception: any error raised by the worker
+    '''
+
+    if not is_agent(worker):
+        # chains end with a string output parser and stream text chunks natively
+        async for chunk in worker.astream(inputs):
+            yield chunk
         return
 
-    # print answer
-    print(f'{CLEAR}{AI_CLR}{text}')
+    # agents only stream their intermediate steps, so we listen to the llm token events
+    streamed = False
 
-    # play and delete audio file
-    audio = AudioSegment.from_file(audio_file)
-    play(audio)
+    async for event in worker.astream_events(inputs, version='v2'):
+        if event['event'] == 'on_chat_model_stream':
+            # skip empty tokens sent while the model is building tool calls
+            token = event['data']['chunk'].content
+            if token:
+                streamed = True
+                yield token
 
-    # deleve temporary audio file
-    os.remove(audio_file)
+        elif event['event'] == 'on_chain_end' and not event['parent_ids'] and not streamed:
+            # model did not stream, send full output of the agent at once
+            yield event['data']['output'].get('output', '')
 
 
-def record_audio_message(exit_chat: dict, input_method: str, language: str) -> str | None:
-    ''' Record voice and return text transcription.
+def generate_tts(text: str, language: str = None) -> None:
+    ''' Generates audio from text using edge_tts API and plays it, sentence by sentence
+
+    Args:
+        text (str): text to generate audio from
+        language (str): the language to use for the voice
+    '''
+
+    async def speak() -> None:
+        pipeline = create_tts_pipeline(language)
+        await pipeline.feed(text)
+        await pipeline.close()
+        await pipeline.join()
+
+    asyncio.run(speak())
+    print(RESET)
+
+
+def set_echo_guard(playing: bool) -> None:
+    '''Raises the speech detection threshold while the avatar speaks, so barge-in is
+    triggered by the user and not by the avatar's voice picked up by the microphone.
+
+    Args:
+        playing (bool): True when playback starts, False when it ends
+    '''
+
+    if AUDIO_CAPTURE is not None:
+        AUDIO_CAPTURE.echo_guard = config['barge_in_echo_guard'] if playing else 1.0
+
+
+def get_audio_capture() -> AudioCapture:
+    '''Returns the long-lived audio capture service, starting it on first call. It reads
+    the microphone, or the wav files listed in config to test voice input without one.
+
+    Return:
+        (AudioCapture): the running capture service
+    '''
+
+    from audio_capture import AudioCapture, MicrophoneSource, WavFileSource
+
+    global AUDIO_CAPTURE
+
+    with AUDIO_CAPTURE_LOCK:
+        if AUDIO_CAPTURE is None:
+            if config['speech_input_wav']:
+                source = WavFileSource(*config['speech_input_wav'])
+            else:
+                source = MicrophoneSource()
+
+            AUDIO_CAPTURE = AudioCapture(
+                source,
+                pre_roll=config['speech_pre_roll'],
+                pause_threshold=config['speech_pause_threshold'],
+                min_speech=config['speech_min_duration'],
+                calibration_duration=config['speech_calibration_duration'],
+                recalibrate_interval=config['speech_recalibrate_interval'],
+            ).start()
+
+        return AUDIO_CAPTURE
+
+
+def get_stt_engine() -> GoogleStt | VoskStt:
+    '''Returns the speech to text engine, creating it on first call (local models are loaded once).
+
+    Return:
+        (GoogleStt | VoskStt): the engine selected in config
+    '''
+
+    from stt import create_stt_engine
+
+    global STT_ENGINE
+
+    with AUDIO_CAPTURE_LOCK:
+        if STT_ENGINE is None:
+            STT_ENGINE = create_stt_engine()
+
+        return STT_ENGINE
+
+
+def close_audio_capture() -> None:
+    ''' Stop the audio capture service and close the microphone '''
+
+    global AUDIO_CAPTURE
+
+    with AUDIO_CAPTURE_LOCK:
+        if AUDIO_CAPTURE is not None:
+            AUDIO_CAPTURE.close()
+            AUDIO_CAPTURE = None
+
+
+def record_audio_message(
+    exit_chat: dict,
+    input_method: str,
+    language: str,
+    on_partial: Callable[[str], None] = None,
+    on_speech_start: Callable[[], None] = None,
+    show_status: bool = True
+) -> str | None:
+    ''' Record voice and return text transcription. The phrase is transcribed while
+    it is recorded, so the final text is ready soon after the user stops talking.
 
     Args:
         exit_chat (dict): chat exit flag {'value': bool} passed by reference as mutable dicts so it can be modified on keypress and updated here.
         input_method (str): input method to use for transcription
         language (str): language to use for transcription
+        on_partial (Callable[[str], None]): optional callback with the partial transcripts, called from this thread
+        on_speech_start (Callable[[], None]): optional callback called when the user starts talking, called from this thread
+        show_status (bool): if false, don't print the listening status (the avatar is talking)
 
     Return:
         (str | None): text transcription
-
-    Raises:
-        UnknownValueError: if audio could not be transcribed
-        RequestError: if error connecting to Google API
     '''
 
-    text = ''
-    recognizer = sr.Recognizer()
-    microphone = sr.Microphone()
+    import speech_recognition as sr
 
-    try:
+    capture = get_audio_capture()
+    stt_engine = get_stt_engine()
 
-        with microphone as source:
+    # listen and stt spans of the turn started by this message, if traced
+    trace = current_turn()
+    speech_start = []
 
-            if not exit_chat['value']:
-                print(f"{CLEAR}{GREY}(listening){RESET}", end=' ', flush=True)
-                audio = recognizer.listen(source, timeout=config['speech_timeout'], phrase_time_limit=config['phrase_time_out'])
+    def speech_started() -> None:
+        speech_start.append(perf_counter())
+        if on_speech_start:
+            on_speech_start()
 
-            if not exit_chat['value']:
-                print(f"{CLEAR}{GREY}(transcribing){RESET}", end=' ', flush=True)
-                text = recognizer.recognize_google(audio, language=language)
+    # in voice mode, keep listening until the user speaks
+    while not exit_chat['value']:
+
+        try:
+            if show_status:
+                print(f"{CLEAR}{GREY}(listening){RESET}", end=' ', flush=True)
+            stt_session = stt_engine.start(capture.sample_rate, language)
+            chunks = capture.stream_phrase(
+                timeout=config['speech_timeout'],
+                phrase_time_limit=config['phrase_time_out'],
+                should_stop=lambda: exit_chat['value'],
+                on_speech_start=speech_started
+            )
+
+            # transcribe the phrase while it is recorded
+            for chunk in chunks:
+                partial = stt_session.accept(chunk)
+                if partial and on_partial:
+                    on_partial(partial)
+
+            if exit_chat['value']:
+                # chat ended while listening
+                return None
+
+            speech_end = perf_counter()
+            print(f"{CLEAR}{GREY}(transcribing){RESET}", end=' ', flush=True)
+            text = stt_session.finish()
+            LOG.debug(f'End of speech to final transcript: {perf_counter() - speech_end:.3f}s')
+
+            # the turn latency counts from the end of speech
+            trace.add('listen', speech_start[-1] if speech_start else speech_end, speech_end)
+            trace.add('stt', speech_end)
+            trace.set_origin(speech_end)
 
             if not text:
                 raise sr.UnknownValueError
 
             return text.capitalize()
 
-    except sr.WaitTimeoutError:
-        if input_method == 'voice_k':
-            print(f"{CLEAR}{GREY}Can't hear you. Please try again.{RESET}", end=' ', flush=True)
-        else:
+        except sr.WaitTimeoutError:
+            if input_method == 'voice_k':
+                print(f"{CLEAR}{GREY}Can't hear you. Please try again.{RESET}", end=' ', flush=True)
+                return None
+
+        except sr.UnknownValueError:
+            if not exit_chat['value']:
+                print(f"{CLEAR}{GREY}Can't understand audio. Please try again.{RESET}", end=' ', flush=True)
+            sleep(0.5)
+            return None
+
+        except sr.RequestError:
             if not exit_chat['value']:
-                # start listening again
-                record_audio_message(exit_chat, input_method, language)
-
-    except sr.UnknownValueError:
-        if not exit_chat['value']:
-            print(f"{CLEAR}{GREY}Can't understand audio. Please try again.{RESET}", end=' ', flush=True)
-        sleep(0.5)
-
-    except sr.RequestError:
-        if not exit_chat['value']:
-            print(f"{CLEAR}{GREY}Error connecting to Google API. Please try again.{RESET}", end=' ', flush=True)
-        sleep(0.5)
+                print(f"{CLEAR}{GREY}Error connecting to Google API. Please try again.{RESET}", end=' ', flush=True)
+            sleep(0.5)
+            return None
 
     return None
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: history_store.py
+Description: Pluggable chat history backends: csv files (default) or an indexed SQLite database, with rotation.
+Example: store = create_history_store('csv/chat_history.csv'); store.write_rows(rows); store.close()
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import os
+import csv
+import sqlite3
+from datetime import datetime
+from time import time
+from pathlib import Path
+from typing import Iterator, NamedTuple
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# speaker written on the first row of each chat
+NEW_CHAT = 'NEW CHAT'
+
+
+class HistoryRow(NamedTuple):
+    ''' A chat history row, strings are already formatted '''
+    session_id: str
+    timestamp: str
+    speaker: str
+    message: str | None = None
+
+
+def csv_row(row: HistoryRow) -> list[str]:
+    ''' Returns the csv columns of a row, as written by helpers.write_to_csv '''
+
+    columns = [row.speaker] if row.message is None else [row.speaker, row.message]
+
+    if config['add_timestamp']:
+        columns = [row.timestamp] + columns
+
+    return columns
+
+
+def rotate_file(path: Path) -> Path:
+    '''Renames a file with a timestamp suffix, so a new file is started at the same path.
+
+    Args:
+        path (Path): file to rotate
+
+    Return:
+        (Path): the rotated file
+    '''
+
+    suffix = datetime.now().strftime('%Y%m%d-%H%M%S')
+    rotated = path.with_name(f'{path.stem}-{suffix}{path.suffix}')
+
+    # never overwrite a file rotated in the same second
+    count = 1
+    while rotated.exists():
+        rotated = path.with_name(f'{path.stem}-{suffix}-{count}{path.suffix}')
+        count += 1
+
+    os.replace(path, rotated)
+    LOG.debug(f'Chat history rotated to {rotated}')
+
+    return rotated
+
+
+def rotation_order(path: Path, rotated: Path) -> tuple[str, int]:
+    '''Returns the sort key of a file rotated by rotate_file: its timestamp, then its
+    index among the files rotated in the same second (none first, then -1, -2...).
+
+    Args:
+        path (Path): current file
+        rotated (Path): rotated file
+
+    Return:
+        (tuple[str, int]): sort key, oldest first
+    '''
+
+    # {stem}-{YYYYmmdd}-{HHMMSS}[-{index}]{suffix}
+    parts = rotated.stem[len(path.stem) + 1:].split('-')
+    index = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
+
+    return '-'.join(parts[:2]), index
+
+
+def needs_rotation(path: Path, started: float, max_bytes: int, max_age: float) -> bool:
+    '''Returns True if a file is too big or has been written to for too long.
+
+    Args:
+        path (Path): file to check
+        started (float): time the file was started
+        max_bytes (int): maximum file size, 0 for no limit
+        max_age (float): maximum file age in seconds, 0 for no limit
+
+    Return:
+        (bool): True if the file should be rotated
+    '''
+
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return False
+
+    return bool((max_bytes and size >= max_bytes) or (max_age and time() - started >= max_age))
+
+
+def file_started(path: Path, max_age: float) -> float:
+    '''Returns the start time of a file opened for writing. A file left untouched for
+    longer than max_age by a previous run is rotated first.
+
+    Args:
+        path (Path): file about to be opened
+        max_age (float): maximum file age in seconds, 0 for no limit
+
+    Return:
+        (float): start time to use for time based rotation
+    '''
+
+    if max_age and path.exists() and time() - path.stat().st_mtime >= max_age:
+        rotate_file(path)
+
+    return time()
+
+
+class CsvHistoryStore:
+    '''
+    Appends rows to a csv file, or to one csv file per session, in the format written
+    by helpers.write_to_csv. Files stay open between writes.
+    '''
+
+    def __init__(self, path: str, per_session: bool = False, max_bytes: int = 0, max_age: float = 0) -> None:
+        '''Create class instance
+
+        Args:
+            path (str): csv file, or directory if per_session is true
+            per_session (bool): if true, write each session to its own csv file in path
+            max_bytes (int): rotate files above this size, 0 for no limit
+            max_age (float): rotate files older than this many seconds, 0 for no limit
+        '''
+
+        self.path = Path(path)
+        self.per_session = per_session
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        os.makedirs(self.path if per_session else self.path.parent, exist_ok=True)
+
+        # path -> (file, csv writer) and path -> start time
+        self.files = {}
+        self.started = {}
+
+    def write_rows(self, rows: list[HistoryRow]) -> None:
+        '''Append rows to their csv files.
+
+        Args:
+            rows (list[HistoryRow]): rows to write
+        '''
+
+        for row in rows:
+            file, csv_writer = self._open(self._file_path(row.session_id))
+            csv_writer.writerow(csv_row(row))
+
+    def flush(self, fsync: bool = False) -> None:
+        '''Flush written rows to the operating system, and to disk if fsync is true.
+
+        Args:
+            fsync (bool): force rows to disk
+        '''
+
+        for path, (file, _) in list(self.files.items()):
+            file.flush()
+            if fsync:
+                os.fsync(file.fileno())
+
+            if needs_rotation(path, self.started[path], self.max_bytes, self.max_age):
+                file.close()
+                del self.files[path]
+                rotate_file(path)
+
+    def close(self) -> None:
+        ''' Close all files '''
+
+        for file, _ in self.files.values():
+            file.close()
+        self.files.clear()
+        self.started.clear()
+
+    def _file_path(self, session_id: str) -> Path:
+        ''' Return the csv file of a session '''
+        return self.path / f'{session_id}.csv' if self.per_session else self.path
+
+    def _open(self, path: Path) -> tuple:
+        ''' Return the open file and csv writer of a path, opening it if needed '''
+
+        if path not in self.files:
+            # keep a bounded number of files open when writing one file per session
+            if len(self.files) >= 64:
+                oldest = next(iter(self.files))
+                self.files.pop(oldest)[0].close()
+
+            self.started[path] = file_started(path, self.max_age)
+            file = open(path, mode='a', newline='', encoding='utf-8')
+            self.files[path] = (file, csv.writer(file, quoting=csv.QUOTE_ALL, doublequote=True))
+
+        return self.files[path]
+
+
+class SqliteHistoryStore:
+    '''
+    Stores rows in a SQLite database in WAL mode, indexed by session id, speaker and
+    timestamp. The database is rotated to a timestamped file when too big or too old;
+    queries run over the current and rotated databases.
+    '''
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            speaker TEXT NOT NULL,
+            message TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+        CREATE INDEX IF NOT EXISTS idx_messages_speaker ON messages (speaker, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp);
+    '''
+
+    def __init__(self, path: str, max_bytes: int = 0, max_age: float = 0) -> None:
+        '''Create class instance
+
+        Args:
+            path (str): database file
+            max_bytes (int): rotate the database above this size, 0 for no limit
+            max_age (float): rotate the database older than this many seconds, 0 for no limit
+        '''
+
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        os.makedirs(self.path.parent, exist_ok=True)
+        self.started = file_started(self.path, max_age)
+        self.connection = self._connect()
+
+    def write_rows(self, rows: list[HistoryRow]) -> None:
+        '''Insert rows in a single transaction.
+
+        Args:
+            rows (list[HistoryRow]): rows to write
+        '''
+
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO messages (session_id, timestamp, speaker, message) VALUES (?, ?, ?, ?)',
+                rows
+            )
+
+    def flush(self, fsync: bool = False) -> None:
+        '''Rows are committed by write_rows. With fsync, the WAL is synced on every commit.
+
+        Args:
+            fsync (bool): force rows to disk
+        '''
+
+        self.connection.execute(f"PRAGMA synchronous = {'FULL' if fsync else 'NORMAL'}")
+
+        if needs_rotation(self.path, self.started, self.max_bytes, self.max_age):
+            # closing the last connection merges the wal file into the database before it is renamed
+            self.connection.close()
+            rotate_file(self.path)
+            self.started = time()
+            self.connection = self._connect()
+
+    def close(self) -> None:
+        ''' Close the database '''
+        self.connection.close()
+
+    def files(self) -> list[Path]:
+        ''' Return the current and rotated database files, newest first '''
+
+        # sort on the parsed name, files rotated in the same second get an index that sorts wrong as text
+        rotated = self.path.parent.glob(f'{self.path.stem}-*{self.path.suffix}')
+        return [self.path] + sorted(rotated, key=lambda rotated: rotation_order(self.path, rotated), reverse=True)
+
+    def session(self, session_id: str) -> list[HistoryRow]:
+        '''Return the rows of a session in order.
+
+        Args:
+            session_id (str): session id
+
+        Return:
+            (list[HistoryRow]): rows of the session
+        '''
+
+        rows = []
+        for connection in self._read_connections():
+            rows = connection.execute(
+                'SELECT session_id, timestamp, speaker, message FROM messages WHERE session_id = ? ORDER BY id',
+                (session_id,)
+            ).fetchall() + rows
+
+        return [HistoryRow(*row) for row in rows]
+
+    def time_range(self, start: datetime, end: datetime, speaker: str = None) -> list[HistoryRow]:
+        '''Return the rows written between two dates, optionally from one speaker only.
+
+        Args:
+            start (datetime): range start, included
+            end (datetime): range end, excluded
+            speaker (str): optional speaker name
+
+        Return:
+            (list[HistoryRow]): rows in chronological order
+        '''
+
+        query = 'SELECT session_id, timestamp, speaker, message FROM messages WHERE timestamp >= ? AND timestamp < ?'
+        params = [start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)]
+
+        if speaker:
+            query += ' AND speaker = ?'
+            params.append(speaker)
+
+        query += ' ORDER BY timestamp, id'
+
+        rows = []
+        for connection in self._read_connections():
+            rows = connection.execute(query, params).fetchall() + rows
+
+        return [HistoryRow(*row) for row in rows]
+
+    def export_csv(self, csvfile: str, session_id: str = None) -> int:
+        '''Export rows to a csv file in the format written by helpers.write_to_csv.
+
+        Args:
+            csvfile (str): csv file to write
+            session_id (str): optional session to export, all rows otherwise
+
+        Return:
+            (int): number of rows exported
+        '''
+
+        count = 0
+
+        with open(csvfile, mode='w', newline='', encoding='utf-8') as file:
+            csv_writer = csv.writer(file, quoting=csv.QUOTE_ALL, doublequote=True)
+
+            for row in self._iter_rows(session_id):
+                csv_writer.writerow(csv_row(row))
+                count += 1
+
+        return count
+
+    def _iter_rows(self, session_id: str = None) -> Iterator[HistoryRow]:
+        ''' Yield rows oldest first, streaming from the rotated databases to the current one '''
+
+        query = 'SELECT session_id, timestamp, speaker, message FROM messages'
+        params = ()
+
+        if session_id:
+            query += ' WHERE session_id = ?'
+            params = (session_id,)
+
+        for connection in self._read_connections(oldest_first=True):
+            for row in connection.execute(query + ' ORDER BY id', params):
+                yield HistoryRow(*row)
+
+    def _read_connections(self, oldest_first: bool = False) -> Iterator[sqlite3.Connection]:
+        '''Yield read-only connections to the current and rotated databases, newest first.
+        With WAL, reads don't block the writer thread.
+
+        Args:
+            oldest_first (bool): yield the oldest database first instead
+        '''
+
+        files = self.files()
+        if oldest_first:
+            files.reverse()
+
+        for path in files:
+            if not path.exists():
+                continue
+
+            connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                yield connection
+            finally:
+                connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        ''' Open the database in WAL mode and create the schema '''
+
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        connection.executescript(self.SCHEMA)
+
+        return connection
+
+
+def create_history_store(csv_path: str, per_session: bool = False) -> CsvHistoryStore | SqliteHistoryStore:
+    '''Creates the chat history backend selected in config.
+
+    Args:
+        csv_path (str): csv file, or directory if per_session is true, used by the csv backend
+        per_session (bool): if true, the csv backend writes one file per session
+
+    Return:
+        (CsvHistoryStore | SqliteHistoryStore): the history store
+
+    Raises:
+        ValueError: if the backend is invalid
+    '''
+
+    backend = config['history_backend']
+    max_bytes = config['history_rotate_mb'] * 1024 * 1024
+    max_age = config['history_rotate_days'] * 24 * 3600
+
+    if backend == 'csv':
+        return CsvHistoryStore(csv_path, per_session, max_bytes, max_age)
+
+    if backend == 'sqlite':
+        return SqliteHistoryStore(Path(__file__).parent / Path(config['history_db']), max_bytes, max_age)
+
+    LOG.error(f"Invalid history backend '{backend}'. Chose from {{'csv', 'sqlite'}}")
+    raise ValueError(f"Invalid history backend '{backend}'. Chose from {{'csv', 'sqlite'}}")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: history_writer.py
+Description: Buffered chat history writer, sending rows to a history store on a background thread.
+Example: history = HistoryWriter(create_history_store('csv/chat_history.csv')); history.write(session_id, 'Me', 'Hello'); history.close()
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import queue
+import threading
+from datetime import datetime
+from time import monotonic
+from pathlib import Path
+from text_normalizer import normalize_whitespace
+from history_store import HistoryRow, TIMESTAMP_FORMAT
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+
+class HistoryWriter:
+    '''
+    Writes chat history without touching the disk on the calling thread. Rows are
+    queued and sent in batches to a history store (csv or SQLite) by a background
+    thread, when enough rows are buffered or the oldest buffered row gets too old.
+    Closing the writer drains the queue.
+    '''
+
+    def __init__(
+        self,
+        store,
+        flush_rows: int = None,
+        flush_interval: float = None,
+        fsync: bool = None,
+        max_queue: int = None
+    ) -> None:
+        '''Create class instance and start the writer thread. Arguments default to config.
+
+        Args:
+            store (CsvHistoryStore | SqliteHistoryStore): history backend receiving the rows
+            flush_rows (int): number of buffered rows triggering a write
+            flush_interval (float): maximum time in seconds a row stays buffered
+            fsync (bool): if true, every row is written and synced to disk right away
+            max_queue (int): maximum number of rows waiting in the queue
+        '''
+
+        self.store = store
+        self.flush_rows = flush_rows or config['history_flush_rows']
+        self.flush_interval = flush_interval or config['history_flush_interval']
+        self.fsync = config['history_fsync'] if fsync is None else fsync
+
+        self.queue = queue.Queue(maxsize=max_queue or config['history_queue_size'])
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, session_id: str, *strings: list) -> bool:
+        '''Queue a chat message to add to the history on a new row.
+
+        Args:
+            session_id (str): id of the chat session
+            *strings (list): speaker and message, or speaker only for markers like 'NEW CHAT'
+
+        Return:
+            (bool): True if queued, False if the queue stayed full
+        '''
+
+        timestamp = datetime.now().strftime(TIMESTAMP_FORMAT)
+
+        try:
+            # wait a little if the writer is behind, rather than blocking the chat
+            self.queue.put((session_id, timestamp, strings), timeout=1.0)
+
+        except queue.Full:
+            LOG.error(f'Chat history queue full, message dropped: {strings}')
+            return False
+
+        return True
+
+    def flush(self) -> None:
+        ''' Block until all queued rows are written '''
+
+        self.queue.join()
+
+    def close(self) -> None:
+        ''' Write all queued rows, close the store and stop the writer thread '''
+
+        if not self.thread.is_alive():
+            return
+
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self) -> None:
+        ''' Writer thread: batch rows from the queue and write them '''
+
+        batch = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(deadline - monotonic(), 0)
+
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ...  # flush interval elapsed
+
+            if item is None:
+                self._write_batch(batch)
+                self.queue.task_done()
+                break
+
+            if item is not ...:
+                batch.append(item)
+                if deadline is None:
+                    deadline = monotonic() + self.flush_interval
+
+            if item is ... or self.fsync or len(batch) >= self.flush_rows:
+                self._write_batch(batch)
+                batch, deadline = [], None
+
+        self.store.close()
+
+    def _write_batch(self, batch: list) -> None:
+        ''' Send a batch of rows to the store and mark them done in the queue '''
+
+        if batch:
+            # remove tabs, line breaks and extra spaces
+            rows = [
+                HistoryRow(session_id, timestamp, *[normalize_whitespace(s) for s in strings])
+                for session_id, timestamp, strings in batch
+            ]
+
+            try:
+                self.store.write_rows(rows)
+                self.store.flush(self.fsync)
+            except Exception as e:
+                LOG.error(f"Error writing chat history: {e}")
+
+        for _ in batch:
+            self.queue.task_done()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: hot_reload.py
+Description: Reloads the config file, prompt file and tools module when they change, and swaps in a rebuilt worker between turns.
+Example: reloader = HotReloader(rebuild=build_worker, swap=set_worker); asyncio.create_task(reloader.watch(turn_lock))
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import asyncio
+import importlib
+import contextlib
+from pathlib import Path
+from typing import Any, Callable
+import config_loader
+from config_loader import get_config, read_config, update_config, config_snapshot
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# settings the worker is built from, changing them rebuilds the worker
+WORKER_KEYS = ('openai_', 'llm_', 'response_cache', 'agent_', 'facts_', 'prompt_filepath', 'tools_filepath', 'stream_answer')
+
+# settings read once when the chat starts, changing them needs a restart. Names ending
+# with an underscore are prefixes, others are exact names.
+RESTART_KEYS = (
+    'user_name', 'chatbot_name', 'user_color', 'ai_color', 'input_method', 'input_queue_size',
+    'agent_tool_workers', 'tts_cache', 'tts_cache_', 'stt_', 'barge_in', 'speculative_prefetch', 'speculation_',
+    'speech_pre_roll', 'speech_pause_threshold', 'speech_min_duration', 'speech_calibration_duration',
+    'speech_recalibrate_interval', 'speech_input_wav', 'history_', 'chat_history', 'clear_history',
+    'log_', 'empty_log', 'tracing', 'tracing_', 'server_', 'batch_', 'hot_reload', 'hot_reload_',
+)
+
+# roles allowed in the prompt file
+PROMPT_ROLES = {'system', 'human', 'ai'}
+
+
+def project_path(filepath: str) -> Path:
+    ''' Returns the path of a file set in config, relative to the project folder '''
+    return Path(__file__).parent / Path(filepath)
+
+
+def validate_config(new_config: dict, current_config: dict) -> None:
+    '''Check a new config before it replaces the current one: all settings are present
+    with the same types, and the prompt file, tools module and voices it uses are valid.
+
+    Args:
+        new_config (dict): config read from the file
+        current_config (dict): config in use
+
+    Raises:
+        ValueError: listing the problems found
+    '''
+
+    from helpers import load_prompt_messages
+
+    errors = []
+
+    for key, value in current_config.items():
+        if key not in new_config:
+            errors.append(f'missing setting {key}')
+            continue
+
+        new_value = new_config[key]
+        numbers = (int, float)
+        if value is not None and new_value is not None and type(value) is not type(new_value):
+            if not (isinstance(value, numbers) and isinstance(new_value, numbers) and not isinstance(new_value, bool)):
+                errors.append(f'{key} should be a {type(value).__name__}, not a {type(new_value).__name__}')
+
+    voices = new_config.get('edgetts_voices')
+    if not isinstance(voices, dict) or not all(isinstance(voice, str) and voice for voice in voices.values()):
+        errors.append('edgetts_voices should map languages to voice names')
+    elif new_config.get('chat_language') not in voices:
+        errors.append(f"no voice for chat_language {new_config.get('chat_language')}")
+
+    try:
+        messages = load_prompt_messages(project_path(new_config['prompt_filepath']))
+        roles = {role for role, _ in messages} - PROMPT_ROLES
+        if not messages or roles:
+            errors.append(f"prompt file {new_config['prompt_filepath']} is empty or uses invalid roles {sorted(roles)}")
+    except Exception as e:
+        errors.append(f"invalid prompt file {new_config.get('prompt_filepath')}: {e}")
+
+    try:
+        tools_path = project_path(new_config['tools_filepath'])
+        compile(tools_path.read_text(encoding='utf-8'), str(tools_path), 'exec')
+    except Exception as e:
+        errors.append(f"invalid tools module {new_config.get('tools_filepath')}: {e}")
+
+    if errors:
+        raise ValueError('; '.join(errors))
+
+
+def needs_restart(key: str) -> bool:
+    ''' Returns True if a setting is only read when the chat starts '''
+    return any(key.startswith(name) if name.endswith('_') else key == name for name in RESTART_KEYS)
+
+
+class SharedTurnLock:
+    '''
+    Turn lock for a server answering many sessions at once. Turns hold it in shared mode
+    with turn(), so they run concurrently. The reloader holds it exclusively with
+    "async with": it stops new turns from starting and waits for the running ones to end.
+    '''
+
+    def __init__(self) -> None:
+        ''' Create class instance '''
+
+        self.writer = asyncio.Lock()
+        self.turns = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    def locked(self) -> bool:
+        ''' Returns True if a turn is running or a reload is in progress '''
+        return self.writer.locked() or bool(self.turns)
+
+    @contextlib.asynccontextmanager
+    async def turn(self):
+        ''' Hold the lock for a turn, waits while a reload is in progress '''
+
+        async with self.writer:
+            self.turns += 1
+            self.idle.clear()
+
+        try:
+            yield
+        finally:
+            self.turns -= 1
+            if not self.turns:
+                self.idle.set()
+
+    async def __aenter__(self) -> None:
+        await self.writer.acquire()
+        try:
+            await self.idle.wait()
+        except BaseException:
+            self.writer.release()
+            raise
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.writer.release()
+
+
+class HotReloader:
+    '''
+    Watches the config file and the prompt file and tools module it points to, by polling
+    their modification times. When one changes, the new config is validated and a new
+    worker is built from it while turns go on. Then the settings are replaced in place and
+    the worker swapped in under the turn lock, so a turn in progress finishes with the
+    settings and worker it started with, and the next turn uses the new ones. An invalid
+    change is logged and ignored.
+
+    Settings only read when the chat starts (see RESTART_KEYS) keep their current value,
+    a warning tells the user to restart for them to apply.
+    '''
+
+    def __init__(
+        self,
+        rebuild: Callable[[], Any],
+        swap: Callable[[Any], None],
+        interval: float = 1.0,
+        check: Callable[[dict], None] = None,
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            rebuild (Callable[[], Any]): builds a new worker from the current config, called on a thread seeing the new config
+            swap (Callable[[Any], None]): replaces the worker in use, called on the event loop
+            interval (float): seconds between two checks of the files
+            check (Callable[[dict], None]): optional extra validation of a new config, raising ValueError
+        '''
+
+        self.rebuild = rebuild
+        self.swap = swap
+        self.interval = interval
+        self.check = check
+        self.config_file = config_loader.get_config_file()
+
+    def stamps(self) -> dict[str, tuple[int, int]]:
+        ''' Returns the modification time and size of each watched file '''
+
+        paths = {
+            'config': Path(self.config_file),
+            'prompt': project_path(config['prompt_filepath']),
+            'tools': project_path(config['tools_filepath']),
+        }
+
+        stamps = {}
+        for name, path in paths.items():
+            try:
+                stat = path.stat()
+                stamps[name] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stamps[name] = None
+
+        return stamps
+
+    async def watch(self, turn_lock: asyncio.Lock | SharedTurnLock = None) -> None:
+        '''Poll the files and reload them when they change, until cancelled.
+
+        Args:
+            turn_lock (asyncio.Lock | SharedTurnLock): lock held while a turn is answered, the worker is swapped between turns
+        '''
+
+        stamps = self.stamps()
+
+        while True:
+            await asyncio.sleep(self.interval)
+
+            new_stamps = self.stamps()
+            if new_stamps == stamps:
+                continue
+
+            changed = {name for name in new_stamps if new_stamps[name] != stamps[name]}
+            stamps = new_stamps
+            await self.reload(changed, turn_lock)
+
+            # the reload may point to other files
+            stamps = self.stamps()
+
+    async def reload(self, changed: set[str], turn_lock: asyncio.Lock | SharedTurnLock = None) -> bool:
+        '''Validate the changed files, then apply them and swap the worker between turns.
+
+        Args:
+            changed (set[str]): changed files: config, prompt or tools
+            turn_lock (asyncio.Lock | SharedTurnLock): lock held while a turn is answered
+
+        Return:
+            (bool): True if the new config is in use, False if it was invalid
+        '''
+
+        LOG.debug(f'Watched files changed: {sorted(changed)}')
+
+        try:
+            new_config = await asyncio.to_thread(self.read)
+
+        except (FileNotFoundError, ValueError) as e:
+            LOG.error(f'Invalid config change, keeping current settings: {e}')
+            return False
+
+        restart_keys = sorted(key for key in config if needs_restart(key) and new_config.get(key) != config[key])
+        if restart_keys:
+            LOG.warning(f"Restart the chat to apply {', '.join(restart_keys)}, keeping current values until then")
+            new_config.update({key: config[key] for key in restart_keys})
+
+        worker_keys = {key for key in config if key.startswith(WORKER_KEYS) and new_config.get(key) != config[key]}
+        rebuild = bool(worker_keys) or 'prompt' in changed or 'tools' in changed
+
+        if rebuild:
+            # built from the new config while turns go on with the current one
+            try:
+                worker = await asyncio.to_thread(self._rebuild, new_config, 'tools' in changed or 'tools_filepath' in worker_keys)
+            except Exception as e:
+                LOG.error(f'Error rebuilding worker, keeping current settings: {e}')
+                return False
+
+        async with turn_lock or contextlib.nullcontext():
+            update_config(new_config)
+
+            fact_index = sys.modules.get('fact_index')
+            if fact_index and any(key.startswith('facts_') for key in worker_keys):
+                # indexes are opened with the previous facts settings, reopen them on next use
+                fact_index.reset_fact_indexes()
+
+            if rebuild:
+                self.swap(worker)
+
+        LOG.info(f"Reloaded {', '.join(sorted(changed))}{' and rebuilt worker' if rebuild else ''}")
+
+        return True
+
+    def read(self) -> dict:
+        '''Read and validate the config file.
+
+        Return:
+            (dict): the new config
+
+        Raises:
+            FileNotFoundError: if the config file is missing
+            ValueError: if the config is invalid
+        '''
+
+        new_config = read_config(self.config_file)
+        validate_config(new_config, config)
+
+        if self.check:
+            self.check(new_config)
+
+        return new_config
+
+    def _rebuild(self, new_config: dict, reload_tools: bool) -> Any:
+        ''' Reload the tools module if needed and build a new worker from the new config '''
+
+        tools = sys.modules.get('tools')
+
+        if not reload_tools or tools is None:
+            with config_snapshot(new_config):
+                return self.rebuild()
+
+        # restore the previous tools if the new module or worker fails
+        previous = dict(tools.__dict__)
+
+        try:
+            with config_snapshot(new_config):
+                importlib.reload(tools)
+                return self.rebuild()
+
+        except Exception:
+            tools.__dict__.clear()
+            tools.__dict__.update(previous)
+            raise
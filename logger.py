@@ -8,8 +8,13 @@ Date: 2024-07-25
 """
 
 import os
+import json
+import time
+import queue
+import atexit
 from pathlib import Path
 import logging
+import logging.handlers
 from config_loader import get_config
 config = get_config()
 
@@ -17,6 +22,113 @@ config = get_config()
 NAMESPACE = 'ai_chatbot'
 levels = {'NOTSET': 0, 'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
 
+
+class RotatingLogHandler(logging.handlers.RotatingFileHandler):
+    '''
+    Log file handler rotating the file by size and by age. The current file is renamed
+    to .1, older ones shift to .2, .3 and so on, the oldest above the backup count is deleted.
+    '''
+
+    def __init__(self, filename: str | Path, max_bytes: int = 0, max_age: float = 0, backup_count: int = 5) -> None:
+        '''Create class instance
+
+        Args:
+            filename (str | Path): path of the log file
+            max_bytes (int): rotate the file above this size, 0 to never rotate by size
+            max_age (float): rotate the file after this many seconds, 0 to never rotate by age
+            backup_count (int): number of rotated files kept
+        '''
+
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.max_age = max_age
+        self.rollover_at = time.time() + max_age if max_age else 0
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        ''' Rotate when the file is too big or too old '''
+
+        if self.rollover_at and time.time() >= self.rollover_at:
+            return True
+
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        ''' Rotate the file and restart the age countdown '''
+
+        super().doRollover()
+
+        if self.max_age:
+            self.rollover_at = time.time() + self.max_age
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Formats log records as json lines, to load the log into analysis tools.
+    '''
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    '''
+    Puts log records in a queue with as little work as possible on the logging thread:
+    only the message is merged with its arguments, formatting is left to the listener.
+    '''
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        ''' Make the record safe to format on another thread '''
+
+        # arguments could be modified by the logging thread before the listener formats them
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            # tracebacks are formatted now, the frames may not exist later
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+
+def create_file_handler(log_file: Path) -> logging.Handler:
+    ''' Creates the rotating log file handler from settings '''
+
+    handler = RotatingLogHandler(
+        log_file,
+        max_bytes=int(config['log_rotate_mb'] * 1024 * 1024),
+        max_age=config['log_rotate_hours'] * 3600,
+        backup_count=config['log_backup_count'],
+    )
+
+    # keep the previous run in a backup instead of appending to it, or empty the file if no backups are kept
+    if config['empty_log'] and log_file.exists() and log_file.stat().st_size:
+        if config['log_backup_count']:
+            handler.doRollover()
+        else:
+            with open(log_file, 'w'):
+                pass
+
+    handler.setFormatter(JsonFormatter() if config['log_json'] else logging.Formatter(log_format))
+
+    return handler
+
+
+# background thread writing the log file, if logging through a queue
+listener = None
+
 try:
     # create root logger from settings
     log_level = levels[config['log_level'].upper()]
@@ -24,7 +136,19 @@ try:
     log_dir = Path(__file__).parent
     log_file = log_dir / Path(config['log_filepath'])
     os.makedirs(log_file.parent, exist_ok=True)
-    logging.basicConfig(level=log_level, format=log_format, filename=log_file, force=True)
+    file_handler = create_file_handler(log_file)
+
+    if config['log_queue']:
+        # threads only put records in a queue, the listener thread formats and writes them
+        log_queue = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+        listener.start()
+        # write the records left in the queue on exit
+        atexit.register(listener.stop)
+        logging.basicConfig(level=log_level, handlers=[LogQueueHandler(log_queue)], force=True)
+
+    else:
+        logging.basicConfig(level=log_level, handlers=[file_handler], force=True)
 
 except Exception as e:
     print(f"Error creating logger: {e}. Using default settings.")
@@ -38,12 +162,6 @@ except Exception as e:
     logging.basicConfig(level=log_level, format=log_format, filename=log_file, force=True)
 
 
-# empty log file if option is set
-if config['empty_log']:
-    with open(log_file, 'w'):
-        pass
-
-
 def get_logger(name: str) -> logging.Logger:
     ''' Creates child logger inside namespace '''
     return logging.getLogger(f'{NAMESPACE}.{name}')
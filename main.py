@@ -2,7 +2,8 @@
 # -*- coding: utf-8 -*-
 """
 Filename: main.py
-Description: Starting point for the AI chatbot defining the command line arguments and starting a new chat.
+Description: Starting point for the AI chatbot defining the command line arguments and starting a new chat, or running conversation files in batch.
+Example: python main.py -i text; python main.py batch conversations.jsonl -o results.jsonl
 Author: @alexdjulin
 Date: 2024-07-25
 """
@@ -15,6 +16,13 @@ parser = argparse.ArgumentParser(description='Chat with an AI chatbot.')
 parser.add_argument('--config', '-c', type=str, default='config.yaml', help='Path to configuration file.')
 parser.add_argument('--input', '-i', type=str, help='Overrides input method to use: {text, voice, voice_k}.')
 parser.add_argument('--language', '-l', type=str, help='Overrides chat language (Example: en-US, fr-FR, de-DE). A matching voice should be defined in edgetts_voice, in the config file.')
+subparsers = parser.add_subparsers(dest='command')
+batch_parser = subparsers.add_parser('batch', help='Run scripted conversations from jsonl files, many at a time, and write the answers and timings as json lines.')
+batch_parser.add_argument('inputs', type=str, nargs='+', help='Jsonl files of conversations (one message per line, like the prompt file, with an optional conversation id).')
+batch_parser.add_argument('--output', '-o', type=str, help='Path of the results file. Defaults to stdout.')
+batch_parser.add_argument('--worker', '-w', type=str, help='Overrides langchain worker shared by all conversations: {chain, agent}.')
+batch_parser.add_argument('--conversations', type=int, help='Overrides maximum number of conversations running at once.')
+batch_parser.add_argument('--max-requests', type=int, help='Overrides maximum number of requests in flight to the OpenAI API.')
 args = parser.parse_args()
 
 
@@ -28,13 +36,19 @@ if __name__ == '__main__':
     # load config file
     load_config(config_file)
 
+    if args.command == 'batch':
+        # run conversation files without audio or interactive chat
+        from batch_runner import run_batch
+        run_batch(args.inputs, args.output, args.worker, args.conversations, args.max_requests)
+        raise SystemExit()
+
     # create avatar instance
     from ai_chatbot import AiChatbot
     avatar = AiChatbot()
 
-    # initialise a worker chain or agent (uncomment only one of the following)
-    # avatar.create_worker_chain()
-    avatar.create_worker_agent()
+    # initialise a worker chain or agent in the background (uncomment only one of the following)
+    # avatar.create_worker_chain(background=True)
+    avatar.create_worker_agent(background=True)
 
     # start chat
     avatar.chat_with_avatar(input_method, language)
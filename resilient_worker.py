@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: resilient_worker.py
+Description: Worker wrapper calling the LLM with deadlines, retries with jittered exponential backoff and optional hedged requests.
+Example: worker = ResilientWorker(helpers.build_agent(), helpers.stream_answer, helpers.astream_answer)
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import math
+import random
+import asyncio
+import threading
+from time import perf_counter, sleep
+from pathlib import Path
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator
+from tracing import TRACER, current_turn
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# a duplicate request is sent when the first one is slower than this quantile of the latest calls
+HEDGE_QUANTILE = 0.95
+
+# number of latest call latencies the hedge delay is computed on
+LATENCY_WINDOW = 200
+
+# http errors worth retrying: request timeout, conflict, rate limit and server errors
+RETRY_STATUS_CODES = {408, 409, 429}
+
+# connection and timeout errors of the openai and httpx clients, matched by name to avoid importing them
+RETRY_ERROR_NAMES = {'APIConnectionError', 'APITimeoutError', 'TransportError', 'TimeoutException'}
+
+
+def status_code(error: Exception) -> int | None:
+    ''' Returns the http status code of an openai or httpx error, if any '''
+
+    response = getattr(error, 'response', None)
+    return getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+
+
+def retry_after(error: Exception) -> float | None:
+    ''' Returns the delay in seconds the api asked to wait before retrying, if any '''
+
+    try:
+        return float(error.response.headers['retry-after'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    '''Returns a jittered exponential backoff delay, so clients retrying together are spread out.
+
+    Args:
+        attempt (int): number of attempts so far, from 1
+        base (float): delay after the first attempt, in seconds
+        cap (float): maximum delay, in seconds
+
+    Return:
+        (float): seconds to wait
+    '''
+
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+
+def is_retryable(error: BaseException, retry_rate_limits: bool = True) -> bool:
+    '''Returns True if a call failing with this error may succeed if sent again.
+
+    Args:
+        error (BaseException): error raised by the call
+        retry_rate_limits (bool): if false, rate limited calls are not retried, so the caller can slow down
+    '''
+
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return True
+
+    code = status_code(error)
+    if code is not None:
+        if code == 429:
+            return retry_rate_limits
+        return code in RETRY_STATUS_CODES or code >= 500
+
+    return any(cls.__name__ in RETRY_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class ResilientWorker:
+    '''
+    Wraps a langchain worker (chain or agent) so a stalled or failing LLM call does not
+    block or crash the turn. Exposes invoke and stream methods like the worker, and their
+    async counterparts.
+
+    Async calls have a deadline for the first chunk and one for the whole answer. Calls
+    failing with a transient error (timeout, connection, rate limit, server error) are sent
+    again after a jittered exponential backoff, as long as no chunk was returned. With
+    hedging, a duplicate request is sent when the first one has not answered after the
+    95th percentile of the latest latencies, and whichever answers first is used.
+
+    Sync calls are retried the same way but cannot be abandoned, they rely on the http
+    client timeout.
+    '''
+
+    def __init__(
+        self,
+        worker: Any,
+        stream_answer: Callable[[Any, dict], Iterator[str]],
+        astream_answer: Callable[[Any, dict], AsyncIterator[str]],
+        retry_rate_limits: bool = True,
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            worker (Any): chain or agent to wrap
+            stream_answer (Callable[[Any, dict], Iterator[str]]): function streaming answer chunks from the worker
+            astream_answer (Callable[[Any, dict], AsyncIterator[str]]): function streaming answer chunks from the worker asynchronously
+            retry_rate_limits (bool): if false, rate limit errors are raised at once, for callers pacing their requests
+        '''
+
+        self.worker = worker
+        self.stream_answer = stream_answer
+        self.astream_answer = astream_answer
+        self.retry_rate_limits = retry_rate_limits
+
+        self.timeout = config['llm_timeout']
+        self.first_token_timeout = config['llm_first_token_timeout']
+        self.max_retries = config['llm_max_retries']
+        self.backoff_base = config['llm_backoff_base']
+        self.backoff_max = config['llm_backoff_max']
+        self.hedging = config['llm_hedging']
+        self.hedge_min_samples = config['llm_hedge_min_samples']
+
+        # latencies of the latest successful calls (first chunk when streaming)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counts = {'calls': 0, 'retries': 0, 'timeouts': 0, 'errors': 0, 'hedges': 0, 'hedge_wins': 0}
+        self.lock = threading.Lock()
+
+    def invoke(self, inputs: dict) -> Any:
+        '''Invoke the worker, retrying transient errors.
+
+        Args:
+            inputs (dict): input variables of the prompt
+
+        Return:
+            (Any): the answer of the worker
+        '''
+
+        return self._retry_sync(lambda: self.worker.invoke(inputs))
+
+    def stream(self, inputs: dict) -> Iterator[str]:
+        '''Stream the answer from the worker, retrying transient errors until the first chunk.
+
+        Args:
+            inputs (dict): input variables of the prompt
+
+        Yield:
+            (str): answer chunks
+        '''
+
+        def first_chunk() -> tuple[Iterator[str], str]:
+            chunks = iter(self.stream_answer(self.worker, inputs))
+            return chunks, next(chunks, '')
+
+        chunks, chunk = self._retry_sync(first_chunk)
+        yield chunk
+        yield from chunks
+
+    async def ainvoke(self, inputs: dict) -> Any:
+        '''Invoke the worker asynchronously, with deadline, retries and hedging.
+
+        Args:
+            inputs (dict): input variables of the prompt
+
+        Return:
+            (Any): the answer of the worker
+
+        Raises:
+            TimeoutError: if no answer came before the deadline
+        '''
+
+        deadline = perf_counter() + self.timeout
+
+        return await self._retry(lambda: self.worker.ainvoke(inputs), deadline, first_token=False)
+
+    async def astream(self, inputs: dict) -> AsyncIterator[str]:
+        '''Stream the answer from the worker asynchronously, with deadlines, retries and
+        hedging until the first chunk. Once a chunk was returned the call is not sent again.
+
+        Args:
+            inputs (dict): input variables of the prompt
+
+        Yield:
+            (str): answer chunks
+
+        Raises:
+            TimeoutError: if the first chunk or the full answer did not come before their deadline
+        '''
+
+        deadline = perf_counter() + self.timeout
+
+        async def first_chunk() -> tuple[AsyncIterator[str], str]:
+            chunks = self.astream_answer(self.worker, inputs)
+            try:
+                return chunks, await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, ''
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        chunks, chunk = await self._retry(first_chunk, deadline, first_token=True, discard=lambda result: result[0].aclose())
+
+        try:
+            yield chunk
+
+            while True:
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError(f'LLM answer not complete after {self.timeout}s')
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self._count('timeouts')
+                    raise TimeoutError(f'LLM answer not complete after {self.timeout}s') from None
+                yield chunk
+
+        finally:
+            await chunks.aclose()
+
+    def hedge_delay(self) -> float | None:
+        ''' Returns how long to wait before sending a duplicate request, None if hedging is off or latencies are unknown '''
+
+        with self.lock:
+            if not self.hedging or len(self.latencies) < self.hedge_min_samples:
+                return None
+            values = sorted(self.latencies)
+
+        return values[max(0, math.ceil(HEDGE_QUANTILE * len(values)) - 1)]
+
+    def stats(self) -> dict:
+        ''' Returns the call counts and the latency quantiles of the latest calls '''
+
+        with self.lock:
+            values = sorted(self.latencies)
+            stats = dict(self.counts)
+
+        for q in (0.5, 0.95, 0.99):
+            stats[f'p{round(q * 100)}'] = round(values[max(0, math.ceil(q * len(values)) - 1)], 3) if values else None
+
+        return stats
+
+    async def _retry(
+        self,
+        call: Callable[[], Awaitable],
+        deadline: float,
+        first_token: bool,
+        discard: Callable[[Any], Awaitable] = None,
+    ) -> Any:
+        ''' Run a call with hedging, again after a backoff while it fails with a transient error and time is left '''
+
+        for attempt in range(1, self.max_retries + 2):
+            # a stalled call is abandoned at the first token deadline, if it comes before the answer deadline
+            call_deadline = min(deadline, perf_counter() + self.first_token_timeout) if first_token else deadline
+
+            try:
+                return await self._race(call, call_deadline, discard)
+
+            except Exception as e:
+                self._count('timeouts' if isinstance(e, TimeoutError) else 'errors')
+                delay = retry_after(e) or backoff_delay(attempt, self.backoff_base, self.backoff_max)
+
+                if attempt > self.max_retries or not is_retryable(e, self.retry_rate_limits) or perf_counter() + delay >= deadline:
+                    raise
+
+                LOG.warning(f'LLM call failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s (attempt {attempt})')
+                self._count('retries')
+                await asyncio.sleep(delay)
+
+    async def _race(self, call: Callable[[], Awaitable], deadline: float, discard: Callable[[Any], Awaitable] = None) -> Any:
+        ''' Run a call, and a duplicate if it is slower than the hedge delay, returns the first success '''
+
+        hedge_delay = self.hedge_delay()
+        hedge_at = perf_counter() + hedge_delay if hedge_delay is not None else None
+
+        tasks = [asyncio.create_task(self._timed_call(call, hedge=False))]
+        error = None
+
+        try:
+            while tasks:
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _ = await asyncio.wait(tasks, timeout=max(0.0, wake - perf_counter()), return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        result, latency, hedge = task.result()
+                        self._record(latency, hedge)
+                        return result
+                    error = task.exception()
+
+                if done:
+                    continue
+
+                if perf_counter() >= deadline:
+                    raise TimeoutError('No LLM answer before the deadline')
+
+                # the call is slower than usual, race it with a duplicate
+                LOG.debug(f'LLM call slower than {hedge_delay:.2f}s, sending a hedged request')
+                self._count('hedges')
+                hedge_at = None
+                tasks.append(asyncio.create_task(self._timed_call(call, hedge=True)))
+
+            raise error
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if discard and isinstance(result, tuple):
+                    await discard(result[0])
+
+    async def _timed_call(self, call: Callable[[], Awaitable], hedge: bool) -> tuple[Any, float, bool]:
+        ''' Run a call and trace it, returns its result, latency and whether it was a hedged request '''
+
+        start = perf_counter()
+        outcome = 'ok'
+
+        try:
+            return await call(), perf_counter() - start, hedge
+
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
+
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+
+        finally:
+            current_turn().add('llm_call', start, hedge=hedge, outcome=outcome)
+
+    def _record(self, latency: float, hedge: bool) -> None:
+        ''' Add the latency of a successful call '''
+
+        with self.lock:
+            self.latencies.append(latency)
+            self.counts['calls'] += 1
+            if hedge:
+                self.counts['hedge_wins'] += 1
+
+        if hedge:
+            TRACER.count('llm_hedge_wins')
+
+    def _count(self, event: str) -> None:
+        ''' Count an event of the calls '''
+
+        with self.lock:
+            self.counts[event] += 1
+
+        TRACER.count(f'llm_{event}')
+
+    def _retry_sync(self, call: Callable[[], Any]) -> Any:
+        ''' Run a blocking call, again after a backoff while it fails with a transient error '''
+
+        for attempt in range(1, self.max_retries + 2):
+            start = perf_counter()
+
+            try:
+                result = call()
+                self._record(perf_counter() - start, hedge=False)
+                return result
+
+            except Exception as e:
+                self._count('errors')
+
+                if attempt > self.max_retries or not is_retryable(e, self.retry_rate_limits):
+                    raise
+
+                delay = retry_after(e) or backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                LOG.warning(f'LLM call failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s (attempt {attempt})')
+                self._count('retries')
+                sleep(delay)
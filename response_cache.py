@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: response_cache.py
+Description: Response cache in front of the langchain worker, matching inputs exactly or by embedding similarity.
+Example: worker = CachedWorker(helpers.build_agent(), ResponseCache(500, 3600), helpers.stream_answer, helpers.astream_answer)
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+import hashlib
+import threading
+from time import monotonic
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Iterator
+import numpy as np
+from langchain_core.messages import BaseMessage, HumanMessage
+from text_normalizer import normalize_input
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# embeddings of the latest missed inputs kept for put, sessions answering at once each have theirs
+PENDING_VECTORS = 64
+
+
+def history_digest(messages: list[BaseMessage]) -> str:
+    ''' Returns a digest identifying a list of chat messages.
+
+    Args:
+        messages (list[BaseMessage]): chat messages
+
+    Return:
+        (str): sha256 digest
+    '''
+
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f'{message.type}\x1f{message.content}\x1e'.encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+class CacheEntry:
+    '''
+    A cached answer with its expiry time, embedding and hit counter.
+    '''
+
+    def __init__(self, answer: str, digest: str, expires: float, vector: np.ndarray = None) -> None:
+        self.answer = answer
+        self.digest = digest
+        self.expires = expires
+        self.vector = vector
+        self.hits = 0
+
+
+class ResponseCache:
+    '''
+    LRU cache of answers with expiry, keyed by the normalized input and a digest of
+    the recent chat history. If an embedding function is given, inputs that are not
+    cached exactly are matched by cosine similarity against the cached inputs sharing
+    the same history digest.
+    '''
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        embed: Callable[[str], list[float]] = None,
+        threshold: float = 0.95
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            max_entries (int): maximum number of cached answers
+            ttl (float): time to live of an answer in seconds, 0 to never expire
+            embed (Callable[[str], list[float]]): optional function returning the embedding of a text
+            threshold (float): minimum cosine similarity of a semantic match
+        '''
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embed = embed
+        self.threshold = threshold
+
+        # key -> entry, least recently used first
+        self.entries = OrderedDict()
+
+        # vector index of cached inputs, rebuilt lazily when entries change
+        self.index_keys = []
+        self.index_vectors = None
+        self.index_dirty = False
+
+        # normalized input -> embedding, of inputs missed by get and waiting for their answer
+        self.pending_vectors = OrderedDict()
+
+        # counters
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self.lock = threading.Lock()
+
+    def get(self, text: str, digest: str) -> str | None:
+        '''Return the cached answer to an input with the given history.
+
+        Args:
+            text (str): user input
+            digest (str): digest of the recent chat history
+
+        Return:
+            (str | None): cached answer or None
+        '''
+
+        normalized = normalize_input(text)
+        key = (normalized, digest)
+
+        with self.lock:
+            self._evict_expired()
+
+            if key in self.entries:
+                self.hits += 1
+                return self._hit(key)
+
+        if self.embed:
+            vector = self._embed(normalized)
+
+            with self.lock:
+                key, similarity = self._search(vector, digest)
+                if key:
+                    self.semantic_hits += 1
+                    LOG.debug(f"Semantic cache hit ({similarity:.3f}): '{normalized}' matched '{key[0]}'")
+                    return self._hit(key)
+
+                # the answer will be put with the same input, embedding it again would be a second api call
+                self.pending_vectors[normalized] = vector
+                self.pending_vectors.move_to_end(normalized)
+                while len(self.pending_vectors) > PENDING_VECTORS:
+                    self.pending_vectors.popitem(last=False)
+
+        with self.lock:
+            self.misses += 1
+
+        return None
+
+    def put(self, text: str, digest: str, answer: str) -> None:
+        '''Add an answer to the cache.
+
+        Args:
+            text (str): user input
+            digest (str): digest of the recent chat history
+            answer (str): answer to cache
+        '''
+
+        normalized = normalize_input(text)
+
+        with self.lock:
+            vector = self.pending_vectors.pop(normalized, None)
+
+        if vector is None and self.embed:
+            vector = self._embed(normalized)
+
+        expires = monotonic() + self.ttl if self.ttl else float('inf')
+
+        with self.lock:
+            self.entries[(normalized, digest)] = CacheEntry(answer, digest, expires, vector)
+            self.entries.move_to_end((normalized, digest))
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+            self.index_dirty = True
+
+    def stats(self) -> dict:
+        ''' Return cache counters '''
+
+        with self.lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
+    def _hit(self, key: tuple[str, str]) -> str:
+        ''' Mark an entry as recently used and return its answer '''
+
+        entry = self.entries[key]
+        entry.hits += 1
+        self.entries.move_to_end(key)
+        LOG.debug(f"Response cache hit #{entry.hits}: '{key[0]}'")
+
+        return entry.answer
+
+    def _evict_expired(self) -> None:
+        ''' Remove expired entries '''
+
+        now = monotonic()
+        expired = [key for key, entry in self.entries.items() if entry.expires < now]
+
+        for key in expired:
+            del self.entries[key]
+
+        if expired:
+            self.index_dirty = True
+
+    def _embed(self, text: str) -> np.ndarray:
+        ''' Return the normalized embedding of a text '''
+
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _search(self, vector: np.ndarray, digest: str) -> tuple[tuple[str, str] | None, float]:
+        ''' Return the key of the most similar cached input with the same history digest '''
+
+        if self.index_dirty:
+            self.index_keys = [key for key, entry in self.entries.items() if entry.vector is not None]
+            vectors = [self.entries[key].vector for key in self.index_keys]
+            self.index_vectors = np.vstack(vectors) if vectors else None
+            self.index_dirty = False
+
+        if self.index_vectors is None:
+            return None, 0.0
+
+        similarities = self.index_vectors @ vector
+
+        # only consider answers given with the same history
+        for i in np.argsort(-similarities):
+            if similarities[i] < self.threshold:
+                break
+            key = self.index_keys[i]
+            if key[1] == digest and key in self.entries:
+                return key, float(similarities[i])
+
+        return None, 0.0
+
+
+class CachedWorker:
+    '''
+    Wraps a langchain worker (chain or agent) and answers from the response cache
+    when possible. Exposes invoke and stream methods returning strings, and their
+    async counterparts.
+    '''
+
+    def __init__(
+        self,
+        worker: Any,
+        cache: ResponseCache,
+        stream_answer: Callable[[Any, dict], Iterator[str]],
+        astream_answer: Callable[[Any, dict], AsyncIterator[str]],
+        history_messages: int = 2
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            worker (Any): chain or agent to wrap
+            cache (ResponseCache): the response cache
+            stream_answer (Callable[[Any, dict], Iterator[str]]): function streaming answer chunks from the worker
+            astream_answer (Callable[[Any, dict], AsyncIterator[str]]): function streaming answer chunks from the worker asynchronously
+            history_messages (int): number of recent messages included in the cache key
+        '''
+
+        self.worker = worker
+        self.cache = cache
+        self.stream_answer = stream_answer
+        self.astream_answer = astream_answer
+        self.history_messages = history_messages
+
+    def invoke(self, inputs: dict) -> str:
+        '''Return the cached answer or invoke the worker.
+
+        Args:
+            inputs (dict): input variables of the prompt
+
+        Return:
+            (str): the answer
+        '''
+
+        digest = self._digest(inputs)
+        answer = self.cache.get(inputs['input'], digest)
+
+        if answer is None:
+            answer = self.worker.invoke(inputs)
+            if isinstance(answer, dict):
+                answer = answer.get('output', '')
+            self.cache.put(inputs['input'], digest, answer)
+
+        return answer
+
+    def stream(self, inputs: dict) -> Iterator[str]:
+        '''Yield the cached answer at once, or stream the answer from the worker.
+
+        Args:
+            inputs (dict): input variables of the prompt
+
+        Yield:
+            (str): answer chunks
+        '''
+
+        digest = self._digest(inputs)
+        answer = self.cache.get(inputs['input'], digest)
+
+        if answer is not None:
+            yield answer
+            return
+
+        chunks = []
+        for chunk in self.stream_answer(self.worker, inputs):
+            chunks.append(chunk)
+            yield chunk
+
+        # only cache answers streamed to the end
+        self.cache.put(inputs['input'], digest, ''.join(chunks))
+
+    async def ainvoke(self, inputs: dict) -> str:
+        '''Return the cached answer or invoke the worker asynchronously.
+
+        Args:
+            inputs (dict): input variables of the prompt
+
+        Return:
+            (str): the answer
+        '''
+
+        digest = self._digest(inputs)
+        # semantic lookups call the embedding api, keep the event loop free
+        answer = await asyncio.to_thread(self.cache.get, inputs['input'], digest)
+
+        if answer is None:
+            answer = await self.worker.ainvoke(inputs)
+            if isinstance(answer, dict):
+                answer = answer.get('output', '')
+            await asyncio.to_thread(self.cache.put, inputs['input'], digest, answer)
+
+        return answer
+
+    async def astream(self, inputs: dict) -> AsyncIterator[str]:
+        '''Yield the cached answer at once, or stream the answer from the worker asynchronously.
+
+        Args:
+            inputs (dict): input variables of the prompt
+
+        Yield:
+            (str): answer chunks
+        '''
+
+        digest = self._digest(inputs)
+        answer = await asyncio.to_thread(self.cache.get, inputs['input'], digest)
+
+        if answer is not None:
+            yield answer
+            return
+
+        chunks = []
+        async for chunk in self.astream_answer(self.worker, inputs):
+            chunks.append(chunk)
+            yield chunk
+
+        # only cache answers streamed to the end
+        await asyncio.to_thread(self.cache.put, inputs['input'], digest, ''.join(chunks))
+
+    def _digest(self, inputs: dict) -> str:
+        ''' Return the digest of the recent history, excluding the current input '''
+
+        history = list(inputs.get('chat_history', []))
+
+        if history and isinstance(history[-1], HumanMessage) and history[-1].content == inputs['input']:
+            history = history[:-1]
+
+        if not self.history_messages:
+            return history_digest([])
+
+        return history_digest(history[-self.history_messages:])
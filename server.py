@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: server.py
+Description: Starting point for the headless chat server, hosting many chat sessions over HTTP and WebSocket.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import argparse
+from config_loader import load_config
+
+# parse command line arguments
+parser = argparse.ArgumentParser(description='Serve the AI chatbot to many users over HTTP and WebSocket.')
+parser.add_argument('--config', '-c', type=str, default='config.yaml', help='Path to configuration file.')
+parser.add_argument('--host', type=str, help='Overrides host address to listen on.')
+parser.add_argument('--port', '-p', type=int, help='Overrides port to listen on.')
+parser.add_argument('--worker', '-w', type=str, help='Overrides langchain worker shared by all sessions: {chain, agent}.')
+args = parser.parse_args()
+
+
+if __name__ == '__main__':
+
+    # load config file
+    load_config(args.config)
+
+    # create server instance and start serving
+    from chat_server import ChatServer
+    server = ChatServer(args.worker)
+    server.run(args.host, args.port)
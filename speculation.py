@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: speculation.py
+Description: Speculative LLM requests started on stable partial transcripts, used if the final transcript matches.
+Example: speculator.on_partial(text); speculation = speculator.take(final_text); async for chunk in speculation.stream(): ...
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import AsyncIterator, Callable
+from text_normalizer import normalize_input
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+
+class Speculation:
+    '''
+    An answer requested ahead of time. Chunks are buffered as they arrive, and can be
+    streamed from the beginning while the request is still running.
+    '''
+
+    def __init__(self, text: str, answer: AsyncIterator[str], history_version: int = None) -> None:
+        '''Create class instance and start the request. Must be called from a running event loop.
+
+        Args:
+            text (str): partial transcript the answer was requested for
+            answer (AsyncIterator[str]): answer chunks from the LLM
+            history_version (int): version of the chat history the answer was requested with
+        '''
+
+        self.text = text
+        self.history_version = history_version
+        self.chunks = []
+        self.error = None
+        self.changed = asyncio.Event()
+        self.task = asyncio.create_task(self._consume(answer))
+
+    def failed(self) -> bool:
+        ''' Returns True if the request ended with an error '''
+        return self.error is not None
+
+    def cancel(self) -> None:
+        ''' Cancel the request '''
+        self.task.cancel()
+
+    async def stream(self) -> AsyncIterator[str]:
+        ''' Yield the answer chunks, buffered ones first, then the others as they arrive '''
+
+        index = 0
+
+        while True:
+            if index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+                continue
+
+            if self.task.done():
+                break
+
+            self.changed.clear()
+            await self.changed.wait()
+
+        if self.error:
+            raise self.error
+
+    async def result(self) -> str:
+        ''' Wait for the full answer '''
+        return ''.join([chunk async for chunk in self.stream()])
+
+    async def _consume(self, answer: AsyncIterator[str]) -> None:
+        ''' Request task: buffer the answer chunks '''
+
+        try:
+            async for chunk in answer:
+                self.chunks.append(chunk)
+                self.changed.set()
+
+        except Exception as e:
+            # raised to the turn using the speculation, if any
+            LOG.error(f"Error in speculative answer for '{self.text}': {e}")
+            self.error = e
+
+        finally:
+            self.changed.set()
+
+
+class Speculator:
+    '''
+    Starts a speculative answer when the partial transcript stops changing for a moment,
+    usually while the user pauses at the end of a phrase. When the final transcript
+    arrives, the answer is used if both texts match closely enough, otherwise it is
+    cancelled and the turn requests a new one. A partial transcript moving away from
+    the speculation cancels it early.
+
+    With barge-in, the user may start talking while the avatar is still answering. The
+    answer is then requested with a history missing the end of that turn, so it is only
+    used if the history did not change since it was requested.
+    '''
+
+    def __init__(
+        self,
+        start_answer: Callable[[str], AsyncIterator[str]],
+        count_tokens: Callable[[str], int],
+        threshold: float = 0.9,
+        stable_time: float = 0.4,
+        history_version: Callable[[], int] = None
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            start_answer (Callable[[str], AsyncIterator[str]]): returns the answer chunks for a user message, with the current history
+            count_tokens (Callable[[str], int]): counts the tokens of a text, to measure wasted tokens
+            threshold (float): minimum similarity between the speculative and final transcripts, from 0 to 1
+            stable_time (float): seconds a partial transcript must stay unchanged before speculating
+            history_version (Callable[[], int]): optional, returns the version of the chat history the answers are requested with
+        '''
+
+        self.start_answer = start_answer
+        self.count_tokens = count_tokens
+        self.threshold = threshold
+        self.stable_time = stable_time
+        self.history_version = history_version
+
+        self.speculation = None
+        self.timer = None
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+
+    def on_partial(self, text: str) -> None:
+        '''Handle a new partial transcript. Must be called from the event loop.
+
+        Args:
+            text (str): partial transcript
+        '''
+
+        if self.timer:
+            self.timer.cancel()
+
+        if self.speculation:
+            if self.matches(self.speculation.text, text):
+                return
+            # the user kept talking, the speculation answers another question
+            self._discard()
+
+        self.timer = asyncio.get_running_loop().call_later(self.stable_time, self._speculate, text)
+
+    def take(self, text: str) -> Speculation | None:
+        '''Return the speculative answer if it matches the final transcript and was
+        requested with the current history. Call it before adding the message to the history.
+
+        Args:
+            text (str): final transcript
+
+        Return:
+            (Speculation | None): the speculation to use, None on a miss
+        '''
+
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+        if self.speculation is None:
+            return None
+
+        if self.history_version and self.speculation.history_version != self.history_version():
+            # the history changed since the request, like an interrupted answer recorded after it
+            LOG.debug(f"Speculation outdated: '{self.speculation.text}' for '{text}'")
+            self._discard()
+            return None
+
+        if self.matches(self.speculation.text, text) and not self.speculation.failed():
+            speculation, self.speculation = self.speculation, None
+            self.hits += 1
+            LOG.debug(f"Speculation hit: '{speculation.text}' for '{text}'")
+            return speculation
+
+        LOG.debug(f"Speculation miss: '{self.speculation.text}' for '{text}'")
+        self._discard()
+
+        return None
+
+    def cancel(self) -> None:
+        ''' Cancel the pending speculation, if any '''
+
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+        if self.speculation:
+            self._discard()
+
+    def matches(self, partial: str, final: str) -> bool:
+        '''Returns True if two transcripts are close enough to share an answer.
+
+        Args:
+            partial (str): transcript the speculation was started on
+            final (str): transcript to compare with
+
+        Return:
+            (bool): True if similar enough
+        '''
+
+        ratio = SequenceMatcher(None, normalize_input(partial), normalize_input(final)).ratio()
+        return ratio >= self.threshold
+
+    def stats(self) -> dict:
+        ''' Returns speculation counters '''
+        return {'hits': self.hits, 'misses': self.misses, 'wasted_tokens': self.wasted_tokens}
+
+    def _speculate(self, text: str) -> None:
+        ''' Timer callback: the partial transcript is stable, request its answer '''
+
+        self.timer = None
+
+        if self.speculation is None:
+            version = self.history_version() if self.history_version else None
+            self.speculation = Speculation(text, self.start_answer(text), version)
+
+    def _discard(self) -> None:
+        ''' Cancel the speculation and count the answer tokens generated for nothing '''
+
+        self.speculation.cancel()
+        self.misses += 1
+
+        answer = ''.join(self.speculation.chunks)
+        if answer:
+            self.wasted_tokens += self.count_tokens(answer)
+
+        self.speculation = None
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: stt.py
+Description: Streaming speech to text engines, transcribing a phrase chunk by chunk while it is recorded.
+Example: session = create_stt_engine().start(16000, 'en-US'); session.accept(chunk); text = session.finish()
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import json
+import threading
+from pathlib import Path
+import speech_recognition as sr
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# 16-bit mono pcm, as recorded by the audio capture service
+SAMPLE_WIDTH = 2
+
+
+class GoogleSttSession:
+    '''
+    Buffers a phrase and transcribes it with the Google Speech Recognition API, which has
+    no streaming mode. With a partial interval, the audio recorded so far is also sent in
+    the background every few seconds, giving partial transcripts while the user talks.
+    '''
+
+    def __init__(self, recognizer: sr.Recognizer, sample_rate: int, language: str, partial_interval: float = 0) -> None:
+        '''Create class instance
+
+        Args:
+            recognizer (sr.Recognizer): recognizer shared by all sessions
+            sample_rate (int): audio sample rate
+            language (str): language to transcribe
+            partial_interval (float): seconds of audio between partial transcriptions, 0 for final only
+        '''
+
+        self.recognizer = recognizer
+        self.sample_rate = sample_rate
+        self.language = language
+        self.partial_bytes = int(partial_interval * sample_rate * SAMPLE_WIDTH)
+
+        self.frames = bytearray()
+        self.next_partial = self.partial_bytes
+        self.partial = None
+        self.partial_thread = None
+
+    def accept(self, chunk: bytes) -> str | None:
+        '''Add the next chunk of the phrase.
+
+        Args:
+            chunk (bytes): 16-bit mono pcm chunk
+
+        Return:
+            (str | None): latest partial transcript if a new one is ready, None otherwise
+        '''
+
+        self.frames.extend(chunk)
+
+        partial, self.partial = self.partial, None
+
+        # one partial request at a time
+        if self.partial_bytes and len(self.frames) >= self.next_partial and not self._partial_running():
+            self.next_partial = len(self.frames) + self.partial_bytes
+            self.partial_thread = threading.Thread(target=self._transcribe_partial, args=[bytes(self.frames)], daemon=True)
+            self.partial_thread.start()
+
+        return partial
+
+    def finish(self) -> str:
+        '''Transcribe the full phrase.
+
+        Return:
+            (str): final transcript
+
+        Raises:
+            UnknownValueError: if audio could not be transcribed
+            RequestError: if error connecting to Google API
+        '''
+
+        audio = sr.AudioData(bytes(self.frames), self.sample_rate, SAMPLE_WIDTH)
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+    def _partial_running(self) -> bool:
+        ''' Returns True if a partial transcription is in progress '''
+        return self.partial_thread is not None and self.partial_thread.is_alive()
+
+    def _transcribe_partial(self, frames: bytes) -> None:
+        ''' Partial transcription thread, errors are ignored as the final transcript follows '''
+
+        try:
+            audio = sr.AudioData(frames, self.sample_rate, SAMPLE_WIDTH)
+            self.partial = self.recognizer.recognize_google(audio, language=self.language)
+        except (sr.UnknownValueError, sr.RequestError):
+            pass
+
+
+class GoogleStt:
+    '''
+    Google Speech Recognition API engine (online).
+    '''
+
+    def __init__(self, partial_interval: float = 0) -> None:
+        '''Create class instance
+
+        Args:
+            partial_interval (float): seconds of audio between partial transcriptions, 0 for final only
+        '''
+
+        self.recognizer = sr.Recognizer()
+        self.partial_interval = partial_interval
+
+    def start(self, sample_rate: int, language: str) -> GoogleSttSession:
+        '''Start transcribing a new phrase.
+
+        Args:
+            sample_rate (int): audio sample rate
+            language (str): language to transcribe
+
+        Return:
+            (GoogleSttSession): session accepting the phrase chunks
+        '''
+
+        return GoogleSttSession(self.recognizer, sample_rate, language, self.partial_interval)
+
+
+class VoskSttSession:
+    '''
+    Transcribes a phrase incrementally with a local Vosk model. Each chunk is decoded
+    as it arrives, so the final transcript is ready right after the phrase ends.
+    '''
+
+    def __init__(self, recognizer) -> None:
+        '''Create class instance
+
+        Args:
+            recognizer (vosk.KaldiRecognizer): recognizer for this phrase
+        '''
+
+        self.recognizer = recognizer
+        self.results = []
+        self.text = ''
+
+    def accept(self, chunk: bytes) -> str | None:
+        '''Decode the next chunk of the phrase.
+
+        Args:
+            chunk (bytes): 16-bit mono pcm chunk
+
+        Return:
+            (str | None): latest partial transcript if it changed, None otherwise
+        '''
+
+        if self.recognizer.AcceptWaveform(chunk):
+            # end of an utterance within the phrase
+            self.results.append(json.loads(self.recognizer.Result())['text'])
+            partial = ''
+        else:
+            partial = json.loads(self.recognizer.PartialResult())['partial']
+
+        text = ' '.join(filter(None, self.results + [partial]))
+        if text == self.text:
+            return None
+
+        self.text = text
+        return text or None
+
+    def finish(self) -> str:
+        '''Return the final transcript.
+
+        Return:
+            (str): final transcript
+
+        Raises:
+            UnknownValueError: if no speech was recognized
+        '''
+
+        self.results.append(json.loads(self.recognizer.FinalResult())['text'])
+        text = ' '.join(filter(None, self.results))
+
+        if not text:
+            raise sr.UnknownValueError
+
+        return text
+
+
+class VoskStt:
+    '''
+    Vosk engine (offline, CPU). The model sets the language, so the chat language is
+    ignored. Models can be downloaded from https://alphacephei.com/vosk/models
+    '''
+
+    def __init__(self, model_path: str) -> None:
+        '''Create class instance and load the model
+
+        Args:
+            model_path (str): directory of the Vosk model
+
+        Raises:
+            ImportError: if vosk is not installed
+        '''
+
+        try:
+            import vosk
+        except ImportError:
+            LOG.error('The vosk speech engine requires the vosk package: pip install vosk')
+            raise
+
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        self.model = vosk.Model(str(model_path))
+
+    def start(self, sample_rate: int, language: str) -> VoskSttSession:
+        '''Start transcribing a new phrase.
+
+        Args:
+            sample_rate (int): audio sample rate
+            language (str): ignored, set by the model
+
+        Return:
+            (VoskSttSession): session accepting the phrase chunks
+        '''
+
+        return VoskSttSession(self.vosk.KaldiRecognizer(self.model, sample_rate))
+
+
+def create_stt_engine() -> GoogleStt | VoskStt:
+    '''Creates the speech to text engine selected in config.
+
+    Return:
+        (GoogleStt | VoskStt): the engine
+
+    Raises:
+        ValueError: if the engine is invalid
+    '''
+
+    engine = config['stt_engine']
+
+    if engine == 'google':
+        return GoogleStt(config['stt_partial_interval'])
+
+    if engine == 'vosk':
+        return VoskStt(Path(__file__).parent / Path(config['stt_vosk_model']))
+
+    LOG.error(f"Invalid speech engine '{engine}'. Chose from {{'google', 'vosk'}}")
+    raise ValueError(f"Invalid speech engine '{engine}'. Chose from {{'google', 'vosk'}}")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_agent_tools.py
+Description: Benchmarks an agent turn calling slow fake tools: one at a time with the langchain executor, all at once with
+             ConcurrentAgentExecutor (sync and async), and again with the results cached.
+Example: python tests/benchmarks/bench_agent_tools.py --tools 4 --tool-delay 0.5
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import asyncio
+import argparse
+from time import perf_counter, sleep
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config
+
+# seconds an agent turn may take on top of its slowest tool call
+MAX_OVERHEAD = 0.2
+
+
+def slow_tools(count: int, delay: float, calls: list[str]) -> list:
+    '''Returns cached tools taking delay seconds to answer, like a search or an API request.
+
+    Args:
+        count (int): number of tools
+        delay (float): seconds each call takes
+        calls (list[str]): names of the tools run, appended on each call not cached
+
+    Return:
+        (list[BaseTool]): the tools
+    '''
+
+    from langchain_core.tools import tool
+    from tool_utils import cached_tool
+
+    def make_tool(name: str):
+        @tool(name)
+        @cached_tool(ttl=60)
+        def slow_tool(query: str) -> str:
+            """Slow fake tool, returns its name and the query."""
+            calls.append(name)
+            sleep(delay)
+            return f'{name}: {query}'
+
+        return slow_tool
+
+    return [make_tool(f'tool_{index}') for index in range(count)]
+
+
+def build_executor(executor_class, tools: list):
+    '''Returns an agent requesting all the tools at once, then answering.
+
+    Args:
+        executor_class (type): AgentExecutor or ConcurrentAgentExecutor
+        tools (list[BaseTool]): the tools
+
+    Return:
+        (AgentExecutor): the agent
+    '''
+
+    from langchain.agents import create_tool_calling_agent
+    from langchain_core.messages import AIMessage
+    from langchain_core.prompts import ChatPromptTemplate
+    from fakes import ScriptedChatModel
+
+    tool_calls = [{'name': tool.name, 'args': {'query': 'weather'}, 'id': f'call_{index}'} for index, tool in enumerate(tools)]
+    model = ScriptedChatModel(answers=[AIMessage(content='', tool_calls=tool_calls), 'It is sunny.'])
+    prompt = ChatPromptTemplate.from_messages([('human', '{input}'), ('placeholder', '{agent_scratchpad}')])
+
+    return executor_class(agent=create_tool_calling_agent(model, tools, prompt), tools=tools)
+
+
+def run(tools: int = 3, tool_delay: float = 0.3) -> dict:
+    '''Time one agent turn calling every tool, for each executor.
+
+    Args:
+        tools (int): number of tools called in the turn
+        tool_delay (float): seconds each tool call takes
+
+    Return:
+        (dict): run -> seconds of the turn, tool calls run and answer
+    '''
+
+    from langchain.agents import AgentExecutor
+    from tool_utils import ConcurrentAgentExecutor
+
+    calls = []
+    agent_tools = slow_tools(tools, tool_delay, calls)
+    results = {}
+
+    def timed(name: str, executor, run_async: bool = False) -> None:
+        calls.clear()
+        start = perf_counter()
+        if run_async:
+            output = asyncio.run(executor.ainvoke({'input': 'How is the weather?'}))
+        else:
+            output = executor.invoke({'input': 'How is the weather?'})
+        results[name] = {'seconds': perf_counter() - start, 'calls': len(calls), 'output': output['output']}
+
+    def clear_cache() -> None:
+        for tool in agent_tools:
+            tool.func.cache_clear()
+
+    timed('sequential', build_executor(AgentExecutor, agent_tools))
+    clear_cache()
+    timed('concurrent', build_executor(ConcurrentAgentExecutor, agent_tools))
+    timed('cached', build_executor(ConcurrentAgentExecutor, agent_tools))
+    clear_cache()
+    timed('concurrent async', build_executor(ConcurrentAgentExecutor, agent_tools), run_async=True)
+
+    return results
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if tool calls don't run at once or the cache is missed '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tools', type=int, default=3, help='number of tools called in the turn')
+    parser.add_argument('--tool-delay', type=float, default=0.3, help='seconds each tool call takes')
+    args = parser.parse_args()
+
+    load_test_config(agent_verbose=False, agent_tool_workers=max(4, args.tools))
+    results = run(args.tools, args.tool_delay)
+
+    for name, result in results.items():
+        print(f"{name}: {result['seconds']:.2f}s, {result['calls']} tool calls run")
+
+    slowest = args.tool_delay + MAX_OVERHEAD
+    if results['concurrent']['seconds'] > slowest or results['concurrent async']['seconds'] > slowest or results['cached']['calls']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
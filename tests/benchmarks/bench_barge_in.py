@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_barge_in.py
+Description: Benchmarks barge-in with simulated audio: time from the user starting to talk over the avatar to its voice stopping.
+Example: python tests/benchmarks/bench_barge_in.py --trials 10 --block 0.05 --min-speech 0.2
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import argparse
+import tempfile
+import threading
+from statistics import median
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config, write_wav
+
+# seconds the avatar may keep talking over the user, on top of the speech needed to detect them
+MAX_STOP_DELAY = 0.1
+
+
+def run(trials: int = 5, block_duration: float = 0.05, min_speech: float = 0.2, echo_guard: float = 3.0) -> dict:
+    '''The avatar speaks a long answer while a recorded user starts talking, which stops it.
+    Each trial times the first loud chunk read from the microphone and the last audio block played.
+
+    Args:
+        trials (int): number of interruptions
+        block_duration (float): seconds of audio played at once by the avatar
+        min_speech (float): seconds of speech needed to detect the user
+        echo_guard (float): detection threshold multiplier while the avatar speaks
+
+    Return:
+        (dict): median and maximum seconds from speech onset to silence, and the fraction of each answer played
+    '''
+
+    from pydub import AudioSegment
+    from audio_capture import AudioCapture, WavFileSource, rms
+    from audio_player import AudioPlayer, SimulatedOutput
+
+    onsets, silences = [], []
+
+    class Microphone(WavFileSource):
+        ''' Recorded user, noting when they start talking '''
+
+        loud = False
+
+        def read(self) -> bytes:
+            chunk = super().read()
+            loud = rms(chunk) > 1000
+            if loud and not self.loud:
+                onsets.append(perf_counter())
+            self.loud = loud
+            return chunk
+
+    class Output(SimulatedOutput):
+        ''' Speakers, noting when the last block ends '''
+
+        def write(self, data: bytes) -> None:
+            super().write(data)
+            self.last_write = perf_counter()
+
+        def close(self) -> None:
+            silences.append(self.last_write)
+
+    wav = write_wav(Path(tempfile.mkdtemp()) / 'user.wav', [(1.0, 8000)])
+    capture = AudioCapture(Microphone(*[wav] * trials, gap=1.5), min_speech=min_speech, calibration_duration=0.5).start()
+    answer = AudioSegment.silent(duration=30000, frame_rate=24000)
+    played = []
+
+    try:
+        for _ in range(trials):
+            player = AudioPlayer(block_duration, Output, lambda playing: setattr(capture, 'echo_guard', echo_guard if playing else 1.0))
+            speaking = threading.Thread(target=lambda: played.append(player.play(answer)))
+            speaking.start()
+
+            # listen while the avatar speaks, and stop it as soon as the user talks
+            for _ in capture.stream_phrase(timeout=10, on_speech_start=player.stop):
+                pass
+            speaking.join()
+    finally:
+        capture.close()
+
+    delays = [silence - onset for onset, silence in zip(onsets, silences)]
+
+    return {
+        'trials': trials,
+        'median_delay': median(delays),
+        'max_delay': max(delays),
+        'played': played,
+    }
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if the avatar keeps talking too long '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trials', type=int, default=5, help='number of interruptions')
+    parser.add_argument('--block', type=float, default=0.05, help='seconds of audio played at once')
+    parser.add_argument('--min-speech', type=float, default=0.2, help='seconds of speech needed to detect the user')
+    args = parser.parse_args()
+
+    load_test_config()
+    result = run(args.trials, args.block, args.min_speech)
+
+    print(f"{result['trials']} interruptions: speech onset to silence {result['median_delay'] * 1000:.0f}ms median, {result['max_delay'] * 1000:.0f}ms max")
+
+    if result['max_delay'] > args.min_speech + args.block + MAX_STOP_DELAY:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
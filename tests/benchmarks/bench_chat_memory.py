@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_chat_memory.py
+Description: Benchmarks a long conversation through ChatMemory: time to add a message and history size as turns go by.
+Example: python tests/benchmarks/bench_chat_memory.py --turns 1000 --budget 2000
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import argparse
+from statistics import median
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config
+
+# the last turns may take this many times longer to add than the first ones
+MAX_SLOWDOWN = 3.0
+
+
+def run(turns: int = 1000, token_budget: int = 2000, window: int = 100) -> dict:
+    '''Add turns of a question and an answer to the history and time it.
+
+    Args:
+        turns (int): number of turns
+        token_budget (int): token budget of the history
+        window (int): number of turns timed at the start and end of the conversation, the
+            first window fills the history and is not timed
+
+    Return:
+        (dict): median microseconds per turn once the history is full and at the end, messages and tokens in the final history
+    '''
+
+    from config_loader import get_config
+    from chat_memory import ChatMemory, get_token_counter
+    from langchain_core.messages import HumanMessage, AIMessage
+
+    memory = ChatMemory(token_budget, get_token_counter(get_config()['openai_model']))
+    durations = []
+
+    for turn in range(turns):
+        start = perf_counter()
+        memory.append(HumanMessage(content=f'Tell me something about the number {turn}, please. ' * 3))
+        memory.append(AIMessage(content=f'The number {turn} comes right after {turn - 1} and has many friends. ' * 6))
+        memory.messages
+        durations.append(perf_counter() - start)
+
+    return {
+        'turns': turns,
+        'first_turns_us': median(durations[window:2 * window]) * 1e6,
+        'last_turns_us': median(durations[-window:]) * 1e6,
+        'messages': len(memory),
+        'tokens': memory.total_tokens,
+        'token_budget': token_budget,
+    }
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if the history grows or slows down '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=1000, help='number of turns')
+    parser.add_argument('--budget', type=int, default=2000, help='token budget of the history')
+    args = parser.parse_args()
+
+    load_test_config()
+    result = run(args.turns, args.budget)
+
+    print(
+        f"{result['turns']} turns: {result['first_turns_us']:.0f}us per turn once full, {result['last_turns_us']:.0f}us at end, "
+        f"{result['messages']} messages and {result['tokens']}/{result['token_budget']} tokens kept"
+    )
+
+    if result['tokens'] > result['token_budget'] or result['last_turns_us'] > result['first_turns_us'] * MAX_SLOWDOWN:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
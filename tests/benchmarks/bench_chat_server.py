@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_chat_server.py
+Description: Load test of the chat server: many sessions chatting at once over HTTP or WebSocket, answered by a fake OpenAI API.
+Example: python tests/benchmarks/bench_chat_server.py --sessions 200 --messages 5 --delay 0.2
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import asyncio
+import argparse
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config
+
+# sessions chatting at once must get answers at least this many times faster than one session
+# alone. Sessions wait on the API concurrently, the limit is the CPU time of each turn.
+MIN_SPEEDUP = 5.0
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    ''' Returns the value below which a quantile of the values fall '''
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(quantile * len(values)))] if values else 0.0
+
+
+async def chat(client, messages: int, websocket: bool, latencies: list[float], errors: list[str]) -> None:
+    ''' One user: create a session and send messages one after the other, timing each answer '''
+
+    response = await client.post('/sessions')
+    session_id = (await response.json())['session_id']
+
+    if websocket:
+        async with client.ws_connect(f'/sessions/{session_id}/ws') as ws:
+            for index in range(messages):
+                start = perf_counter()
+                await ws.send_json({'input': f'Message number {index}'})
+                while (reply := await ws.receive_json())['type'] == 'chunk':
+                    pass
+                if reply['type'] == 'done':
+                    latencies.append(perf_counter() - start)
+                else:
+                    errors.append(reply['text'])
+        return
+
+    for index in range(messages):
+        start = perf_counter()
+        response = await client.post(f'/sessions/{session_id}/messages', json={'input': f'Message number {index}'})
+        if response.status == 200:
+            await response.json()
+            latencies.append(perf_counter() - start)
+        else:
+            errors.append(await response.text())
+
+
+async def load_test(app, sessions: int, messages: int, websocket: bool = False) -> dict:
+    '''Run sessions at once against a server app.
+
+    Args:
+        app (web.Application): the server app
+        sessions (int): number of users chatting at once
+        messages (int): number of messages each user sends
+        websocket (bool): if true, chat over WebSocket, over HTTP otherwise
+
+    Return:
+        (dict): answers per second, p50 and p95 answer latency in seconds and errors
+    '''
+
+    from aiohttp.test_utils import TestClient, TestServer
+
+    latencies, errors = [], []
+
+    async with TestClient(TestServer(app)) as client:
+        start = perf_counter()
+        await asyncio.gather(*(chat(client, messages, websocket, latencies, errors) for _ in range(sessions)))
+        duration = perf_counter() - start
+
+    return {
+        'answers_per_second': len(latencies) / duration,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'errors': errors,
+    }
+
+
+def run(sessions: int = 100, messages: int = 5, delay: float = 0.2, token_delay: float = 0.01, websocket: bool = False, max_connections: int = 100) -> dict:
+    '''Measure the answer rate and latency of a lone session, then of many at once.
+
+    Args:
+        sessions (int): number of users chatting at once
+        messages (int): number of messages each user sends
+        delay (float): seconds before the fake API starts answering
+        token_delay (float): seconds between two words streamed by the fake API
+        websocket (bool): if true, chat over WebSocket, over HTTP otherwise
+        max_connections (int): size of the connection pool to the API
+
+    Return:
+        (dict): results of the lone session and of the load, and the most requests the API answered at once
+    '''
+
+    from config_loader import get_config
+    from fakes import FakeOpenAIServer
+
+    config = get_config()
+    config['server_max_connections'] = max_connections
+
+    with FakeOpenAIServer(delay=delay, token_delay=token_delay) as api:
+        config['openai_base_url'] = api.url
+
+        from chat_server import ChatServer
+        alone = asyncio.run(load_test(ChatServer('chain').app, 1, messages, websocket))
+        loaded = asyncio.run(load_test(ChatServer('chain').app, sessions, messages, websocket))
+
+    return {'alone': alone, 'loaded': loaded, 'max_active': api.max_active}
+
+
+def main() -> None:
+    ''' Run the load test from the command line, exits with 1 on errors or if sessions are not answered concurrently '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=100, help='number of users chatting at once')
+    parser.add_argument('--messages', type=int, default=5, help='number of messages each user sends')
+    parser.add_argument('--delay', type=float, default=0.2, help='seconds before the fake API starts answering')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='seconds between two streamed words')
+    parser.add_argument('--max-connections', type=int, default=100, help='size of the connection pool to the API')
+    parser.add_argument('--websocket', action='store_true', help='chat over WebSocket instead of HTTP')
+    args = parser.parse_args()
+
+    load_test_config()
+    result = run(args.sessions, args.messages, args.delay, args.token_delay, args.websocket, args.max_connections)
+    alone, loaded = result['alone'], result['loaded']
+
+    print(f"1 session: {alone['answers_per_second']:.1f} answers/s, p50 {alone['p50'] * 1000:.0f}ms, p95 {alone['p95'] * 1000:.0f}ms")
+    print(
+        f"{args.sessions} sessions: {loaded['answers_per_second']:.1f} answers/s, p50 {loaded['p50'] * 1000:.0f}ms, "
+        f"p95 {loaded['p95'] * 1000:.0f}ms, {len(loaded['errors'])} errors, {result['max_active']} requests at once"
+    )
+
+    if loaded['errors'] or loaded['answers_per_second'] < alone['answers_per_second'] * MIN_SPEEDUP:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_fact_index.py
+Description: Benchmarks the fact index at growing sizes: build time, query latency, memory used by a search, size on disk,
+             and recall of the approximate search against an exact one. Embeddings are synthetic, clustered like real ones.
+Example: python tests/benchmarks/bench_fact_index.py --sizes 1000 100000 1000000 --dimensions 256
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config
+
+# a query may take this many milliseconds (p95) at the largest size
+MAX_QUERY_MS = 50.0
+# memory allocated by a query may not exceed this many MB, whatever the index size
+MAX_QUERY_MB = 16.0
+# approximate searches must find this share of the exact top k
+MIN_RECALL = 0.9
+
+# facts are spread around this many topics
+TOPICS = 2000
+
+
+class SyntheticEmbeddings:
+    ''' Embeds 'fact {i}' close to the topic i % TOPICS, and queries close to a random topic '''
+
+    def __init__(self, dimensions: int) -> None:
+        import numpy as np
+        from fact_index import normalize_rows
+
+        self.np = np
+        self.dimensions = dimensions
+        self.topics = normalize_rows(np.random.default_rng(0).standard_normal((TOPICS, dimensions)).astype(np.float32))
+
+    def _around(self, ids: list[int], seed: int):
+        noise = self.np.random.default_rng(seed).standard_normal((len(ids), self.dimensions)).astype(self.np.float32)
+        return self.topics[self.np.asarray(ids) % TOPICS] + 0.6 * noise / self.np.sqrt(self.dimensions)
+
+    def embed_documents(self, facts: list[str]):
+        ids = [int(fact.split()[1]) for fact in facts]
+        return self._around(ids, ids[0])
+
+    def query(self, index: int):
+        from fact_index import normalize_rows
+        return normalize_rows(self._around([index], 10 ** 9 + index))[0]
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(quantile * len(values)))]
+
+
+def exact_top_k(index, vector, k: int) -> set[str]:
+    ''' Facts of the k closest vectors, scanning the whole index at once '''
+
+    np = sys.modules['numpy']
+    scores = np.asarray(index.vectors) @ vector
+    return {index.fact(row) for row in np.argpartition(-scores, k - 1)[:k]}
+
+
+def run(sizes: list[int] = (1000, 100000, 1000000), dimensions: int = 256, ann_min_facts: int = 50000, queries: int = 200, k: int = 5) -> dict:
+    '''Build an index of each size in a temporary folder and time searches in it.
+
+    Args:
+        sizes (list[int]): numbers of facts
+        dimensions (int): size of the embeddings
+        ann_min_facts (int): number of facts from which searches are approximate
+        queries (int): number of searches at each size
+        k (int): number of facts returned by a search
+
+    Return:
+        (dict): size -> build seconds, p50 and p95 query milliseconds, peak MB allocated by a query, MB on disk and recall
+    '''
+
+    from fact_index import FactIndex
+
+    embeddings = SyntheticEmbeddings(dimensions)
+    folder = Path(tempfile.mkdtemp())
+    results = {}
+
+    for size in sizes:
+        directory = folder / str(size)
+        index = FactIndex(directory, embeddings.embed_documents, None, model='synthetic', ann_min_facts=ann_min_facts)
+
+        start = perf_counter()
+        index.build((f'fact {i}' for i in range(size)), batch_size=4096)
+        build_seconds = perf_counter() - start
+
+        vectors = [embeddings.query(i) for i in range(queries)]
+        durations, found = [], []
+
+        for vector in vectors:
+            start = perf_counter()
+            found.append({fact for fact, _ in index.search_vector(vector, k)})
+            durations.append(perf_counter() - start)
+
+        # memory-mapped vectors are not allocated, only the scores and results of a search are
+        tracemalloc.start()
+        for vector in vectors[:10]:
+            index.search_vector(vector, k)
+        query_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+        # exact searches find all of the exact top k
+        checked = min(queries, 50)
+        recall = sum(len(found[i] & exact_top_k(index, vectors[i], k)) for i in range(checked)) / (checked * k)
+
+        results[size] = {
+            'ann': index.manifest['ann'],
+            'build_seconds': build_seconds,
+            'p50_ms': percentile(durations, 0.5) * 1000,
+            'p95_ms': percentile(durations, 0.95) * 1000,
+            'query_mb': query_mb,
+            'disk_mb': sum(path.stat().st_size for path in directory.iterdir()) / 2 ** 20,
+            'recall': recall,
+        }
+
+        index._close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if searches are too slow, too big or miss facts '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000], help='numbers of facts')
+    parser.add_argument('--dimensions', type=int, default=256, help='size of the embeddings')
+    parser.add_argument('--ann-min-facts', type=int, default=50000, help='number of facts from which searches are approximate')
+    args = parser.parse_args()
+
+    load_test_config()
+    results = run(args.sizes, args.dimensions, args.ann_min_facts)
+
+    for size, result in results.items():
+        print(
+            f"{size} facts ({'ann' if result['ann'] else 'exact'}): built in {result['build_seconds']:.1f}s, "
+            f"query p50 {result['p50_ms']:.2f}ms p95 {result['p95_ms']:.2f}ms, {result['query_mb']:.1f}MB per query, "
+            f"{result['disk_mb']:.0f}MB on disk, recall@5 {result['recall']:.2f}"
+        )
+
+    largest = results[max(results)]
+    if largest['p95_ms'] > MAX_QUERY_MS or any(result['query_mb'] > MAX_QUERY_MB or result['recall'] < MIN_RECALL for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
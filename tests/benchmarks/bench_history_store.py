@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_history_store.py
+Description: Benchmarks lookups in a large SQLite chat history: rows of one session and rows of a time range, against a full scan of the table.
+Example: python tests/benchmarks/bench_history_store.py --rows 10000000
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import argparse
+import tempfile
+from statistics import median
+from datetime import datetime, timedelta
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config
+
+# a lookup by session or time range must take less than this many milliseconds, whatever the history size
+MAX_LOOKUP_MS = 20.0
+
+# rows written per session, one row per second
+SESSION_ROWS = 20
+
+
+def fill(store, rows: int, batch: int = 100000) -> datetime:
+    '''Write rows to a store, SESSION_ROWS per session and one per second.
+
+    Args:
+        store (SqliteHistoryStore): store to fill
+        rows (int): number of rows
+        batch (int): rows written per transaction
+
+    Return:
+        (datetime): timestamp of the first row
+    '''
+
+    from history_store import HistoryRow, TIMESTAMP_FORMAT
+
+    first = datetime(2026, 1, 1)
+
+    for offset in range(0, rows, batch):
+        store.write_rows([
+            HistoryRow(
+                f'session-{index // SESSION_ROWS}',
+                (first + timedelta(seconds=index)).strftime(TIMESTAMP_FORMAT),
+                'Me' if index % 2 else 'Bot',
+                f'Message number {index}'
+            )
+            for index in range(offset, min(rows, offset + batch))
+        ])
+
+    return first
+
+
+def run(rows: int = 1000000, lookups: int = 50) -> dict:
+    '''Fill a SQLite history in a temporary folder and time lookups by session and by time range.
+
+    Args:
+        rows (int): number of rows in the history
+        lookups (int): number of lookups of each kind, spread over the history
+
+    Return:
+        (dict): seconds to fill the history, median milliseconds per session, time range and full scan lookup
+    '''
+
+    from history_store import SqliteHistoryStore
+
+    store = SqliteHistoryStore(Path(tempfile.mkdtemp()) / 'history.db')
+
+    start = perf_counter()
+    first = fill(store, rows)
+    fill_duration = perf_counter() - start
+
+    sessions = rows // SESSION_ROWS
+    session_ms, range_ms = [], []
+
+    for lookup in range(lookups):
+        position = lookup * rows // lookups
+
+        start = perf_counter()
+        found = store.session(f'session-{position // SESSION_ROWS}')
+        session_ms.append((perf_counter() - start) * 1000)
+        assert len(found) == min(SESSION_ROWS, rows - position // SESSION_ROWS * SESSION_ROWS)
+
+        range_start = first + timedelta(seconds=position)
+        start = perf_counter()
+        found = store.time_range(range_start, range_start + timedelta(minutes=1), speaker='Me')
+        range_ms.append((perf_counter() - start) * 1000)
+        assert len(found) <= 30
+
+    # what finding a session cost without an index, like scanning the csv file
+    start = perf_counter()
+    store.connection.execute('SELECT * FROM messages NOT INDEXED WHERE session_id = ?', (f'session-{sessions // 2}',)).fetchall()
+    scan_ms = (perf_counter() - start) * 1000
+
+    store.close()
+
+    return {
+        'rows': rows,
+        'fill_seconds': fill_duration,
+        'session_ms': median(session_ms),
+        'time_range_ms': median(range_ms),
+        'scan_ms': scan_ms,
+    }
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if lookups are too slow '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='number of rows in the history')
+    parser.add_argument('--lookups', type=int, default=50, help='number of lookups of each kind')
+    args = parser.parse_args()
+
+    load_test_config()
+    result = run(args.rows, args.lookups)
+
+    print(
+        f"{result['rows']} rows written in {result['fill_seconds']:.1f}s: {result['session_ms']:.2f}ms per session, "
+        f"{result['time_range_ms']:.2f}ms per time range, {result['scan_ms']:.0f}ms for a full scan"
+    )
+
+    if max(result['session_ms'], result['time_range_ms']) > MAX_LOOKUP_MS:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_history_writer.py
+Description: Benchmarks the chat history throughput: rows per second queued and written by HistoryWriter, against one helpers.write_to_csv call per row.
+Example: python tests/benchmarks/bench_history_writer.py --rows 100000 --backend sqlite
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import argparse
+import tempfile
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config
+
+# queuing a row on the chat thread must be at least this many times faster than one write_to_csv
+# call per row. On a local SSD the gap is small, it grows with disk and network file system latency.
+MIN_SPEEDUP = 2.0
+
+
+def run(rows: int = 20000, backend: str = 'csv', sessions: int = 10) -> dict:
+    '''Write rows through HistoryWriter and through helpers.write_to_csv, in a temporary folder.
+
+    Args:
+        rows (int): number of rows to write
+        backend (str): history backend of the writer, {csv, sqlite}
+        sessions (int): number of sessions the rows are spread over
+
+    Return:
+        (dict): rows per second queued and written by the writer, written by write_to_csv, and rows found on disk
+    '''
+
+    import helpers
+    from config_loader import get_config
+    from history_writer import HistoryWriter
+    from history_store import CsvHistoryStore, SqliteHistoryStore
+
+    config = get_config()
+    folder = Path(tempfile.mkdtemp())
+    message = 'Hello there,\tthis is   a message\nspread over two lines.'
+
+    if backend == 'sqlite':
+        store = SqliteHistoryStore(folder / 'history.db')
+    else:
+        store = CsvHistoryStore(folder / 'history.csv')
+    writer = HistoryWriter(store, max_queue=rows + 1)
+
+    start = perf_counter()
+    for index in range(rows):
+        writer.write(f'session-{index % sessions}', config['user_name'], message)
+    queued = perf_counter() - start
+    writer.close()
+    written = perf_counter() - start
+
+    if backend == 'sqlite':
+        found = sum(len(SqliteHistoryStore(folder / 'history.db').session(f'session-{index}')) for index in range(sessions))
+    else:
+        found = len((folder / 'history.csv').read_text(encoding='utf-8').splitlines())
+
+    # a quarter of the rows is enough to time one file opening per row
+    direct_rows = max(1, rows // 4)
+    start = perf_counter()
+    for _ in range(direct_rows):
+        helpers.write_to_csv(folder / 'direct.csv', config['user_name'], message)
+    direct = perf_counter() - start
+
+    return {
+        'rows': rows,
+        'backend': backend,
+        'queued_rows_per_second': rows / queued,
+        'written_rows_per_second': rows / written,
+        'direct_rows_per_second': direct_rows / direct,
+        'rows_found': found,
+    }
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if rows are lost or slow down the chat '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='number of rows to write')
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv', help='history backend of the writer')
+    args = parser.parse_args()
+
+    load_test_config()
+    result = run(args.rows, args.backend)
+
+    print(
+        f"{result['rows']} rows ({result['backend']}): {result['queued_rows_per_second']:.0f} rows/s queued, "
+        f"{result['written_rows_per_second']:.0f} rows/s written, {result['direct_rows_per_second']:.0f} rows/s with write_to_csv, "
+        f"{result['rows_found']} rows found"
+    )
+
+    if result['rows_found'] != result['rows'] or result['queued_rows_per_second'] < result['direct_rows_per_second'] * MIN_SPEEDUP:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_logging.py
+Description: Benchmarks the logging overhead per turn under heavy debug output, on the thread producing the reply, with the
+             log file written directly or through the queue, as text or json, optionally on slow storage (fsync on every record).
+Example: python tests/benchmarks/bench_logging.py --records 300 --turns 200 --slow-storage
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import ROOT
+
+# on slow storage, logging through the queue must cost the reply thread this many times less than writing the file
+MIN_SPEEDUP = 2.0
+
+# run in a new process, as the logger is configured on import. Prints the timings as json on the last line.
+TURNS = '''
+import os, sys, json, logging
+from time import perf_counter
+sys.path.insert(0, {tests!r})
+from support import load_test_config
+config = load_test_config(log_level='DEBUG', log_queue={queue}, log_json={json}, log_rotate_mb=1)
+
+import logger
+LOG = logger.get_logger('bench')
+
+if {slow_storage}:
+    # every record is synced to disk before the logging call returns
+    handler = logger.file_handler
+    flush = handler.flush
+    def synced_flush():
+        flush()
+        if handler.stream:
+            os.fsync(handler.stream.fileno())
+    handler.flush = synced_flush
+
+message = 'x' * 200
+
+def turn():
+    for index in range({records}):
+        LOG.debug(f'Answer chunk {{index}}: {{message}}')
+    try:
+        raise ValueError('tool failed')
+    except ValueError:
+        LOG.exception('Error running tool')
+
+for _ in range(5):
+    turn()
+
+start = perf_counter()
+for _ in range({turns}):
+    turn()
+duration = perf_counter() - start
+
+if logger.listener:
+    logger.listener.stop()
+logging.shutdown()
+
+log_files = list(logger.log_file.parent.glob(logger.log_file.name + '*'))
+records = sum(len(path.read_text(encoding='utf-8').splitlines()) for path in log_files)
+print(json.dumps({{'turn_ms': duration / {turns} * 1000, 'log_files': len(log_files), 'lines': records}}))
+'''
+
+
+def measure(queue: bool, json_format: bool, slow_storage: bool = False, records: int = 300, turns: int = 100) -> dict:
+    ''' Log turns in a new process with a logging mode, returns milliseconds per turn and what was written '''
+
+    script = TURNS.format(tests=str(ROOT / 'tests'), queue=queue, json=json_format, slow_storage=slow_storage, records=records, turns=turns)
+    process = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=ROOT, check=True)
+
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def run(records: int = 300, turns: int = 100, slow_storage: bool = False) -> dict:
+    '''Measure the logging overhead per turn of each logging mode.
+
+    Args:
+        records (int): debug records logged per turn, plus one exception
+        turns (int): number of turns timed
+        slow_storage (bool): if true, sync the log file to disk on every record
+
+    Return:
+        (dict): mode -> milliseconds per turn on the logging thread, log files written and lines in them
+    '''
+
+    return {
+        f"{'queue' if queue else 'direct'} {'json' if json_format else 'text'}": measure(queue, json_format, slow_storage, records, turns)
+        for queue in (False, True)
+        for json_format in (False, True)
+    }
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if the queue does not take the file writes off the logging thread '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=300, help='debug records logged per turn')
+    parser.add_argument('--turns', type=int, default=100, help='number of turns timed')
+    parser.add_argument('--slow-storage', action='store_true', help='sync the log file to disk on every record')
+    args = parser.parse_args()
+
+    results = run(args.records, args.turns, args.slow_storage)
+
+    for mode, result in results.items():
+        print(f"{mode}: {result['turn_ms']:.2f}ms per turn, {result['lines']} lines in {result['log_files']} files")
+
+    if args.slow_storage and results['queue text']['turn_ms'] * MIN_SPEEDUP > results['direct text']['turn_ms']:
+        sys.exit(1)
+    if results['queue text']['turn_ms'] > results['direct text']['turn_ms']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_resilient_worker.py
+Description: Benchmarks chat sessions streaming their turns from a fake OpenAI API injecting stalls, server errors and rate
+             limits, with the resilient call layer and without it (client retries and the answer deadline only).
+Example: python tests/benchmarks/bench_resilient_worker.py --sessions 10 --turns 20 --fault-rate 0.2 --first-token-timeout 0.5
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import random
+import asyncio
+import argparse
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config
+
+# with faults injected, every resilient turn must be answered, 95% of them at most this many seconds after the first token deadline
+MAX_RECOVERY = 0.5
+
+FAULTS = ('stall', 'error', 'rate_limit')
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    ''' Returns the value below which a quantile of the values fall '''
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(quantile * len(values)))] if values else 0.0
+
+
+def scripted_faults(count: int, fault_rate: float, seed: int = 0) -> list:
+    '''Returns the faults of the next requests, each one failing with a stall, a server error or a rate limit at fault_rate.
+
+    Args:
+        count (int): number of requests
+        fault_rate (float): share of failing requests
+        seed (int): seed of the random faults, for repeatable runs
+
+    Return:
+        (list): faults of the fake server
+    '''
+
+    rng = random.Random(seed)
+    return [rng.choice(FAULTS) if rng.random() < fault_rate else None for _ in range(count)]
+
+
+async def chat(worker, sessions: int, turns: int, timeout: float) -> dict:
+    ''' Sessions chatting at once, each streaming its turns one after the other, returns the answer latencies and errors '''
+
+    latencies, errors = [], []
+
+    async def session() -> None:
+        for index in range(turns):
+            start = perf_counter()
+            try:
+                answer = await asyncio.wait_for(_answer(worker, f'Message number {index}'), timeout)
+                if answer:
+                    latencies.append(perf_counter() - start)
+                else:
+                    errors.append('empty answer')
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    await asyncio.gather(*(session() for _ in range(sessions)))
+
+    return {
+        'answered': len(latencies),
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'max': max(latencies, default=0.0),
+        'errors': errors,
+    }
+
+
+async def _answer(worker, message: str) -> str:
+    return ''.join([chunk async for chunk in worker.astream({'input': message, 'chat_history': []})])
+
+
+def run(sessions: int = 5, turns: int = 20, fault_rate: float = 0.2, first_token_timeout: float = 0.5, delay: float = 0.05, token_delay: float = 0.005, timeout: float = 5.0) -> dict:
+    '''Chat against a fake API failing some requests, with and without the resilient call layer.
+
+    Args:
+        sessions (int): number of sessions chatting at once
+        turns (int): number of turns of each session
+        fault_rate (float): share of failing requests
+        first_token_timeout (float): seconds before a stalled call is abandoned and sent again
+        delay (float): seconds before the fake API starts answering
+        token_delay (float): seconds between two words streamed by the fake API
+        timeout (float): seconds a full answer can take
+
+    Return:
+        (dict): answered turns, p50, p95 and max latency in seconds and errors of each mode, with the retry counts
+    '''
+
+    import helpers
+    from config_loader import get_config
+    from fakes import FakeOpenAIServer
+
+    config = get_config()
+    config.update({
+        'llm_timeout': timeout,
+        'llm_first_token_timeout': first_token_timeout,
+        # enough retries for a turn to outlast a run of faults
+        'llm_max_retries': 4,
+        'llm_backoff_base': 0.05,
+        'llm_backoff_max': 0.5,
+        'llm_hedging': False,
+    })
+
+    results = {}
+
+    for resilience in (False, True):
+        config['llm_resilience'] = resilience
+        # the same faults in both modes, with spares for the retries
+        faults = scripted_faults(sessions * turns * 4, fault_rate)
+
+        with FakeOpenAIServer(delay=delay, token_delay=token_delay, faults=faults) as api:
+            config['openai_base_url'] = api.url
+
+            async def main() -> dict:
+                worker, http_client = helpers.build_shared_worker('chain', max_connections=sessions)
+                try:
+                    result = await chat(worker, sessions, turns, timeout)
+                    result['stats'] = worker.stats() if resilience else {}
+                    return result
+                finally:
+                    await http_client.aclose()
+
+            results['resilient' if resilience else 'plain'] = asyncio.run(main())
+            results['resilient' if resilience else 'plain']['requests'] = len(api.requests)
+
+    return results
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if a resilient turn failed or turns recovered too slowly '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=5, help='number of sessions chatting at once')
+    parser.add_argument('--turns', type=int, default=20, help='number of turns of each session')
+    parser.add_argument('--fault-rate', type=float, default=0.2, help='share of failing requests')
+    parser.add_argument('--first-token-timeout', type=float, default=0.5, help='seconds before a stalled call is sent again')
+    parser.add_argument('--delay', type=float, default=0.05, help='seconds before the fake API starts answering')
+    parser.add_argument('--timeout', type=float, default=5.0, help='seconds a full answer can take')
+    args = parser.parse_args()
+
+    load_test_config()
+    results = run(args.sessions, args.turns, args.fault_rate, args.first_token_timeout, args.delay, timeout=args.timeout)
+
+    for mode, result in results.items():
+        print(
+            f"{mode}: {result['answered']}/{args.sessions * args.turns} answered with {result['requests']} requests, p50 {result['p50'] * 1000:.0f}ms, "
+            f"p95 {result['p95'] * 1000:.0f}ms, max {result['max'] * 1000:.0f}ms, {len(result['errors'])} errors"
+        )
+    print(f"resilient calls: {results['resilient']['stats']}")
+
+    resilient = results['resilient']
+    if resilient['errors'] or resilient['p95'] > args.first_token_timeout + MAX_RECOVERY:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_speech_to_text.py
+Description: Benchmarks the end of speech to final transcript latency on recorded phrases, with the Vosk or Google engine,
+             or with fake engines decoding while the user talks and decoding the whole phrase once it ends (used by the tests).
+Example: python tests/benchmarks/bench_speech_to_text.py --engine vosk --wav recording.wav --phrases 5
+         python tests/benchmarks/bench_speech_to_text.py --engine fake --phrases 5 --speech 3 --decode-time 0.3
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import argparse
+import tempfile
+from statistics import median
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config, write_wav
+
+# with a streaming engine, the final transcript must be ready this many seconds after the pause ending the phrase
+MAX_TRANSCRIPT_DELAY = 0.15
+
+# engines decoding while the user talks, held to MAX_TRANSCRIPT_DELAY
+STREAMING_ENGINES = ('streaming', 'vosk')
+
+
+def transcribe(capture, engine, language: str = 'en-US') -> dict:
+    '''Listen to the next phrase and transcribe it while it is recorded, like helpers.record_audio_message.
+
+    Args:
+        capture (AudioCapture): running capture service
+        engine (FakeSttEngine | GoogleStt | VoskStt): speech to text engine
+        language (str): language of the phrase
+
+    Return:
+        (dict): transcript, and times of the last speech chunk, of the end of the phrase and of the final transcript
+    '''
+
+    from audio_capture import rms
+
+    session = engine.start(capture.sample_rate, language)
+    last_speech = None
+
+    for chunk in capture.stream_phrase(timeout=10):
+        if rms(chunk) > capture.energy_threshold:
+            last_speech = perf_counter()
+        session.accept(chunk)
+
+    phrase_end = perf_counter()
+    text = session.finish()
+
+    return {'text': text, 'last_speech': last_speech, 'phrase_end': phrase_end, 'final': perf_counter()}
+
+
+def create_engines(engine: str, decode_time: float, speed: float) -> dict:
+    '''Returns the speech to text engines to benchmark.
+
+    Args:
+        engine (str): fake, google or vosk
+        decode_time (float): seconds the fake engines take to decode one second of audio
+        speed (float): playback speed of the recordings
+
+    Return:
+        (dict): name -> engine
+
+    Raises:
+        ValueError: if a real engine would listen to recordings played faster than real time
+    '''
+
+    if engine == 'fake':
+        from fakes import FakeSttEngine
+        # the fake engines decode faster when the recording plays faster
+        return {
+            'streaming': FakeSttEngine(decode_time=decode_time / speed, streaming=True),
+            'final only': FakeSttEngine(decode_time=decode_time / speed, streaming=False),
+        }
+
+    if speed != 1.0:
+        raise ValueError(f'The {engine} engine decodes in real time, recordings must play at speed 1')
+
+    from config_loader import get_config
+    from stt import create_stt_engine
+
+    get_config()['stt_engine'] = engine
+    return {engine: create_stt_engine()}
+
+
+def run(
+    phrases: int = 3,
+    speech: float = 2.0,
+    decode_time: float = 0.3,
+    pause_threshold: float = 0.8,
+    speed: float = 1.0,
+    engine: str = 'fake',
+    wav: str | Path = None,
+    language: str = 'en-US',
+) -> dict:
+    '''Play recorded phrases to speech to text engines and time the transcripts.
+    Durations are in seconds of audio, so they don't depend on the playback speed.
+
+    Args:
+        phrases (int): number of phrases
+        speech (float): seconds of speech in each phrase, when no recording is given
+        decode_time (float): seconds the fake engines take to decode one second of audio
+        pause_threshold (float): seconds of silence ending a phrase
+        speed (float): playback speed of the recordings, 1 with a real engine
+        engine (str): fake for a streaming and a non-streaming fake engine, google or vosk for the engine of stt.py
+        wav (str | Path): recorded phrase, a tone standing in for speech if not given
+        language (str): language of the phrase
+
+    Return:
+        (dict): engine -> median seconds from the end of speech to the end of the phrase, and to the final transcript
+    '''
+
+    from audio_capture import AudioCapture, WavFileSource
+
+    wav = wav or write_wav(Path(tempfile.mkdtemp()) / 'speech.wav', [(speech, 8000)])
+    results = {}
+
+    for name, stt_engine in create_engines(engine, decode_time, speed).items():
+        source = WavFileSource(*[wav] * phrases, gap=1.5, speed=speed)
+        capture = AudioCapture(source, pause_threshold=pause_threshold, calibration_duration=0.5).start()
+
+        try:
+            turns = [transcribe(capture, stt_engine, language) for _ in range(phrases)]
+        finally:
+            capture.close()
+
+        results[name] = {
+            'pause': median((turn['phrase_end'] - turn['last_speech']) * speed for turn in turns),
+            'transcript': median((turn['final'] - turn['last_speech']) * speed for turn in turns),
+            'texts': [turn['text'] for turn in turns],
+        }
+
+    return results
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if the streamed transcript comes too late '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', choices=['fake', 'google', 'vosk'], default='fake', help='speech to text engine, see stt_engine in config')
+    parser.add_argument('--wav', help='recorded phrase (16-bit mono wav), a tone standing in for speech if not given')
+    parser.add_argument('--language', default='en-US', help='language of the phrase')
+    parser.add_argument('--phrases', type=int, default=3, help='number of phrases')
+    parser.add_argument('--speech', type=float, default=2.0, help='seconds of speech in each phrase, without a recording')
+    parser.add_argument('--decode-time', type=float, default=0.3, help='seconds the fake engines take to decode one second of audio')
+    parser.add_argument('--pause', type=float, default=0.8, help='seconds of silence ending a phrase')
+    parser.add_argument('--speed', type=float, default=1.0, help='playback speed of the recordings, fake engines only')
+    args = parser.parse_args()
+
+    load_test_config()
+    results = run(args.phrases, args.speech, args.decode_time, args.pause, args.speed, args.engine, args.wav, args.language)
+
+    for name, result in results.items():
+        print(f"{name}: end of speech to end of phrase {result['pause'] * 1000:.0f}ms, to final transcript {result['transcript'] * 1000:.0f}ms")
+        if args.engine != 'fake':
+            print(f"  transcripts: {result['texts']}")
+
+    if any(results[name]['transcript'] > args.pause + MAX_TRANSCRIPT_DELAY for name in STREAMING_ENGINES if name in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_startup.py
+Description: Benchmarks the text mode startup in a new process: import time per module (python -X importtime), time to create the chatbot,
+             and the heavy modules loaded before the chat starts.
+Example: python tests/benchmarks/bench_startup.py --runs 5 --top 15
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import re
+import sys
+import json
+import argparse
+import subprocess
+from statistics import median
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import ROOT
+
+# milliseconds from the first project import to a chatbot ready to chat in text mode
+MAX_STARTUP_MS = 300.0
+
+# stacks only needed once the worker is built (on a background thread) or in voice modes
+LLM_MODULES = ['langchain', 'langchain_core', 'langchain_openai', 'openai', 'numpy', 'tiktoken']
+AUDIO_MODULES = ['edge_tts', 'pydub', 'speech_recognition', 'miniaudio', 'audio_capture', 'audio_player', 'stt']
+
+# run in a new process, prints the timings as json on the last line
+STARTUP = '''
+import sys, json, threading
+from time import perf_counter
+sys.path.insert(0, {tests!r})
+from support import load_test_config
+load_test_config()
+
+start = perf_counter()
+import ai_chatbot
+imported = perf_counter()
+loaded_on_import = [name for name in {llm!r} + {audio!r} if name in sys.modules]
+
+chatbot = ai_chatbot.AiChatbot()
+# cache_worker wraps the worker once built, on the thread building it
+built_on = []
+cache_worker = chatbot.cache_worker
+chatbot.cache_worker = lambda worker: built_on.append(threading.current_thread().name) or cache_worker(worker)
+chatbot.create_worker_chain(background=True)
+ready = perf_counter()
+loaded_on_start = [name for name in {audio!r} if name in sys.modules]
+
+chatbot.worker_future.result()
+worker = perf_counter()
+chatbot.history.close()
+
+print(json.dumps({{
+    'import_ms': (imported - start) * 1000,
+    'startup_ms': (ready - start) * 1000,
+    'worker_ms': (worker - start) * 1000,
+    'loaded_on_import': loaded_on_import,
+    'loaded_on_start': loaded_on_start,
+    'worker_in_background': built_on != [threading.main_thread().name],
+}}))
+'''
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    '''Returns the cumulative import time of each module from the output of python -X importtime.
+
+    Args:
+        stderr (str): lines like 'import time:  self [us] |  cumulative | imported package'
+
+    Return:
+        (dict[str, int]): module -> cumulative microseconds
+    '''
+
+    modules = {}
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+
+    return modules
+
+
+def measure() -> dict:
+    ''' Start the chatbot once in a new process, returns its timings and the cumulative import time of each module '''
+
+    script = STARTUP.format(tests=str(ROOT / 'tests'), llm=LLM_MODULES, audio=AUDIO_MODULES)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], capture_output=True, text=True, cwd=ROOT, check=True)
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result['imports'] = parse_importtime(process.stderr)
+
+    return result
+
+
+def run(runs: int = 3) -> dict:
+    '''Start the chatbot in new processes and keep the median timings.
+
+    Args:
+        runs (int): number of processes started
+
+    Return:
+        (dict): median import, startup and worker ready milliseconds, median import microseconds of the project
+            modules, the heavy modules loaded on import and on start, and whether every worker was built in the background
+    '''
+
+    results = [measure() for _ in range(runs)]
+    project = {path.stem for path in ROOT.glob('*.py')}
+
+    return {
+        'import_ms': median(result['import_ms'] for result in results),
+        'startup_ms': median(result['startup_ms'] for result in results),
+        'worker_ms': median(result['worker_ms'] for result in results),
+        'modules_us': {
+            name: median(result['imports'].get(name, 0) for result in results)
+            for name in project if name in results[0]['imports']
+        },
+        'loaded_on_import': sorted({name for result in results for name in result['loaded_on_import']}),
+        'loaded_on_start': sorted({name for result in results for name in result['loaded_on_start']}),
+        'worker_in_background': all(result['worker_in_background'] for result in results),
+    }
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 on a startup regression '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='number of processes started')
+    parser.add_argument('--top', type=int, default=10, help='number of slowest project modules listed')
+    args = parser.parse_args()
+
+    result = run(args.runs)
+
+    for name, microseconds in sorted(result['modules_us'].items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{name:20} {microseconds / 1000:7.1f}ms')
+    print(
+        f"import ai_chatbot {result['import_ms']:.0f}ms, chatbot ready {result['startup_ms']:.0f}ms, "
+        f"worker built in the background {result['worker_ms']:.0f}ms"
+    )
+    print(f"heavy modules loaded on import: {result['loaded_on_import'] or 'none'}, on start: {result['loaded_on_start'] or 'none'}")
+
+    if result['startup_ms'] > MAX_STARTUP_MS or result['loaded_on_import'] or result['loaded_on_start'] or not result['worker_in_background']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
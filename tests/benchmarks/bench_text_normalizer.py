@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: bench_text_normalizer.py
+Description: Benchmarks text normalization on pathological inputs of 1 MB and more: long runs of spaces, tabs,
+             punctuation and unwanted characters, on full strings and streamed in small chunks.
+Example: python tests/benchmarks/bench_text_normalizer.py --megabytes 4
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import random
+import argparse
+from time import perf_counter
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from support import load_test_config
+
+# time per MB on the larger input may be this many times the time per MB on 1 MB, linear code stays close to 1
+MAX_SLOWDOWN = 2.5
+
+MEGABYTE = 1024 * 1024
+
+
+def pathological_inputs(size: int) -> dict[str, str]:
+    '''Returns inputs of a given size that are slow for naive normalization.
+
+    Args:
+        size (int): number of characters of each input
+
+    Return:
+        (dict[str, str]): input name -> text
+    '''
+
+    def repeat(pattern: str) -> str:
+        return (pattern * (size // len(pattern) + 1))[:size]
+
+    return {
+        'space run': 'word' + ' ' * (size - 5) + 'x',
+        'mixed whitespace': repeat('a \t\n  \t'),
+        'no whitespace': repeat('abcdefghij'),
+        'punctuation run': '.' * (size - 1) + 'x',
+        'spaced punctuation': repeat('. ! ? '),
+        'unwanted chars': repeat('*/|\\ a'),
+    }
+
+
+def stream(text: str, chunk_size: int = 16) -> str:
+    ''' Normalize text fed to a StreamNormalizer in random chunks of about chunk_size characters '''
+
+    from text_normalizer import StreamNormalizer
+
+    normalizer = StreamNormalizer()
+    rng = random.Random(0)
+    chunks, position = [], 0
+
+    while position < len(text):
+        end = position + rng.randint(1, 2 * chunk_size)
+        chunks.append(normalizer.feed(text[position:end]))
+        position = end
+
+    return ''.join(chunks) + normalizer.flush()
+
+
+def best_time(function, text: str, repeat: int = 3) -> float:
+    ''' Returns the fastest of repeated runs of a function on a text, in seconds '''
+
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function(text)
+        durations.append(perf_counter() - start)
+
+    return min(durations)
+
+
+def run(megabytes: int = 4, repeat: int = 3) -> dict:
+    '''Time each normalization function on each pathological input, at 1 MB and at a larger size.
+
+    Args:
+        megabytes (int): size of the larger inputs in MB
+        repeat (int): number of runs of each function on each input, the fastest is kept
+
+    Return:
+        (dict): '{function} / {input}' -> seconds at 1 MB, seconds at the larger size and slowdown per MB
+    '''
+
+    from text_normalizer import normalize_whitespace, strip_unwanted_chars, normalize_input
+
+    functions = {
+        'normalize_whitespace': normalize_whitespace,
+        'strip_unwanted_chars': strip_unwanted_chars,
+        'normalize_input': normalize_input,
+        'StreamNormalizer': stream,
+    }
+
+    small, large = pathological_inputs(MEGABYTE), pathological_inputs(megabytes * MEGABYTE)
+    results = {}
+
+    for name, function in functions.items():
+        for kind in small:
+            small_seconds = best_time(function, small[kind], repeat)
+            large_seconds = best_time(function, large[kind], repeat)
+            results[f'{name} / {kind}'] = {
+                'small_seconds': small_seconds,
+                'large_seconds': large_seconds,
+                'slowdown': large_seconds / megabytes / max(small_seconds, 1e-6),
+            }
+
+    return results
+
+
+def main() -> None:
+    ''' Run the benchmark from the command line, exits with 1 if a function does not scale linearly '''
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megabytes', type=int, default=4, help='size of the larger inputs in MB')
+    args = parser.parse_args()
+
+    load_test_config()
+    results = run(args.megabytes)
+
+    for name, result in results.items():
+        print(f"{name:50} 1 MB: {result['small_seconds'] * 1000:7.1f}ms, {args.megabytes} MB: {result['large_seconds'] * 1000:7.1f}ms, x{result['slowdown']:.2f} per MB")
+
+    if any(result['slowdown'] > MAX_SLOWDOWN for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
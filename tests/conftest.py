@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: conftest.py
+Description: Loads the test config before the project modules are imported, and provides the fixtures shared by the tests.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+from time import sleep
+from pathlib import Path
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent))
+from support import load_test_config
+
+# project modules read the config when they are imported
+load_test_config()
+
+from config_loader import get_config, update_config
+
+
+@pytest.fixture
+def config() -> dict:
+    ''' The loaded config, settings changed by a test are restored after it '''
+
+    settings = get_config()
+    saved = dict(settings)
+
+    yield settings
+
+    update_config(saved)
+
+
+@pytest.fixture
+def make_chatbot(config):
+    ''' Returns a function creating a chatbot answering with a fake model, closed after the test '''
+
+    import helpers
+    from ai_chatbot import AiChatbot
+
+    chatbots = []
+
+    def make_chatbot(model, input_method: str = 'text') -> AiChatbot:
+        chatbot = AiChatbot()
+        chatbot.input_method = input_method
+        chatbot.language = config['chat_language']
+        chatbot.worker = helpers.build_chain(llm=model)
+
+        # wait for the tokenizer loaded in the background and let langchain set up on a
+        # first call, so the first turn measured does not wait for them
+        chatbot.memory.count_tokens('')
+        chatbot.worker.invoke({'input': 'Hello', 'chat_history': []})
+
+        chatbots.append(chatbot)
+        return chatbot
+
+    yield make_chatbot
+
+    for chatbot in chatbots:
+        chatbot.history.close()
+
+
+@pytest.fixture
+def simulated_speech(monkeypatch) -> list[str]:
+    '''Answers are spoken without network or sound card: each sentence is synthesized as
+    0.1 seconds of silence per word after a 0.05 second delay, and played on a simulated
+    output taking as long as the audio.
+
+    Return:
+        (list[str]): sentences synthesized, in order
+    '''
+
+    import functools
+    import audio_player
+    import helpers
+    from pydub import AudioSegment
+
+    synthesized = []
+
+    def synthesize_speech(text: str, language: str) -> AudioSegment:
+        sleep(0.05)
+        synthesized.append(text)
+        return AudioSegment.silent(duration=100 * len(text.split()), frame_rate=24000)
+
+    monkeypatch.setattr(helpers, 'synthesize_speech', synthesize_speech)
+    monkeypatch.setattr(audio_player, 'AudioPlayer', functools.partial(audio_player.AudioPlayer, output=audio_player.SimulatedOutput))
+
+    return synthesized
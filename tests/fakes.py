@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: fakes.py
+Description: Fake stand-ins for the tests: a scripted chat model streaming its answers with realistic delays, a fake OpenAI API server,
+             a fake speech to text engine and a fake edge_tts voice.
+Example: worker = helpers.build_chain(llm=ScriptedChatModel(answers=['Hello there.'], first_token_delay=0.2, token_delay=0.01))
+         with FakeOpenAIServer(delay=0.1) as api: config['openai_base_url'] = api.url
+         session = FakeSttEngine('hello there', decode_time=0.3).start(16000, 'en-US')
+         monkeypatch.setattr(edge_tts, 'Communicate', FakeCommunicate)
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import re
+import json
+import asyncio
+import threading
+from time import sleep
+from typing import Any, AsyncIterator, Iterator
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from aiohttp import web
+from support import hash_embedding
+
+
+class ScriptedChatModel(BaseChatModel):
+    '''
+    Fake chat model giving scripted answers in turn, streamed word by word. The first word
+    comes after first_token_delay and the next ones every token_delay seconds, like a model
+    generating tokens. Answers are strings, AIMessages with tool calls for agents, or
+    exceptions raised instead of answering.
+    '''
+
+    answers: list
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+    # number of answers given so far
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'scripted'
+
+    def bind_tools(self, tools: list, **kwargs: Any) -> 'ScriptedChatModel':
+        ''' Tool calls are scripted, the tools are ignored '''
+        return self
+
+    def _next_answer(self) -> AIMessage:
+        ''' Returns the next scripted answer, starting over after the last one '''
+
+        answer = self.answers[self.calls % len(self.answers)]
+        self.calls += 1
+
+        if isinstance(answer, Exception):
+            raise answer
+
+        return answer if isinstance(answer, AIMessage) else AIMessage(content=answer)
+
+    def _chunks(self, answer: AIMessage) -> list[AIMessageChunk]:
+        ''' Split an answer into the chunks streamed by the model '''
+
+        if answer.tool_calls:
+            tool_call_chunks = [
+                {'name': call['name'], 'args': json.dumps(call['args']), 'id': call['id'], 'index': index}
+                for index, call in enumerate(answer.tool_calls)
+            ]
+            return [AIMessageChunk(content='', tool_call_chunks=tool_call_chunks)]
+
+        return [AIMessageChunk(content=word) for word in re.findall(r'\S+\s*', answer.content)]
+
+    def _delay(self, index: int) -> float:
+        ''' Seconds before a chunk is streamed '''
+        return self.first_token_delay if index == 0 else self.token_delay
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        answer = self._next_answer()
+        sleep(sum(self._delay(index) for index in range(max(1, len(self._chunks(answer))))))
+
+        return ChatResult(generations=[ChatGeneration(message=answer)])
+
+    def _stream(self, messages: list[BaseMessage], stop: list[str] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for index, chunk in enumerate(self._chunks(self._next_answer())):
+            sleep(self._delay(index))
+            if run_manager and chunk.content:
+                run_manager.on_llm_new_token(chunk.content)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages: list[BaseMessage], stop: list[str] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for index, chunk in enumerate(self._chunks(self._next_answer())):
+            await asyncio.sleep(self._delay(index))
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content)
+            yield ChatGenerationChunk(message=chunk)
+
+
+class FakeOpenAIServer:
+    '''
+    Fake OpenAI-compatible API served on a free local port by a background thread. Answers
+    chat completions, streamed or not, and embeddings. Faults can be scripted for the next
+    chat requests, to test deadlines, retries and error handling:
+        float           seconds to wait before answering, on top of delay
+        'stall'         never answer, until the server stops
+        'error'         503 server error
+        'rate_limit'    429 rate limit error, with a retry-after header
+        None            answer normally
+    '''
+
+    def __init__(
+        self,
+        answer: str = 'Hello there. I am fine, thanks!',
+        delay: float = 0.0,
+        token_delay: float = 0.0,
+        faults: list = None,
+        cached_tokens: int = 0,
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            answer (str): text of every chat answer
+            delay (float): seconds before each answer starts
+            token_delay (float): seconds between two streamed words
+            faults (list): faults of the next chat requests, in order
+            cached_tokens (int): prompt tokens reported as read from the prompt cache
+        '''
+
+        self.answer = answer
+        self.delay = delay
+        self.token_delay = token_delay
+        self.faults = list(faults or [])
+        self.cached_tokens = cached_tokens
+
+        # bodies of the chat requests received, and the number answered at once
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+        self.loop = None
+        self.runner = None
+        self.stopping = None
+        self.thread = None
+        self.port = None
+
+    @property
+    def url(self) -> str:
+        ''' Base url of the api, for openai_base_url '''
+        return f'http://127.0.0.1:{self.port}/v1'
+
+    def start(self) -> 'FakeOpenAIServer':
+        ''' Start serving, returns once the server accepts requests '''
+
+        started = threading.Event()
+
+        async def serve() -> None:
+            app = web.Application()
+            app.add_routes([
+                web.post('/v1/chat/completions', self.chat),
+                web.post('/v1/embeddings', self.embeddings),
+            ])
+            self.stopping = asyncio.Event()
+            self.runner = web.AppRunner(app, shutdown_timeout=0.1)
+            await self.runner.setup()
+            await web.TCPSite(self.runner, '127.0.0.1', 0).start()
+            self.port = self.runner.addresses[0][1]
+
+        def run() -> None:
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(serve())
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.runner.cleanup())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+
+        return self
+
+    def stop(self) -> None:
+        ''' Release stalled requests and stop serving '''
+
+        self.loop.call_soon_threadsafe(self.stopping.set)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def __enter__(self) -> 'FakeOpenAIServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        ''' POST /v1/chat/completions '''
+
+        body = await request.json()
+
+        with self.lock:
+            self.requests.append(body)
+            fault = self.faults.pop(0) if self.faults else None
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        try:
+            return await self._answer(request, body, fault)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    async def _answer(self, request: web.Request, body: dict, fault: float | str | None) -> web.StreamResponse:
+        ''' Answer a chat request, or fail it as scripted '''
+
+        if fault == 'stall':
+            await self.stopping.wait()
+            raise web.HTTPServiceUnavailable()
+
+        if fault == 'error':
+            return web.json_response({'error': {'message': 'Fake server error', 'type': 'server_error'}}, status=503)
+
+        if fault == 'rate_limit':
+            error = {'error': {'message': 'Fake rate limit', 'type': 'rate_limit_exceeded'}}
+            return web.json_response(error, status=429, headers={'retry-after': '0.05'})
+
+        await asyncio.sleep(self.delay + (fault or 0))
+
+        words = re.findall(r'\S+\s*', self.answer)
+        chunk = {'id': 'fake', 'created': 0, 'model': body['model']}
+        usage = {
+            'prompt_tokens': 10 + self.cached_tokens,
+            'completion_tokens': len(words),
+            'total_tokens': 10 + self.cached_tokens + len(words),
+            'prompt_tokens_details': {'cached_tokens': self.cached_tokens},
+        }
+
+        if not body.get('stream'):
+            choice = {'index': 0, 'message': {'role': 'assistant', 'content': self.answer}, 'finish_reason': 'stop'}
+            return web.json_response({**chunk, 'object': 'chat.completion', 'choices': [choice], 'usage': usage})
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+
+        for index, word in enumerate(words):
+            if index:
+                await asyncio.sleep(self.token_delay)
+            choice = {'index': 0, 'delta': {'role': 'assistant', 'content': word}, 'finish_reason': None}
+            await response.write(f'data: {json.dumps({**chunk, "object": "chat.completion.chunk", "choices": [choice]})}\n\n'.encode())
+
+        choice = {'index': 0, 'delta': {}, 'finish_reason': 'stop'}
+        await response.write(f'data: {json.dumps({**chunk, "object": "chat.completion.chunk", "choices": [choice]})}\n\n'.encode())
+
+        # like the openai api, the usage comes in a last chunk without choices when asked for
+        if (body.get('stream_options') or {}).get('include_usage'):
+            await response.write(f'data: {json.dumps({**chunk, "object": "chat.completion.chunk", "choices": [], "usage": usage})}\n\n'.encode())
+
+        await response.write(b'data: [DONE]\n\n')
+
+        return response
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        ''' POST /v1/embeddings '''
+
+        body = await request.json()
+        texts = [body['input']] if isinstance(body['input'], str) else body['input']
+        dimensions = body.get('dimensions') or 64
+
+        data = [{'object': 'embedding', 'index': index, 'embedding': hash_embedding(str(text), dimensions)} for index, text in enumerate(texts)]
+        return web.json_response({'object': 'list', 'data': data, 'model': body['model'], 'usage': {'prompt_tokens': 1, 'total_tokens': 1}})
+
+
+class FakeSttSession:
+    '''
+    Phrase transcribed by a FakeSttEngine. Decoding takes decode_time seconds per second of
+    audio, either chunk by chunk as the phrase is recorded (streaming) or all at once when
+    the phrase ends. Streaming partial transcripts reveal one more word every half second.
+    '''
+
+    def __init__(self, text: str, sample_rate: int, decode_time: float, streaming: bool) -> None:
+        self.words = text.split()
+        self.bytes_per_second = sample_rate * 2
+        self.decode_time = decode_time
+        self.streaming = streaming
+        self.audio = 0.0
+        self.partial = ''
+
+    def accept(self, chunk: bytes) -> str | None:
+        duration = len(chunk) / self.bytes_per_second
+        self.audio += duration
+
+        if not self.streaming:
+            return None
+
+        sleep(duration * self.decode_time)
+        partial = ' '.join(self.words[:int(self.audio * 2)])
+        if partial == self.partial:
+            return None
+
+        self.partial = partial
+        return partial or None
+
+    def finish(self) -> str:
+        if not self.streaming:
+            sleep(self.audio * self.decode_time)
+
+        return ' '.join(self.words)
+
+
+class FakeSttEngine:
+    '''
+    Fake speech to text engine giving the same transcript for every phrase, with the
+    interface of the stt engines. Streaming, it decodes while the phrase is recorded like
+    Vosk. Otherwise it decodes the phrase once it ends, like a request to the Google API.
+    '''
+
+    def __init__(self, text: str = 'hello there how are you', decode_time: float = 0.3, streaming: bool = True) -> None:
+        '''Create class instance
+
+        Args:
+            text (str): transcript of every phrase
+            decode_time (float): seconds to decode one second of audio
+            streaming (bool): if true, decode chunk by chunk, the whole phrase when it ends otherwise
+        '''
+
+        self.text = text
+        self.decode_time = decode_time
+        self.streaming = streaming
+        # sessions started, in order
+        self.sessions = []
+
+    def start(self, sample_rate: int, language: str) -> FakeSttSession:
+        session = FakeSttSession(self.text, sample_rate, self.decode_time, self.streaming)
+        self.sessions.append(session)
+        return session
+
+
+class FakeCommunicate:
+    '''
+    Fake edge_tts.Communicate streaming silent mp3 frames, 0.2 seconds per word, instead of
+    calling the edge_tts service. Every instance created is recorded in the class instances list.
+    '''
+
+    # MPEG-1 layer III frame of silence, 128 kbps at 44.1kHz, 1152 samples
+    FRAME = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)
+    FRAMES_PER_WORD = 8
+
+    instances = []
+
+    def __init__(self, text: str, voice: str, rate: str = '+0%', volume: str = '+0%', pitch: str = '+0Hz', **kwargs: Any) -> None:
+        self.text = text
+        self.voice = voice
+        self.rate = rate
+        self.volume = volume
+        self.pitch = pitch
+        self.saved = []
+        FakeCommunicate.instances.append(self)
+
+    async def stream(self) -> AsyncIterator[dict]:
+        for index, word in enumerate(self.text.split()):
+            yield {'type': 'WordBoundary', 'offset': index, 'duration': 1, 'text': word}
+            yield {'type': 'audio', 'data': self.FRAME * self.FRAMES_PER_WORD}
+
+    async def save(self, audio_fname: str) -> None:
+        with open(audio_fname, 'wb') as f:
+            async for chunk in self.stream():
+                if chunk['type'] == 'audio':
+                    f.write(chunk['data'])
+        self.saved.append(audio_fname)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: support.py
+Description: Test config and helpers shared by the tests and benchmarks, importing nothing heavy so benchmarks can time the startup.
+Example: load_test_config(); path = write_wav('speech.wav', [(0.5, 0), (1.0, 8000), (1.0, 0)])
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import re
+import sys
+import math
+import wave
+import zlib
+import tempfile
+from pathlib import Path
+from typing import Any
+import yaml
+
+# project modules are imported from the tests and benchmarks
+ROOT = Path(__file__).parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def load_test_config(directory: str | Path = None, **overrides: Any) -> dict:
+    '''Load the config template as the config of the process, with every file written by the
+    chatbot (logs, history, caches) moved to a temporary folder and no audio or network
+    side effects. Must be called before importing the project modules, they read the config
+    when imported.
+
+    Args:
+        directory (str | Path): folder of the files written by the chatbot, a new temporary folder if not given
+        **overrides (Any): settings replacing the template ones
+
+    Return:
+        (dict): the loaded config
+    '''
+
+    from config_loader import load_config
+
+    directory = Path(directory or tempfile.mkdtemp(prefix='ai_chatbot_tests_'))
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with open(ROOT / 'config_template.yaml', 'r', encoding='utf-8') as f:
+        settings = yaml.safe_load(f)
+
+    settings.update({
+        'openai_api_key': 'sk-test',
+        'openai_base_url': '',
+        'input_method': 'text',
+        'stream_answer': True,
+        'response_cache': False,
+        'history_summary': False,
+        'tts_cache': False,
+        'tts_cache_prerender': False,
+        'tts_cache_dir': str(directory / 'tts'),
+        'temp_audio_filepath': str(directory / 'audio' / 'answer.mp3'),
+        'facts_index_dir': str(directory / 'facts'),
+        'chat_history': str(directory / 'csv' / 'chat_history.csv'),
+        'history_db': str(directory / 'db' / 'chat_history.db'),
+        'server_history_dir': str(directory / 'sessions'),
+        'log_filepath': str(directory / 'logs' / 'ai_chatbot.log'),
+        'tracing': False,
+        'tracing_jsonl': '',
+        'tracing_prometheus': '',
+        'hot_reload': False,
+    })
+    settings.update(overrides)
+
+    config_file = directory / 'config.yaml'
+    with open(config_file, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(settings, f)
+
+    return load_config(str(config_file))
+
+
+def hash_embedding(text: str, dimensions: int = 64) -> list[float]:
+    '''Returns a bag-of-words vector of a text, so texts sharing words are close. Stands in
+    for an embedding model.
+
+    Args:
+        text (str): text to embed
+        dimensions (int): size of the vector
+
+    Return:
+        (list[float]): the vector, not normalized
+    '''
+
+    vector = [0.0] * dimensions
+    for word in re.findall(r'\w+', text.lower()):
+        vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+
+    return vector
+
+
+def write_wav(path: str | Path, segments: list[tuple[float, int]], sample_rate: int = 16000) -> Path:
+    '''Write a 16-bit mono wav file made of tones and silences, standing in for recorded speech.
+
+    Args:
+        path (str | Path): wav file to write
+        segments (list[tuple[float, int]]): (duration in seconds, amplitude) of each part, amplitude 0 for silence
+        sample_rate (int): frames per second
+
+    Return:
+        (Path): the wav file
+    '''
+
+    frames = bytearray()
+    for duration, amplitude in segments:
+        for i in range(round(duration * sample_rate)):
+            sample = round(amplitude * math.sin(2 * math.pi * 220 * i / sample_rate))
+            frames += sample.to_bytes(2, 'little', signed=True)
+
+    path = Path(path)
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(bytes(frames))
+
+    return path
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_agent_tools.py
+Description: Tests the agent tools with slow fake tools: concurrent tool calls, result caching with expiry, and tool call timings,
+             and that the private langchain methods overridden by the concurrent executor did not change.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import re
+import inspect
+from time import sleep
+from importlib.metadata import version
+from langchain.agents import AgentExecutor
+from langchain.agents.agent_iterator import AgentExecutorIterator
+from support import ROOT
+from tool_utils import cached_tool, ConcurrentAgentExecutor
+from tracing import Tracer, CURRENT_TURN
+from benchmarks.bench_agent_tools import run, slow_tools, build_executor, MAX_OVERHEAD
+
+TOOL_DELAY = 0.2
+
+
+def test_tool_calls_of_a_turn_run_at_once():
+    results = run(tools=3, tool_delay=TOOL_DELAY)
+
+    assert {result['output'] for result in results.values()} == {'It is sunny.'}
+    assert results['sequential']['seconds'] >= 3 * TOOL_DELAY
+    assert results['concurrent']['seconds'] <= TOOL_DELAY + MAX_OVERHEAD
+    assert results['concurrent async']['seconds'] <= TOOL_DELAY + MAX_OVERHEAD
+    # the same calls again are answered from the cache
+    assert results['cached']['calls'] == 0
+    assert results['cached']['seconds'] < TOOL_DELAY
+
+
+def test_cached_results_expire():
+    calls = []
+
+    @cached_tool(ttl=0.1)
+    def lookup(query: str) -> str:
+        calls.append(query)
+        return query.upper()
+
+    assert lookup('a') == lookup('a') == 'A'
+    assert calls == ['a']
+
+    sleep(0.15)
+    assert lookup('a') == 'A'
+    assert calls == ['a', 'a']
+
+
+def test_least_recently_used_results_are_evicted():
+    calls = []
+
+    @cached_tool(max_entries=2)
+    def lookup(query: str) -> str:
+        calls.append(query)
+        return query
+
+    for query in ('a', 'b', 'a', 'c', 'a', 'b'):
+        lookup(query)
+
+    # 'b' was evicted by 'c', 'a' stayed as it was used again
+    assert calls == ['a', 'b', 'c', 'b']
+
+
+def test_tool_calls_are_timed_in_the_turn_trace():
+    calls = []
+    tools = slow_tools(2, TOOL_DELAY, calls)
+
+    trace = Tracer(enabled=True).start_turn()
+    CURRENT_TURN.set(trace)
+    try:
+        build_executor(ConcurrentAgentExecutor, tools).invoke({'input': 'How is the weather?'})
+    finally:
+        CURRENT_TURN.set(None)
+
+    spans = [span for span in trace.spans if span['name'] == 'tool']
+    assert sorted(span['tool'] for span in spans) == ['tool_0', 'tool_1']
+    assert all(TOOL_DELAY <= span['duration'] < TOOL_DELAY + MAX_OVERHEAD for span in spans)
+
+
+def test_overridden_agent_executor_methods_did_not_change():
+    # the version reviewed against the overrides below, pinned in requirements.txt
+    pinned = re.search(r'^langchain==(\S+)$', (ROOT / 'requirements.txt').read_text(), re.MULTILINE).group(1)
+    assert version('langchain') == pinned
+
+    for name in ('_iter_next_step', '_perform_agent_action', '_aperform_agent_action'):
+        parent = inspect.signature(getattr(AgentExecutor, name)).parameters
+        override = inspect.signature(getattr(ConcurrentAgentExecutor, name)).parameters
+        assert list(parent) == list(override), name
+
+    # the parent yields each tool call result as returned by _perform_agent_action, which the executor turns into futures
+    assert 'yield self._perform_agent_action(' in inspect.getsource(AgentExecutor._iter_next_step)
+    # invoke and stream both plan their steps with _iter_next_step
+    assert 'self._iter_next_step(' in inspect.getsource(AgentExecutor._take_next_step)
+    assert 'self.agent_executor._iter_next_step(' in inspect.getsource(AgentExecutorIterator)
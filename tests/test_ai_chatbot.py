@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_ai_chatbot.py
+Description: Tests the answer latency of AiChatbot.generate_model_answer with a fake streaming model.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+import pytest
+from ai_chatbot import AiChatbot
+from tracing import Tracer
+from fakes import ScriptedChatModel
+
+ANSWER = ' '.join(f'Word{i}' for i in range(40)) + '.'
+FIRST_TOKEN_DELAY = 0.05
+TOKEN_DELAY = 0.02
+
+
+@pytest.fixture
+def chatbot(make_chatbot) -> AiChatbot:
+    ''' Text chatbot answering with a fake model streaming ANSWER in about a second '''
+    return make_chatbot(ScriptedChatModel(answers=[ANSWER], first_token_delay=FIRST_TOKEN_DELAY, token_delay=TOKEN_DELAY))
+
+
+def answer(chatbot: AiChatbot, message: str) -> tuple[float, float]:
+    ''' Returns the time to the first token and the time to the full answer, from the model call '''
+
+    trace = Tracer(enabled=True).start_turn()
+    asyncio.run(chatbot.generate_model_answer(message, trace))
+
+    llm = next(span for span in trace.spans if span['name'] == 'llm')
+    return trace.marks['first_token'] - llm['start'], llm['duration']
+
+
+def test_first_token_arrives_before_the_answer_is_complete(chatbot, capsys):
+    first_token, duration = answer(chatbot, 'Hello')
+
+    # the answer takes 40 token delays to generate, the first token only one
+    assert duration >= FIRST_TOKEN_DELAY + 39 * TOKEN_DELAY
+    assert first_token < FIRST_TOKEN_DELAY + 0.2
+    assert first_token < duration / 3
+
+    # the answer is printed as it streams and added whole to the history
+    assert ANSWER in capsys.readouterr().out.replace('\n', '')
+    assert chatbot.messages[-1].content == ANSWER
+
+
+def test_answer_without_streaming_waits_for_the_full_answer(chatbot, config):
+    config['stream_answer'] = False
+
+    first_token, _ = answer(chatbot, 'Hello')
+
+    assert first_token >= FIRST_TOKEN_DELAY + 39 * TOKEN_DELAY
+    assert chatbot.messages[-1].content == ANSWER
+
+
+def test_history_is_sent_with_each_message(chatbot):
+    answer(chatbot, 'Hello')
+    answer(chatbot, 'How are you?')
+
+    assert [message.type for message in chatbot.messages] == ['human', 'ai', 'human', 'ai']
+    assert chatbot.messages[2].content == 'How are you?'
+
+
+def test_failed_message_is_not_sent_again(make_chatbot):
+    model = ScriptedChatModel(answers=['Hi.', RuntimeError('Model call failed'), 'Fine, thanks.'])
+    chatbot = make_chatbot(model)
+
+    with pytest.raises(RuntimeError):
+        answer(chatbot, 'First question')
+    assert len(chatbot.memory) == 0
+
+    answer(chatbot, 'Second question')
+    assert [message.content for message in chatbot.messages] == ['Second question', 'Fine, thanks.']
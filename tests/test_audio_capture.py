@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_audio_capture.py
+Description: Tests end of speech detection of the audio capture service on recorded phrases played as a fake microphone.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import pytest
+import speech_recognition as sr
+from audio_capture import AudioCapture, WavFileSource, rms
+from support import write_wav
+
+SPEED = 4.0
+
+
+def test_short_noises_do_not_start_a_phrase(tmp_path):
+    wav = write_wav(tmp_path / 'speech.wav', [(0.05, 8000), (1.0, 0), (1.0, 8000)])
+    capture = AudioCapture(WavFileSource(wav, gap=1.0, speed=SPEED), min_speech=0.2, calibration_duration=0.5).start()
+
+    try:
+        chunks = list(capture.stream_phrase(timeout=10))
+    finally:
+        capture.close()
+
+    loud = [chunk for chunk in chunks if rms(chunk) > capture.energy_threshold]
+    speech = sum(len(chunk) for chunk in loud) / 2 / capture.sample_rate
+    assert 0.9 <= speech <= 1.1
+
+
+def test_listening_times_out_on_silence(tmp_path):
+    capture = AudioCapture(WavFileSource(gap=0, speed=SPEED), calibration_duration=0.5).start()
+
+    try:
+        with pytest.raises(sr.WaitTimeoutError):
+            list(capture.stream_phrase(timeout=0.5))
+    finally:
+        capture.close()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_barge_in.py
+Description: Tests barge-in with simulated audio: the user talking over the avatar stops its voice within a bounded
+             latency, cancels the turn, and only what was said is kept in the history.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+import threading
+from time import perf_counter, sleep
+from pydub import AudioSegment
+from audio_capture import AudioCapture, WavFileSource
+from audio_player import AudioPlayer, SimulatedOutput
+from tts_pipeline import TtsPipeline
+from fakes import FakeSttEngine, ScriptedChatModel
+from support import write_wav
+from benchmarks.bench_barge_in import run, MAX_STOP_DELAY
+
+ANSWER = 'Well, let me see. The answer to your question is quite long and takes some time to say.'
+
+
+def test_user_talking_stops_the_avatar():
+    result = run(trials=2, block_duration=0.05, min_speech=0.2)
+
+    assert result['max_delay'] <= 0.2 + 0.05 + MAX_STOP_DELAY
+    assert all(0 < fraction < 0.2 for fraction in result['played'])
+
+
+def test_player_stops_within_one_block():
+    player = AudioPlayer(block_duration=0.05, output=SimulatedOutput)
+    played = []
+    thread = threading.Thread(target=lambda: played.append(player.play(AudioSegment.silent(duration=2000))))
+    thread.start()
+
+    sleep(0.5)
+    start = perf_counter()
+    progress = player.stop()
+    thread.join()
+
+    assert perf_counter() - start <= 0.05 + 0.02
+    assert 0.2 <= progress <= 0.3
+    # the block being written when stopped is played too
+    assert 0 <= played[0] - progress <= 0.05 / 2
+    # a stopped player skips the next sentences
+    assert player.play(AudioSegment.silent(duration=1000)) == 0.0
+
+
+def test_cancelled_pipeline_keeps_the_words_spoken():
+    def synthesize(sentence: str) -> AudioSegment:
+        return AudioSegment.silent(duration=100 * len(sentence.split()))
+
+    async def main() -> TtsPipeline:
+        player = AudioPlayer(output=SimulatedOutput)
+        pipeline = TtsPipeline(synthesize, player.play, stop=player.stop, close=player.close).start()
+        await pipeline.feed(ANSWER + ' ')
+        # the first sentence has 4 words, cancel in the middle of the second one
+        await asyncio.sleep(0.4 + 0.65)
+        pipeline.cancel()
+        return pipeline
+
+    spoken = asyncio.run(main()).spoken_text()
+
+    assert spoken.startswith('Well, let me see. The answer')
+    assert ANSWER.startswith(spoken)
+    assert len(spoken.split()) in range(9, 13)
+
+
+def test_chat_is_interrupted_by_the_user(tmp_path, monkeypatch, config, make_chatbot, simulated_speech):
+    import helpers
+    from chat_engine import ChatEngine
+
+    # two phrases of half a second, the second one while the avatar answers the first
+    wav = write_wav(tmp_path / 'user.wav', [(0.5, 8000)])
+    capture = AudioCapture(WavFileSource(wav, wav, gap=1.5), pause_threshold=0.8, min_speech=0.2, calibration_duration=0.5).start()
+    monkeypatch.setattr(helpers, 'AUDIO_CAPTURE', capture)
+    monkeypatch.setattr(helpers, 'STT_ENGINE', FakeSttEngine(text='hello there', decode_time=0.05))
+
+    # note when the user is heard and when audio blocks end
+    speech_starts, blocks = [], []
+    record_audio_message = helpers.record_audio_message
+
+    def record(exit_chat, input_method, language, on_partial=None, on_speech_start=None, show_status=True):
+        def speech_started() -> None:
+            speech_starts.append(perf_counter())
+            on_speech_start()
+        return record_audio_message(exit_chat, input_method, language, on_partial, speech_started, show_status)
+
+    def write(output, data: bytes) -> None:
+        sleep(len(data) / output.bytes_per_second)
+        blocks.append(perf_counter())
+
+    monkeypatch.setattr(helpers, 'record_audio_message', record)
+    monkeypatch.setattr(SimulatedOutput, 'write', write)
+
+    # the first answer is taken by the warm up call of make_chatbot
+    model = ScriptedChatModel(answers=['Hi.', ANSWER, 'Sure.'], first_token_delay=0.05, token_delay=0.01)
+    chatbot = make_chatbot(model, input_method='voice')
+    engine = ChatEngine(chatbot)
+
+    async def main() -> None:
+        async def stop_after_two_turns() -> None:
+            while len(chatbot.memory) < 4:
+                await asyncio.sleep(0.05)
+            chatbot.exit_chat['value'] = True
+            engine.stop()
+
+        await asyncio.wait_for(asyncio.gather(engine.run(), stop_after_two_turns()), timeout=15)
+
+    try:
+        asyncio.run(main())
+    finally:
+        capture.close()
+
+    human, interrupted, _, answer = [message.content for message in chatbot.messages]
+    assert human == 'Hello there'
+    assert interrupted.startswith('Well, let me see.')
+    assert ANSWER.startswith(interrupted) and interrupted != ANSWER
+    assert answer == 'Sure.'
+
+    # the avatar stops within one block of the user being heard on its voice
+    barge_in = speech_starts[1]
+    blocks_after = [block for block in blocks if barge_in < block < barge_in + 0.5]
+    assert not blocks_after or blocks_after[-1] - barge_in <= config['barge_in_latency'] + 0.05
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_batch_runner.py
+Description: Tests the batch mode against a fake OpenAI API: reading conversation files, the adaptive cap on requests in
+             flight, retries of rate limited turns after the delay asked by the api, and errors reported per turn.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import json
+import asyncio
+import pytest
+from batch_runner import read_conversations, AdaptiveLimiter, BatchRunner, run_batch
+from fakes import FakeOpenAIServer
+
+ANSWER = 'Hello there. I am fine, thanks!'
+
+
+@pytest.fixture
+def config(config):
+    ''' Client side calls only, no resilient worker retrying the faults injected '''
+
+    config.update({
+        'llm_resilience': False,
+        'batch_max_retries': 2,
+    })
+
+    yield config
+
+
+def write_conversations(path, conversations: int, turns: int) -> str:
+    ''' Writes a jsonl file of conversations with an opening line and human turns, returns its path '''
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for conversation in range(conversations):
+            messages = [('ai', 'Hi, how can I help?')] + [('human', f'Question {turn}') for turn in range(turns)]
+            for role, content in messages:
+                f.write(json.dumps({'conversation': f'c{conversation}', 'role': role, 'content': content}) + '\n')
+
+    return str(path)
+
+
+def read_results(path) -> list[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_conversations_are_read_from_jsonl(tmp_path):
+    path = tmp_path / 'script.jsonl'
+    lines = [
+        {'conversation': 'a', 'role': 'system', 'content': 'Be brief.'},
+        {'conversation': 'a', 'role': 'ai', 'content': 'Hi!'},
+        {'conversation': 'a', 'role': 'human', 'content': 'Who are you?'},
+        {'conversation': 'a', 'role': 'ai', 'content': 'I am Ada.'},
+        {'conversation': 'a', 'role': 'human', 'content': 'Bye.'},
+        {'conversation': 'b', 'role': 'robot', 'content': 'Invalid role.'},
+        {'conversation': 'b', 'role': 'human', 'content': 'Hello?'},
+    ]
+    path.write_text('\n'.join(json.dumps(line) for line in lines) + '\n{not json\n', encoding='utf-8')
+    other = tmp_path / 'other.jsonl'
+    other.write_text(json.dumps({'role': 'human', 'content': 'No conversation id.'}) + '\n', encoding='utf-8')
+
+    conversations = list(read_conversations([str(path), str(other)]))
+
+    assert [conversation.conversation_id for conversation in conversations] == ['a', 'b', 'other']
+    assert [message.content for message in conversations[0].history] == ['Be brief.', 'Hi!']
+    assert conversations[0].turns == [['Who are you?', 'I am Ada.'], ['Bye.', None]]
+    # invalid lines are skipped
+    assert conversations[1].turns == [['Hello?', None]]
+
+
+def test_limiter_halves_on_rate_limits_and_grows_back():
+
+    async def main() -> None:
+        limiter = AdaptiveLimiter(max_requests=4)
+        for _ in range(4):
+            await limiter.acquire()
+
+        # requests rate limited together lower the cap once
+        await limiter.release(delay=0.1)
+        await limiter.release(delay=0.1)
+        assert limiter.limit == 2
+        assert limiter.rate_limits == 2
+
+        # failed and cancelled requests free their slot without growing the cap
+        await limiter.release(success=False)
+        await limiter.release(success=False)
+        assert (limiter.in_flight, limiter.limit, limiter.successes) == (0, 2, 0)
+
+        # new requests wait for the delay asked by the api
+        start = asyncio.get_running_loop().time()
+        await limiter.acquire()
+        assert asyncio.get_running_loop().time() - start >= 0.09
+
+        # a full cap of successes grows it by one
+        await limiter.release()
+        await limiter.acquire()
+        await limiter.release()
+        assert limiter.limit == 3
+
+    asyncio.run(main())
+
+
+def test_limiter_caps_requests_in_flight():
+    active = []
+
+    async def request(limiter: AdaptiveLimiter) -> None:
+        await limiter.acquire()
+        active.append(limiter.in_flight)
+        await asyncio.sleep(0.01)
+        await limiter.release()
+
+    async def main() -> None:
+        limiter = AdaptiveLimiter(max_requests=3)
+        await asyncio.gather(*(request(limiter) for _ in range(10)))
+
+    asyncio.run(main())
+
+    assert max(active) == 3
+
+
+@pytest.mark.parametrize('resilience', [False, True])
+def test_rate_limited_turn_is_retried_after_the_delay_asked(config, tmp_path, resilience):
+    config['llm_resilience'] = resilience
+    conversations = write_conversations(tmp_path / 'script.jsonl', conversations=1, turns=1)
+    output = tmp_path / 'results.jsonl'
+
+    with FakeOpenAIServer(answer=ANSWER, delay=0.01, faults=['rate_limit']) as api:
+        config['openai_base_url'] = api.url
+        summary = run_batch([conversations], output=str(output), max_requests=4)
+
+    [result] = read_results(output)
+
+    # the runner retries after the 0.05 seconds of the retry-after header, not the client or the resilient worker
+    assert result['status'] == 'ok'
+    assert result['output'] == ANSWER
+    assert result['attempts'] == 2
+    assert len(api.requests) == 2
+    assert summary['rate_limits'] == 1
+    assert 0.05 <= summary['wall_time'] < 0.5
+
+
+def test_rate_limits_lower_the_requests_in_flight(config, tmp_path):
+    import helpers
+
+    conversations = write_conversations(tmp_path / 'script.jsonl', conversations=4, turns=1)
+    faults = ['rate_limit'] * 4
+
+    with FakeOpenAIServer(answer=ANSWER, delay=0.05, faults=faults) as api:
+        config['openai_base_url'] = api.url
+
+        async def main() -> BatchRunner:
+            worker, http_client = helpers.build_shared_worker('chain', max_connections=4, retry_rate_limits=False)
+            with open(tmp_path / 'results.jsonl', 'w', encoding='utf-8') as output:
+                runner = BatchRunner(worker, output, conversations=4, max_requests=4, max_retries=2)
+                try:
+                    await runner.run([conversations])
+                finally:
+                    await http_client.aclose()
+            return runner
+
+        runner = asyncio.run(main())
+
+    # the 4 requests rate limited together halve the cap once, 2 successes then grow it back to 3
+    assert runner.limiter.rate_limits == 4
+    assert runner.limiter.limit == 3
+    assert len(api.requests) == 8
+    assert runner.statuses == {'ok': 4}
+
+
+def test_conversations_are_read_as_slots_free_up(config, tmp_path, monkeypatch):
+    import batch_runner
+
+    conversations = write_conversations(tmp_path / 'script.jsonl', conversations=12, turns=2)
+    held = []
+    finished = []
+
+    def counting_reader(filepaths: list[str]):
+        for index, conversation in enumerate(read_conversations(filepaths), 1):
+            # conversations read and not finished are the ones held in memory
+            held.append(index - len(finished))
+            yield conversation
+
+    run_conversation = BatchRunner.run_conversation
+
+    async def counting_run(self, conversation) -> None:
+        await run_conversation(self, conversation)
+        finished.append(conversation.conversation_id)
+
+    monkeypatch.setattr(batch_runner, 'read_conversations', counting_reader)
+    monkeypatch.setattr(BatchRunner, 'run_conversation', counting_run)
+
+    with FakeOpenAIServer(answer=ANSWER, delay=0.02) as api:
+        config['openai_base_url'] = api.url
+        summary = run_batch([conversations], output=str(tmp_path / 'results.jsonl'), conversations=3, max_requests=10)
+
+    assert summary['ok'] == 24
+    assert len(finished) == 12
+    # the running conversations and the next one, waiting for a slot
+    assert max(held) <= 3 + 1
+    assert api.max_active <= 3
+
+
+def test_errors_are_reported_per_turn(config, tmp_path):
+    conversations = write_conversations(tmp_path / 'script.jsonl', conversations=1, turns=3)
+    output = tmp_path / 'results.jsonl'
+
+    with FakeOpenAIServer(answer=ANSWER, delay=0.01, faults=[None, 'error']) as api:
+        config['openai_base_url'] = api.url
+        summary = run_batch([conversations], output=str(output))
+
+    results = read_results(output)
+
+    # the failed turn is not retried, the following ones are skipped as their history would be wrong
+    assert [result['status'] for result in results] == ['ok', 'error', 'skipped']
+    assert 'InternalServerError' in results[1]['error']
+    assert results[1]['attempts'] == 1
+    assert len(api.requests) == 2
+    assert (summary['ok'], summary['error'], summary['skipped']) == (1, 1, 1)
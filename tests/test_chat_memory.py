@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_chat_memory.py
+Description: Tests the token budget and background summary of ChatMemory, and runs the 1,000-turn benchmark.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+from langchain_core.messages import HumanMessage, AIMessage
+from chat_memory import ChatMemory, MESSAGE_OVERHEAD_TOKENS
+from benchmarks.bench_chat_memory import run, MAX_SLOWDOWN
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def add_turn(memory: ChatMemory, index: int, words: int = 10) -> None:
+    memory.append(HumanMessage(content=' '.join([f'question{index}'] * words)))
+    memory.append(AIMessage(content=' '.join([f'answer{index}'] * words)))
+
+
+def test_history_is_bounded_and_fast_over_1000_turns():
+    result = run(turns=1000, token_budget=2000)
+
+    assert result['tokens'] <= result['token_budget']
+    assert 0 < result['messages'] < 100
+    assert result['last_turns_us'] <= result['first_turns_us'] * MAX_SLOWDOWN
+
+
+def test_oldest_whole_turns_are_dropped_first():
+    memory = ChatMemory(3 * (10 + MESSAGE_OVERHEAD_TOKENS) * 2, count_words)
+
+    for index in range(5):
+        add_turn(memory, index)
+
+    assert [message.content.split()[0] for message in memory.messages] == [
+        'question2', 'answer2', 'question3', 'answer3', 'question4', 'answer4'
+    ]
+    assert memory.total_tokens == sum(count_words(message.content) + MESSAGE_OVERHEAD_TOKENS for message in memory.messages)
+
+
+def test_latest_turn_is_kept_above_the_budget():
+    memory = ChatMemory(10, count_words)
+    add_turn(memory, 0, words=50)
+
+    assert len(memory) == 2
+
+
+def test_dropped_turns_are_summarized_in_the_background():
+    summaries = []
+
+    def summarize(summary: str, messages: list) -> str:
+        summaries.append([message.content.split()[0] for message in messages])
+        return f'Talked about {len(messages)} messages'
+
+    memory = ChatMemory(2 * (10 + MESSAGE_OVERHEAD_TOKENS) * 2, count_words, summarize)
+    for index in range(4):
+        add_turn(memory, index)
+
+    memory.summarize_in_background()
+    memory.summary_thread.join()
+
+    assert summaries == [['question0', 'answer0', 'question1', 'answer1']]
+    assert memory.messages[0].type == 'system'
+    assert 'Talked about 4 messages' in memory.messages[0].content
+    assert len(memory.messages) == 5
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_chat_server.py
+Description: Tests the multi-session chat server against a fake OpenAI API, and runs a small load test.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from fakes import FakeOpenAIServer
+from benchmarks.bench_chat_server import run, MIN_SPEEDUP
+
+
+@pytest.fixture
+def api(config) -> FakeOpenAIServer:
+    ''' Fake API the server sends its requests to '''
+
+    with FakeOpenAIServer(answer='Hello there. I am fine, thanks!', token_delay=0.01) as api:
+        config['openai_base_url'] = api.url
+        yield api
+
+
+def serve(test) -> None:
+    ''' Run a coroutine function with a client of a new chat server, and the server '''
+
+    from chat_server import ChatServer
+
+    async def main() -> None:
+        server = ChatServer('chain')
+        async with TestClient(TestServer(server.app)) as client:
+            await test(client, server)
+
+    asyncio.run(main())
+
+
+async def new_session(client) -> str:
+    response = await client.post('/sessions')
+    assert response.status == 201
+    return (await response.json())['session_id']
+
+
+def test_sessions_have_their_own_history(api):
+    async def test(client, server) -> None:
+        alice, bob = await new_session(client), await new_session(client)
+
+        for session_id, message in ((alice, 'I am Alice'), (bob, 'I am Bob'), (alice, 'Who am I?')):
+            response = await client.post(f'/sessions/{session_id}/messages', json={'input': message})
+            assert (await response.json()) == {'output': 'Hello there. I am fine, thanks!'}
+
+        assert len(server.sessions[alice].memory) == 4
+        assert len(server.sessions[bob].memory) == 2
+
+    serve(test)
+
+    last_request = ' '.join(str(message['content']) for message in api.requests[-1]['messages'])
+    assert 'I am Alice' in last_request
+    assert 'I am Bob' not in last_request
+
+
+def test_websocket_streams_the_answer(api):
+    async def test(client, server) -> None:
+        session_id = await new_session(client)
+
+        async with client.ws_connect(f'/sessions/{session_id}/ws') as ws:
+            await ws.send_json({'input': 'Hello'})
+            chunks = []
+            while (reply := await ws.receive_json())['type'] == 'chunk':
+                chunks.append(reply['text'])
+
+        assert reply == {'type': 'done', 'text': 'Hello there. I am fine, thanks!'}
+        assert len(chunks) > 1
+        assert ''.join(chunks) == reply['text']
+
+    serve(test)
+
+
+def test_invalid_requests_are_rejected(api):
+    async def test(client, server) -> None:
+        session_id = await new_session(client)
+
+        assert (await client.post(f'/sessions/{session_id}/messages', json={'text': 'Hello'})).status == 400
+        assert (await client.post(f'/sessions/{session_id}/messages', json={'input': '  '})).status == 400
+        assert (await client.post('/sessions/unknown/messages', json={'input': 'Hello'})).status == 404
+        assert (await client.delete(f'/sessions/{session_id}')).status == 204
+        assert session_id not in server.sessions
+
+    serve(test)
+
+
+def test_idle_sessions_expire_unless_connected(api, config):
+    config['server_session_ttl'] = 0.2
+
+    async def test(client, server) -> None:
+        connected, idle = await new_session(client), await new_session(client)
+
+        async with client.ws_connect(f'/sessions/{connected}/ws'):
+            await asyncio.sleep(0.7)
+
+        assert connected in server.sessions
+        assert idle not in server.sessions
+
+    serve(test)
+
+
+def test_sessions_are_answered_concurrently(config):
+    result = run(sessions=20, messages=2, delay=0.1, token_delay=0.01)
+    loaded = result['loaded']
+
+    assert not loaded['errors']
+    assert loaded['answers_per_second'] >= result['alone']['answers_per_second'] * MIN_SPEEDUP
+    assert result['max_active'] > 1
+
+
+def test_failed_message_is_not_sent_again(config):
+    config['llm_max_retries'] = 0
+
+    async def test(client, server) -> None:
+        session_id = await new_session(client)
+
+        failed = await client.post(f'/sessions/{session_id}/messages', json={'input': 'First question'})
+        assert failed.status == 502
+        assert len(server.sessions[session_id].memory) == 0
+
+        answered = await client.post(f'/sessions/{session_id}/messages', json={'input': 'Second question'})
+        assert answered.status == 200
+        assert len(server.sessions[session_id].memory) == 2
+
+    with FakeOpenAIServer(faults=['error']) as api:
+        config['openai_base_url'] = api.url
+        serve(test)
+
+    last_request = ' '.join(str(message['content']) for message in api.requests[-1]['messages'])
+    assert 'Second question' in last_request
+    assert 'First question' not in last_request
+
+
+def test_websocket_closed_before_an_error(api, monkeypatch, caplog):
+    import aiohttp
+    import chat_server
+
+    async def failing_answer(worker, inputs: dict):
+        await asyncio.sleep(0.3)
+        raise RuntimeError('Model call failed')
+        yield
+
+    monkeypatch.setattr(chat_server.helpers, 'astream_answer', failing_answer)
+
+    async def test(client, server) -> None:
+        session_id = await new_session(client)
+
+        # the user leaves before the answer fails
+        async with aiohttp.ClientSession() as user:
+            ws = await user.ws_connect(client.make_url(f'/sessions/{session_id}/ws'))
+            await ws.send_json({'input': 'Hello'})
+
+        while server.sessions[session_id].connections:
+            await asyncio.sleep(0.05)
+        assert len(server.sessions[session_id].memory) == 0
+
+    serve(test)
+
+    assert not [record for record in caplog.records if record.name.startswith('aiohttp') and record.levelname == 'ERROR']
+
+
+def test_server_does_not_print_agent_steps(api, config):
+    from chat_server import ChatServer
+
+    config['agent_verbose'] = True
+    server = ChatServer('agent')
+
+    assert server.worker.worker.verbose is False
+    assert server.rebuild_worker().worker.verbose is False
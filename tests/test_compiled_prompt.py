@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_compiled_prompt.py
+Description: Tests the compiled prompt against a fake OpenAI API: memoized until the prompt file changes, a static prefix
+             sent byte for byte the same on every turn, prompt caching options, and cached prompt tokens added to the turn.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import os
+import json
+import pytest
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.outputs import LLMResult
+from compiled_prompt import load_compiled_prompt, PROMPT_USAGE
+from tracing import Tracer, CURRENT_TURN
+from fakes import FakeOpenAIServer
+
+MESSAGES = [
+    {'role': 'system', 'content': 'You are Ada, a helpful assistant.  '},
+    {'role': 'ai', 'content': 'Hi, what can I do for you?'},
+]
+
+
+@pytest.fixture
+def prompt_file(config, tmp_path):
+    ''' A prompt file used by the workers built from config '''
+
+    path = tmp_path / 'prompt.jsonl'
+    path.write_text(''.join(json.dumps(message) + '\n' for message in MESSAGES), encoding='utf-8')
+    config['prompt_filepath'] = str(path)
+
+    yield path
+
+
+def test_prompt_is_compiled_again_when_the_file_changes(prompt_file):
+    prompt = load_compiled_prompt(prompt_file)
+    assert load_compiled_prompt(prompt_file) is prompt
+    assert prompt.messages == (('system', 'You are Ada, a helpful assistant.'), ('ai', 'Hi, what can I do for you?'))
+
+    # same size, later modification time
+    stat = prompt_file.stat()
+    prompt_file.write_text(prompt_file.read_text(encoding='utf-8').replace('Ada', 'Eve'), encoding='utf-8')
+    os.utime(prompt_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    edited = load_compiled_prompt(prompt_file)
+    assert edited is not prompt
+    assert edited.messages[0] == ('system', 'You are Eve, a helpful assistant.')
+
+    # same modification time, other size
+    stat = prompt_file.stat()
+    with open(prompt_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'role': 'human', 'content': 'Hello.'}) + '\n')
+    os.utime(prompt_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    extended = load_compiled_prompt(prompt_file)
+    assert extended is not edited
+    assert len(extended.messages) == 3
+    assert extended.digest != edited.digest
+
+
+def test_model_options_follow_the_config(config, prompt_file):
+    prompt = load_compiled_prompt(prompt_file)
+
+    config['openai_prompt_cache_key'] = True
+    assert prompt.model_options() == {'stream_usage': True, 'extra_body': {'prompt_cache_key': f'ai_chatbot-{prompt.digest}'}}
+
+    config['openai_prompt_cache_key'] = False
+    assert prompt.model_options() == {'stream_usage': True}
+
+
+def test_static_prefix_is_sent_the_same_on_every_turn(config, prompt_file):
+    import helpers
+
+    config['openai_prompt_cache_key'] = True
+    history = [HumanMessage(content='I am Bob.'), AIMessage(content='Hello Bob.')]
+
+    with FakeOpenAIServer() as api:
+        config['openai_base_url'] = api.url
+        chain = helpers.build_chain()
+        ''.join(helpers.stream_answer(chain, {'input': 'Who are you?', 'chat_history': []}))
+        ''.join(helpers.stream_answer(chain, {'input': 'Who am I?', 'chat_history': history}))
+
+    prefix = len(MESSAGES)
+    first, second = api.requests
+
+    assert json.dumps(first['messages'][:prefix]) == json.dumps(second['messages'][:prefix])
+    assert first['messages'][0] == {'role': 'system', 'content': 'You are Ada, a helpful assistant.'}
+    assert [message['content'] for message in second['messages'][prefix:]] == ['I am Bob.', 'Hello Bob.', 'Who am I?']
+    assert first['prompt_cache_key'] == second['prompt_cache_key'] == f'ai_chatbot-{load_compiled_prompt(prompt_file).digest}'
+    assert first['stream_options'] == {'include_usage': True}
+
+
+def test_cached_prompt_tokens_are_added_to_the_turn(config, prompt_file):
+    import helpers
+
+    trace = Tracer(enabled=True).start_turn()
+    CURRENT_TURN.set(trace)
+
+    try:
+        with FakeOpenAIServer(cached_tokens=1024) as api:
+            config['openai_base_url'] = api.url
+            chain = helpers.build_chain()
+            ''.join(helpers.stream_answer(chain, {'input': 'Who are you?', 'chat_history': []}))
+            ''.join(helpers.stream_answer(chain, {'input': 'Who am I?', 'chat_history': []}))
+    finally:
+        CURRENT_TURN.set(None)
+
+    # the fake api reports 10 uncached prompt tokens per call, the calls of a turn add up
+    assert trace.tokens == {'prompt': 2 * 1034, 'cached': 2 * 1024, 'uncached': 2 * 10}
+
+
+def test_prompt_usage_of_non_streamed_calls():
+    usage = {'prompt_tokens': 1500, 'completion_tokens': 20, 'prompt_tokens_details': {'cached_tokens': 1280}}
+
+    assert PROMPT_USAGE.prompt_usage(LLMResult(generations=[], llm_output={'token_usage': usage})) == (1500, 1280)
+    assert PROMPT_USAGE.prompt_usage(LLMResult(generations=[], llm_output={})) == (None, 0)
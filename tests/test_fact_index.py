@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_fact_index.py
+Description: Tests the fact index: incremental builds, exact and approximate search, and the agent tools searching it through a fake embedding API.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import json
+import pytest
+from fact_index import FactIndex, reset_fact_indexes
+from fakes import FakeOpenAIServer
+from support import hash_embedding
+from benchmarks.bench_fact_index import run, MAX_QUERY_MS, MAX_QUERY_MB, MIN_RECALL
+
+FACTS = [
+    'Your favourite color is yellow',
+    'You live in Berlin with your cat',
+    'You play the guitar every evening',
+    'Your best friend is called Paul',
+]
+
+
+class CountingEmbeddings:
+    ''' Bag-of-words embeddings, counting the facts embedded '''
+
+    def __init__(self) -> None:
+        self.embedded = []
+
+    def embed_documents(self, facts: list[str]) -> list[list[float]]:
+        self.embedded.extend(facts)
+        return [hash_embedding(fact) for fact in facts]
+
+    def embed_query(self, query: str) -> list[float]:
+        return hash_embedding(query)
+
+
+def test_search_stays_fast_and_accurate_as_facts_grow():
+    results = run(sizes=[1000, 20000], dimensions=64, ann_min_facts=10000, queries=50)
+
+    assert not results[1000]['ann'] and results[20000]['ann']
+    for result in results.values():
+        assert result['p95_ms'] <= MAX_QUERY_MS
+        assert result['query_mb'] <= MAX_QUERY_MB
+        assert result['recall'] >= MIN_RECALL
+
+
+def test_only_new_facts_are_embedded(tmp_path):
+    embeddings = CountingEmbeddings()
+    index = FactIndex(tmp_path / 'index', embeddings.embed_documents, embeddings.embed_query)
+
+    assert index.build(FACTS[:3]) == 3
+    assert index.build(FACTS[:3]) == 0
+    assert index.build(FACTS[1:]) == 1
+    assert embeddings.embedded == FACTS[:3] + FACTS[3:]
+
+    # the index holds exactly the last facts, also once loaded again
+    index = FactIndex(tmp_path / 'index', embeddings.embed_documents, embeddings.embed_query)
+    assert len(index) == 3
+    assert FACTS[0] not in [fact for fact, _ in index.search('favourite color yellow', k=3)]
+
+
+def test_only_relevant_facts_are_returned(tmp_path):
+    embeddings = CountingEmbeddings()
+    index = FactIndex(tmp_path / 'index', embeddings.embed_documents, embeddings.embed_query)
+    index.build(FACTS)
+
+    results = index.search('Which guitar do you play?', k=2, min_score=0.2)
+
+    assert results[0][0] == 'You play the guitar every evening'
+    assert all(score >= 0.2 for _, score in results)
+    assert index.search('quantum chromodynamics', min_score=0.2) == []
+
+
+def test_model_change_embeds_all_facts_again(tmp_path):
+    embeddings = CountingEmbeddings()
+    FactIndex(tmp_path / 'index', embeddings.embed_documents, embeddings.embed_query, model='small').build(FACTS)
+    index = FactIndex(tmp_path / 'index', embeddings.embed_documents, embeddings.embed_query, model='large')
+
+    assert index.build(FACTS) == len(FACTS)
+
+
+@pytest.fixture
+def facts_api(config, tmp_path, monkeypatch):
+    ''' Facts file about the chatbot and the user, embedded by a fake API '''
+
+    import functools
+    import fact_index
+
+    # long facts are split with tiktoken first, whose encodings are downloaded
+    monkeypatch.setattr(fact_index, 'OpenAIEmbeddings', functools.partial(fact_index.OpenAIEmbeddings, check_embedding_ctx_length=False))
+
+    facts_file = tmp_path / 'facts.jsonl'
+    lines = [{'about': 'yourself', 'fact': fact} for fact in FACTS] + [{'about': 'interlocutor', 'fact': 'Your interlocutor loves jazz music'}]
+    facts_file.write_text('\n'.join(json.dumps(line) for line in lines), encoding='utf-8')
+
+    with FakeOpenAIServer() as api:
+        config['openai_base_url'] = api.url
+        config['facts_filepath'] = str(facts_file)
+        config['facts_index_dir'] = str(tmp_path / 'facts')
+        reset_fact_indexes()
+        yield api
+
+    reset_fact_indexes()
+
+    import tools
+    for tool in tools.agent_tools:
+        tool.func.cache_clear()
+
+
+def test_agent_tools_inject_only_relevant_facts(facts_api):
+    import tools
+
+    yourself = tools.get_information_about_yourself.invoke({'query': 'Where do you live?'})
+    interlocutor = tools.get_information_about_your_interlocutor.invoke({'query': 'Does your interlocutor like jazz music?'})
+
+    assert yourself[0] == 'You live in Berlin with your cat'
+    assert len(yourself) < len(FACTS)
+    assert interlocutor == ['Your interlocutor loves jazz music']
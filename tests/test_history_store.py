@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_history_store.py
+Description: Tests the SQLite chat history store: lookups, rotation, csv export in the format of helpers.write_to_csv, and lookup speed on a large history.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+from datetime import datetime
+from pathlib import Path
+import helpers
+from history_store import HistoryRow, SqliteHistoryStore, rotate_file, rotation_order
+from benchmarks.bench_history_store import run, MAX_LOOKUP_MS
+
+
+def row(session_id: str, second: int, speaker: str = 'Me', message: str = 'Hello') -> HistoryRow:
+    return HistoryRow(session_id, f'2026-01-01 10:00:{second:02d}', speaker, message)
+
+
+def test_lookups_stay_fast_on_a_large_history():
+    result = run(rows=100000, lookups=20)
+
+    assert result['session_ms'] <= MAX_LOOKUP_MS
+    assert result['time_range_ms'] <= MAX_LOOKUP_MS
+    assert result['session_ms'] < result['scan_ms']
+
+
+def test_lookups_by_session_and_time_range(tmp_path):
+    store = SqliteHistoryStore(tmp_path / 'history.db')
+    store.write_rows([row('a', 0), row('b', 1, 'Bot'), row('a', 2, 'Bot'), row('b', 3), row('a', 4)])
+
+    assert [r.timestamp[-2:] for r in store.session('a')] == ['00', '02', '04']
+    assert store.session('unknown') == []
+
+    rows = store.time_range(datetime(2026, 1, 1, 10, 0, 1), datetime(2026, 1, 1, 10, 0, 4))
+    assert [r.timestamp[-2:] for r in rows] == ['01', '02', '03']
+
+    rows = store.time_range(datetime(2026, 1, 1, 10), datetime(2026, 1, 1, 11), speaker='Bot')
+    assert [r.session_id for r in rows] == ['b', 'a']
+
+    store.close()
+
+
+def test_queries_span_rotated_databases_in_order(tmp_path):
+    store = SqliteHistoryStore(tmp_path / 'history.db', max_bytes=1)
+
+    for second in range(3):
+        store.write_rows([row('a', second, message=f'message {second}')])
+        store.flush()
+
+    assert len(store.files()) == 4
+    assert [r.message for r in store.session('a')] == ['message 0', 'message 1', 'message 2']
+
+    store.close()
+
+
+def test_files_rotated_in_the_same_second_are_ordered(tmp_path):
+    path = tmp_path / 'history.csv'
+    rotated = []
+
+    for _ in range(11):
+        path.write_text('row')
+        rotated.append(rotate_file(path))
+
+    assert sorted(rotated, key=lambda file: rotation_order(path, file)) == rotated
+
+
+def test_csv_export_matches_write_to_csv(tmp_path):
+    store = SqliteHistoryStore(tmp_path / 'history.db')
+    store.write_rows([row('a', 0, 'NEW CHAT', None), row('a', 1, 'Me', 'Hello, "you"')])
+    store.export_csv(tmp_path / 'export.csv', session_id='a')
+
+    helpers.write_to_csv(tmp_path / 'direct.csv', 'NEW CHAT')
+    helpers.write_to_csv(tmp_path / 'direct.csv', 'Me', 'Hello, "you"')
+
+    def without_timestamps(path: Path) -> list[str]:
+        return [line.split(',', 1)[1] for line in path.read_text(encoding='utf-8').splitlines()]
+
+    assert without_timestamps(tmp_path / 'export.csv') == without_timestamps(tmp_path / 'direct.csv')
+
+    store.close()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_history_writer.py
+Description: Tests the background chat history writer: batching, flush interval, draining on close, and its throughput against helpers.write_to_csv.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import csv
+from time import sleep
+from history_store import CsvHistoryStore, SqliteHistoryStore
+from history_writer import HistoryWriter
+from benchmarks.bench_history_writer import run, MIN_SPEEDUP
+
+
+def read_csv(path) -> list[list[str]]:
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+
+def test_rows_are_queued_faster_than_written_one_by_one():
+    for backend in ('csv', 'sqlite'):
+        result = run(rows=5000, backend=backend)
+
+        assert result['rows_found'] == result['rows']
+        assert result['queued_rows_per_second'] >= result['direct_rows_per_second'] * MIN_SPEEDUP
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    path = tmp_path / 'history.csv'
+    writer = HistoryWriter(CsvHistoryStore(path), flush_rows=3, flush_interval=60)
+
+    for index in range(2):
+        writer.write('session', 'Me', f'message {index}')
+    sleep(0.1)
+    assert not path.exists() or not read_csv(path)
+
+    writer.write('session', 'Me', 'message 2')
+    writer.flush()
+    assert len(read_csv(path)) == 3
+
+    writer.close()
+
+
+def test_buffered_rows_are_written_after_the_flush_interval(tmp_path):
+    path = tmp_path / 'history.csv'
+    writer = HistoryWriter(CsvHistoryStore(path), flush_rows=100, flush_interval=0.1)
+
+    writer.write('session', 'Me', 'Hello')
+    sleep(0.3)
+    assert read_csv(path)[-1][-2:] == ['Me', 'Hello']
+
+    writer.close()
+
+
+def test_close_drains_the_queue_and_formats_rows(tmp_path):
+    path = tmp_path / 'history.db'
+    writer = HistoryWriter(SqliteHistoryStore(path), flush_rows=1000, flush_interval=60)
+
+    writer.write('session', 'NEW CHAT')
+    writer.write('session', 'Me', 'Hello\tthere,\n  how   are you?')
+    writer.close()
+
+    rows = SqliteHistoryStore(path).session('session')
+    assert [(row.speaker, row.message) for row in rows] == [('NEW CHAT', None), ('Me', 'Hello there, how are you?')]
+    assert not writer.thread.is_alive()
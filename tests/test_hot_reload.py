@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_hot_reload.py
+Description: Tests reloading the config, prompt and tools files: valid changes swap in a worker built from them, invalid
+             ones keep the current settings, turns in progress keep their worker, and startup settings wait for a restart.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import json
+import asyncio
+import importlib
+import pytest
+import yaml
+from hot_reload import HotReloader
+from helpers import load_prompt_messages
+
+TOOLS = '''
+def greet():
+    return {greeting!r}
+'''
+
+
+@pytest.fixture
+def files(config, tmp_path, monkeypatch):
+    ''' Config, prompt and tools files of the reloader, the tools loaded as the tools module '''
+
+    prompt = tmp_path / 'prompt.jsonl'
+    prompt.write_text(json.dumps({'role': 'system', 'content': 'You are Ada.'}) + '\n', encoding='utf-8')
+
+    # reloading the tools module finds it on the python path
+    tools = tmp_path / 'tools.py'
+    tools.write_text(TOOLS.format(greeting='Hello'), encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'tools', raising=False)
+    importlib.import_module('tools')
+
+    config.update({'prompt_filepath': str(prompt), 'tools_filepath': str(tools)})
+
+    return {'config': tmp_path / 'config.yaml', 'prompt': prompt, 'tools': tools}
+
+
+class Worker:
+    ''' Worker standing in for a chain, holding the settings it was built from '''
+
+    def __init__(self, config: dict) -> None:
+        self.temperature = config['openai_temperature']
+        self.voices = config['edgetts_voices']
+        self.prompt = load_prompt_messages()
+        self.greeting = sys.modules['tools'].greet()
+
+
+def make_reloader(config, files: dict, swapped: list) -> HotReloader:
+    ''' A reloader building Workers from the config, the swapped in workers appended to a list '''
+
+    reloader = HotReloader(rebuild=lambda: Worker(config), swap=swapped.append)
+    reloader.config_file = str(files['config'])
+    return reloader
+
+
+def write_config(config, path, **changes) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({**config, **changes}, f)
+
+
+def test_valid_changes_swap_the_worker(config, files):
+    swapped = []
+    reloader = make_reloader(config, files, swapped)
+    voices = {**config['edgetts_voices'], 'de-DE': 'de-DE-KatjaNeural'}
+
+    write_config(config, files['config'], openai_temperature=0.3, edgetts_voices=voices)
+    files['prompt'].write_text(json.dumps({'role': 'system', 'content': 'You are Eve.'}) + '\n', encoding='utf-8')
+    files['tools'].write_text(TOOLS.format(greeting='Bonjour'), encoding='utf-8')
+
+    assert asyncio.run(reloader.reload({'config', 'prompt', 'tools'}))
+
+    [worker] = swapped
+    assert (worker.temperature, worker.voices, worker.prompt, worker.greeting) == (0.3, voices, [('system', 'You are Eve.')], 'Bonjour')
+    assert config['openai_temperature'] == 0.3
+    assert config['edgetts_voices'] == voices
+
+
+@pytest.mark.parametrize('changes', [
+    {'openai_temperature': 'hot'},
+    {'edgetts_voices': {'fr-FR': 'fr-FR-DeniseNeural'}},
+    {'prompt_filepath': 'missing.jsonl'},
+])
+def test_invalid_config_keeps_the_current_settings(config, files, changes):
+    swapped = []
+    reloader = make_reloader(config, files, swapped)
+    settings = dict(config)
+
+    write_config(config, files['config'], **changes)
+
+    assert not asyncio.run(reloader.reload({'config'}))
+    assert swapped == []
+    assert dict(config) == settings
+
+
+def test_turn_in_progress_keeps_its_worker_and_settings(config, files):
+    swapped = []
+    events = []
+    reloader = make_reloader(config, files, swapped)
+    rebuild = reloader.rebuild
+    reloader.rebuild = lambda: events.append('built') or rebuild()
+
+    write_config(config, files['config'], openai_temperature=0.3)
+
+    async def turn(lock: asyncio.Lock, started: asyncio.Event) -> float:
+        async with lock:
+            started.set()
+            # the worker is built while the turn runs, not after it
+            while 'built' not in events:
+                await asyncio.sleep(0.01)
+            events.append('turn done')
+            return config['openai_temperature']
+
+    async def main() -> tuple[float, bool]:
+        lock = asyncio.Lock()
+        started = asyncio.Event()
+        task = asyncio.create_task(turn(lock, started))
+        await started.wait()
+
+        reloaded = await asyncio.wait_for(reloader.reload({'config'}, lock), timeout=5)
+        return await task, reloaded
+
+    temperature, reloaded = asyncio.run(main())
+
+    assert reloaded
+    assert temperature == 1.2
+    assert events == ['built', 'turn done']
+    # swapped in once the turn released the lock
+    assert swapped[0].temperature == config['openai_temperature'] == 0.3
+
+
+def test_broken_tools_module_is_rolled_back(config, files):
+    swapped = []
+    reloader = make_reloader(config, files, swapped)
+    settings = dict(config)
+
+    # valid syntax, failing when imported
+    files['tools'].write_text(TOOLS.format(greeting='Hi') + 'raise RuntimeError("broken tools")\n', encoding='utf-8')
+
+    assert not asyncio.run(reloader.reload({'tools'}))
+    assert swapped == []
+    assert sys.modules['tools'].greet() == 'Hello'
+    assert dict(config) == settings
+
+
+def test_startup_settings_wait_for_a_restart(config, files):
+    swapped = []
+    reloader = make_reloader(config, files, swapped)
+
+    write_config(config, files['config'], user_name='Bob', stt_engine='vosk', openai_temperature=0.3)
+
+    assert asyncio.run(reloader.reload({'config'}))
+    assert config['user_name'] == 'Me'
+    assert config['stt_engine'] == 'google'
+    assert config['openai_temperature'] == swapped[0].temperature == 0.3
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_logging.py
+Description: Tests the log file rotation, the json format and the log queue, and runs the logging overhead benchmark.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import sys
+import json
+import logging
+from time import sleep
+from logger import RotatingLogHandler, JsonFormatter, LogQueueHandler
+from benchmarks.bench_logging import run
+
+
+def make_record(message: str, *args, exc_info=None) -> logging.LogRecord:
+    return logging.LogRecord('test', logging.ERROR, __file__, 1, message, args, exc_info)
+
+
+def test_queue_takes_the_file_writes_off_the_logging_thread():
+    result = run(records=100, turns=20)
+
+    for mode in ('direct text', 'queue text', 'direct json', 'queue json'):
+        # every record reaches the file, one line per debug record plus the exception lines
+        assert result[mode]['lines'] >= 25 * 101
+
+    assert result['queue text']['lines'] == result['direct text']['lines']
+    assert result['queue text']['turn_ms'] < result['direct text']['turn_ms']
+
+
+def test_log_file_rotates_by_size(tmp_path):
+    handler = RotatingLogHandler(tmp_path / 'chat.log', max_bytes=500, backup_count=2)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+
+    for index in range(30):
+        handler.emit(make_record(f'message {index} ' + 'x' * 50))
+    handler.close()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['chat.log', 'chat.log.1', 'chat.log.2']
+    assert all(path.stat().st_size <= 500 for path in tmp_path.iterdir())
+    assert 'message 29' in (tmp_path / 'chat.log').read_text(encoding='utf-8')
+
+
+def test_log_file_rotates_by_age(tmp_path):
+    handler = RotatingLogHandler(tmp_path / 'chat.log', max_age=0.2, backup_count=5)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+
+    handler.emit(make_record('old'))
+    sleep(0.3)
+    handler.emit(make_record('new'))
+    handler.emit(make_record('newer'))
+    handler.close()
+
+    assert (tmp_path / 'chat.log.1').read_text(encoding='utf-8').split() == ['old']
+    assert (tmp_path / 'chat.log').read_text(encoding='utf-8').split() == ['new', 'newer']
+
+
+def test_json_lines_include_the_traceback():
+    try:
+        raise ValueError('tool failed')
+    except ValueError:
+        record = make_record('Error running %s', 'get_facts', exc_info=sys.exc_info())
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry['level'] == 'ERROR'
+    assert entry['logger'] == 'test'
+    assert entry['message'] == 'Error running get_facts'
+    assert 'ValueError: tool failed' in entry['exception']
+
+
+def test_queued_records_are_safe_to_format_later():
+    arguments = ['get_facts']
+
+    try:
+        raise ValueError('tool failed')
+    except ValueError:
+        record = make_record('Error running %s', arguments, exc_info=sys.exc_info())
+
+    record = LogQueueHandler(None).prepare(record)
+    arguments.append('changed')
+
+    assert record.getMessage() == "Error running ['get_facts']"
+    assert record.exc_info is None
+    assert 'ValueError: tool failed' in record.exc_text
+    assert 'ValueError: tool failed' in json.loads(JsonFormatter().format(record))['exception']
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_resilient_worker.py
+Description: Tests the deadlines, retries and hedged requests of the resilient worker against a fake OpenAI API injecting
+             stalls, errors and delays, and runs the fault injection benchmark.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+from time import perf_counter
+import openai
+import pytest
+from fakes import FakeOpenAIServer
+from benchmarks.bench_resilient_worker import run, MAX_RECOVERY
+
+ANSWER = 'Hello there. I am fine, thanks!'
+FIRST_TOKEN_TIMEOUT = 0.3
+
+
+@pytest.fixture
+def config(config):
+    ''' Short deadlines and backoff delays '''
+
+    config.update({
+        'llm_resilience': True,
+        'llm_timeout': 5,
+        'llm_first_token_timeout': FIRST_TOKEN_TIMEOUT,
+        'llm_max_retries': 2,
+        'llm_backoff_base': 0.01,
+        'llm_backoff_max': 0.05,
+        'llm_hedging': False,
+    })
+
+    yield config
+
+
+def chat(config, api: FakeOpenAIServer, messages: int = 1, retry_rate_limits: bool = True) -> tuple[list[str], float, dict]:
+    '''Stream answers from a shared worker calling the fake api.
+
+    Return:
+        (tuple[list[str], float, dict]): the answers, the seconds the last one took and the worker call counts
+    '''
+
+    import helpers
+
+    config['openai_base_url'] = api.url
+
+    async def main() -> tuple[list[str], float, dict]:
+        worker, http_client = helpers.build_shared_worker('chain', max_connections=4, retry_rate_limits=retry_rate_limits)
+        answers = []
+        try:
+            for index in range(messages):
+                start = perf_counter()
+                answers.append(''.join([chunk async for chunk in worker.astream({'input': f'Message {index}', 'chat_history': []})]))
+            return answers, perf_counter() - start, worker.stats()
+        finally:
+            await http_client.aclose()
+
+    return asyncio.run(main())
+
+
+def test_turns_survive_injected_faults(config):
+    results = run(sessions=3, turns=10, fault_rate=0.2, first_token_timeout=FIRST_TOKEN_TIMEOUT)
+    resilient = results['resilient']
+
+    assert not resilient['errors']
+    assert resilient['answered'] == 30
+    assert resilient['p95'] <= FIRST_TOKEN_TIMEOUT + MAX_RECOVERY
+    assert resilient['stats']['retries'] > 0
+
+
+def test_stalled_call_is_sent_again_after_the_first_token_deadline(config):
+    with FakeOpenAIServer(answer=ANSWER, faults=['stall']) as api:
+        answers, seconds, stats = chat(config, api)
+
+    assert answers == [ANSWER]
+    assert FIRST_TOKEN_TIMEOUT <= seconds < FIRST_TOKEN_TIMEOUT + 0.5
+    assert len(api.requests) == 2
+    assert stats['timeouts'] == 1
+
+
+def test_errors_are_retried_by_the_worker_only(config):
+    with FakeOpenAIServer(answer=ANSWER, faults=['error', 'rate_limit']) as api:
+        answers, seconds, stats = chat(config, api)
+
+    assert answers == [ANSWER]
+    # retried after the backoff, without waiting for the first token deadline
+    assert seconds < FIRST_TOKEN_TIMEOUT
+    assert len(api.requests) == 3
+    assert (stats['errors'], stats['retries']) == (2, 2)
+
+
+def test_error_is_raised_after_the_last_retry(config):
+    with FakeOpenAIServer(answer=ANSWER, faults=['error'] * 5) as api:
+        with pytest.raises(openai.InternalServerError):
+            chat(config, api)
+
+    assert len(api.requests) == 3
+
+
+def test_rate_limits_are_raised_for_paced_callers(config):
+    with FakeOpenAIServer(answer=ANSWER, faults=['rate_limit']) as api:
+        with pytest.raises(openai.RateLimitError):
+            chat(config, api, retry_rate_limits=False)
+
+    assert len(api.requests) == 1
+
+
+def test_slow_answer_is_not_sent_again_once_streaming(config):
+    config['llm_timeout'] = 0.5
+
+    with FakeOpenAIServer(answer=ANSWER, token_delay=0.2) as api:
+        with pytest.raises(TimeoutError):
+            chat(config, api)
+
+    assert len(api.requests) == 1
+
+
+def test_slow_call_is_hedged(config):
+    config.update({'llm_hedging': True, 'llm_hedge_min_samples': 5})
+
+    # five fast answers set the hedge delay, the sixth request is slow
+    with FakeOpenAIServer(answer=ANSWER, delay=0.02, faults=[None] * 5 + [1.0]) as api:
+        answers, seconds, stats = chat(config, api, messages=6)
+
+    assert answers == [ANSWER] * 6
+    assert seconds < 0.5
+    assert len(api.requests) == 7
+    assert (stats['hedges'], stats['hedge_wins']) == (1, 1)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_response_cache.py
+Description: Tests exact and semantic matching, expiry and eviction of the response cache, and the cached worker in front of a fake model.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+from time import sleep
+import pytest
+from langchain_core.messages import HumanMessage, AIMessage
+from response_cache import ResponseCache, CachedWorker, history_digest
+from fakes import ScriptedChatModel
+from support import hash_embedding
+
+DIGEST = history_digest([])
+
+
+class CountingEmbeddings:
+    ''' Bag-of-words embeddings counting the texts embedded, like paid api calls '''
+
+    def __init__(self) -> None:
+        self.texts = []
+
+    def __call__(self, text: str) -> list[float]:
+        self.texts.append(text)
+        return hash_embedding(text)
+
+
+@pytest.fixture
+def embed() -> CountingEmbeddings:
+    return CountingEmbeddings()
+
+
+def test_same_question_is_answered_from_the_cache():
+    cache = ResponseCache(max_entries=10, ttl=0)
+    cache.put('What is your name?', DIGEST, 'I am Ada.')
+
+    assert cache.get('  what is your   NAME ', DIGEST) == 'I am Ada.'
+    assert cache.get('What is your age?', DIGEST) is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_similar_question_is_matched_above_the_threshold(embed):
+    # 4 of the 5 words are shared, a cosine similarity of 0.8
+    cache = ResponseCache(max_entries=10, ttl=0, embed=embed, threshold=0.75)
+    cache.put('what is your favorite color', DIGEST, 'Blue.')
+
+    assert cache.get('what is your preferred color', DIGEST) == 'Blue.'
+    assert cache.stats()['semantic_hits'] == 1
+
+    cache.threshold = 0.85
+    assert cache.get('what is your preferred color', DIGEST) is None
+
+
+def test_missed_question_is_embedded_once(embed):
+    cache = ResponseCache(max_entries=10, ttl=0, embed=embed, threshold=0.9)
+
+    assert cache.get('What is your name?', DIGEST) is None
+    cache.put('What is your name?', DIGEST, 'I am Ada.')
+    assert cache.get('what is your name', DIGEST) == 'I am Ada.'
+
+    assert embed.texts == ['what is your name']
+    assert not cache.pending_vectors
+
+
+def test_answers_depend_on_the_history(embed):
+    cache = ResponseCache(max_entries=10, ttl=0, embed=embed, threshold=0.5)
+    other = history_digest([HumanMessage(content='I am Bob'), AIMessage(content='Hello Bob.')])
+    cache.put('What is my name?', DIGEST, 'I do not know.')
+
+    assert cache.get('What is my name?', other) is None
+    assert cache.get('What is my name again?', other) is None
+
+
+def test_answers_expire():
+    cache = ResponseCache(max_entries=10, ttl=0.1)
+    cache.put('What is your name?', DIGEST, 'I am Ada.')
+    sleep(0.15)
+
+    assert cache.get('What is your name?', DIGEST) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = ResponseCache(max_entries=2, ttl=0)
+    cache.put('one', DIGEST, '1')
+    cache.put('two', DIGEST, '2')
+    cache.get('one', DIGEST)
+    cache.put('three', DIGEST, '3')
+
+    assert [cache.get(text, DIGEST) for text in ('one', 'two', 'three')] == ['1', None, '3']
+
+
+def test_cached_worker_calls_the_model_once_per_question_and_history():
+    import helpers
+
+    model = ScriptedChatModel(answers=['I am Ada.', 'Your name is Bob.'])
+    worker = CachedWorker(helpers.build_chain(llm=model), ResponseCache(10, 0), helpers.stream_answer, helpers.astream_answer)
+    history = [HumanMessage(content='I am Bob'), AIMessage(content='Hello Bob.')]
+
+    async def astream(inputs: dict) -> str:
+        return ''.join([chunk async for chunk in worker.astream(inputs)])
+
+    assert ''.join(worker.stream({'input': 'Who are you?', 'chat_history': []})) == 'I am Ada.'
+    assert asyncio.run(astream({'input': 'who are you', 'chat_history': []})) == 'I am Ada.'
+    assert worker.invoke({'input': 'Who are you?', 'chat_history': []}) == 'I am Ada.'
+    assert model.calls == 1
+
+    # with another history the question is sent to the model
+    assert worker.invoke({'input': 'Who are you?', 'chat_history': history}) == 'Your name is Bob.'
+    assert model.calls == 2
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_speculation.py
+Description: Tests speculative answers on partial transcripts: used when the final transcript matches, cancelled when it
+             diverges or the history changed, and the answer tokens generated for nothing counted.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+from speculation import Speculator
+
+ANSWER = 'It is sunny and warm today, a perfect day for a walk.'
+STABLE_TIME = 0.05
+
+
+class FakeAnswers:
+    ''' Streams a fixed answer word by word, recording the messages it was requested for '''
+
+    def __init__(self, word_delay: float = 0.01, error: Exception = None) -> None:
+        self.word_delay = word_delay
+        self.error = error
+        self.requests = []
+
+    async def __call__(self, text: str):
+        self.requests.append(text)
+        for word in ANSWER.split(' '):
+            await asyncio.sleep(self.word_delay)
+            yield word + ' '
+        if self.error:
+            raise self.error
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def make_speculator(answers: FakeAnswers, **kwargs) -> Speculator:
+    return Speculator(answers, count_words, threshold=0.9, stable_time=STABLE_TIME, **kwargs)
+
+
+def test_matching_final_transcript_uses_the_speculation():
+    answers = FakeAnswers()
+
+    async def main():
+        speculator = make_speculator(answers)
+        speculator.on_partial('what is the weather today')
+        await asyncio.sleep(STABLE_TIME + 0.05)
+
+        speculation = speculator.take('What is the weather today?')
+        assert speculation is not None
+        return speculator, await speculation.result()
+
+    speculator, answer = asyncio.run(main())
+
+    assert answer.strip() == ANSWER
+    assert answers.requests == ['what is the weather today']
+    assert speculator.stats() == {'hits': 1, 'misses': 0, 'wasted_tokens': 0}
+
+
+def test_diverging_final_transcript_cancels_the_speculation():
+    answers = FakeAnswers()
+
+    async def main():
+        speculator = make_speculator(answers)
+        speculator.on_partial('what is the weather')
+        await asyncio.sleep(STABLE_TIME + 0.05)
+        speculation = speculator.speculation
+
+        assert speculator.take('what is the time in Paris') is None
+        await asyncio.sleep(0.01)
+        return speculator, speculation
+
+    speculator, speculation = asyncio.run(main())
+
+    assert speculation.task.cancelled()
+    assert speculator.hits == 0
+    assert speculator.misses == 1
+
+
+def test_partial_moving_away_cancels_the_speculation_early():
+    answers = FakeAnswers()
+
+    async def main():
+        speculator = make_speculator(answers)
+        speculator.on_partial('what is the weather')
+        await asyncio.sleep(STABLE_TIME + 0.05)
+        first = speculator.speculation
+
+        # the user kept talking: a new speculation starts once the longer phrase is stable
+        speculator.on_partial('what is the weather going to be like in London tomorrow')
+        await asyncio.sleep(0.01)
+        assert first.task.cancelled()
+        await asyncio.sleep(STABLE_TIME + 0.05)
+
+        speculation = speculator.take('What is the weather going to be like in London tomorrow?')
+        return speculator, await speculation.result()
+
+    speculator, answer = asyncio.run(main())
+
+    assert answer.strip() == ANSWER
+    assert answers.requests == ['what is the weather', 'what is the weather going to be like in London tomorrow']
+    assert speculator.hits == 1
+    assert speculator.misses == 1
+
+
+def test_speculation_is_dropped_when_the_history_changed():
+    answers = FakeAnswers()
+    version = [0]
+
+    async def main():
+        speculator = make_speculator(answers, history_version=lambda: version[0])
+        speculator.on_partial('what is the weather today')
+        await asyncio.sleep(STABLE_TIME + 0.05)
+        speculation = speculator.speculation
+
+        # an interrupted answer is recorded after the request
+        version[0] += 1
+        assert speculator.take('what is the weather today') is None
+        await asyncio.sleep(0.01)
+        return speculator, speculation
+
+    speculator, speculation = asyncio.run(main())
+
+    assert speculation.history_version == 0
+    assert speculation.task.cancelled()
+    assert speculator.misses == 1
+
+
+def test_wasted_tokens_count_the_discarded_answers():
+    answers = FakeAnswers(word_delay=0.02)
+
+    async def main():
+        speculator = make_speculator(answers)
+        speculator.on_partial('what is the weather')
+        await asyncio.sleep(STABLE_TIME + 0.1)
+        buffered = ''.join(speculator.speculation.chunks)
+
+        speculator.cancel()
+        return speculator, buffered
+
+    speculator, buffered = asyncio.run(main())
+
+    assert count_words(buffered) > 0
+    assert speculator.wasted_tokens == count_words(buffered)
+
+
+def test_final_transcript_before_a_stable_partial_requests_nothing():
+    answers = FakeAnswers()
+
+    async def main():
+        speculator = make_speculator(answers)
+        speculator.on_partial('what is the weather today')
+        result = speculator.take('what is the weather today')
+        await asyncio.sleep(STABLE_TIME + 0.05)
+        return speculator, result
+
+    speculator, result = asyncio.run(main())
+
+    assert result is None
+    assert answers.requests == []
+    assert speculator.stats() == {'hits': 0, 'misses': 0, 'wasted_tokens': 0}
+
+
+def test_failed_speculation_is_not_used():
+    answers = FakeAnswers(word_delay=0.001, error=ConnectionError('connection lost'))
+
+    async def main():
+        speculator = make_speculator(answers)
+        speculator.on_partial('what is the weather today')
+        await asyncio.sleep(STABLE_TIME + 0.1)
+        return speculator, speculator.take('what is the weather today')
+
+    speculator, result = asyncio.run(main())
+
+    assert result is None
+    assert speculator.misses == 1
+    assert speculator.wasted_tokens == count_words(ANSWER)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_speech_synthesis.py
+Description: Tests speech synthesis in memory and the cache of synthesized speech, with a fake edge_tts voice.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import pytest
+from tts_cache import TtsCache
+from fakes import FakeCommunicate
+
+VOICE = ('en-US-AriaNeural', '+10%', '+0%', '+0Hz')
+
+
+@pytest.fixture
+def voice(config, tmp_path, monkeypatch) -> type[FakeCommunicate]:
+    ''' Fake edge_tts voice, with a new TTS cache in a temporary folder '''
+
+    import edge_tts
+    import helpers
+
+    monkeypatch.setattr(edge_tts, 'Communicate', FakeCommunicate)
+    monkeypatch.setattr(FakeCommunicate, 'instances', [])
+    monkeypatch.setattr(helpers, 'TTS_CACHE', None)
+    config.update({
+        'tts_audio_mode': 'memory',
+        'tts_cache': True,
+        'tts_cache_dir': str(tmp_path / 'tts'),
+        'temp_audio_filepath': str(tmp_path / 'audio' / 'answer.mp3'),
+    })
+
+    return FakeCommunicate
+
+
+def test_cached_speech_is_not_synthesized_again(voice, config):
+    import helpers
+
+    first = helpers.synthesize_mp3('Hello there.', 'en-US')
+    second = helpers.synthesize_mp3('Hello there.', 'en-US')
+
+    assert first == second
+    assert len(voice.instances) == 1
+    assert helpers.get_tts_cache().stats()['hits'] == 1
+
+    # a new chat finds the audio on disk
+    helpers.TTS_CACHE = None
+    assert helpers.synthesize_mp3('Hello there.', 'en-US') == first
+    assert len(voice.instances) == 1
+
+
+def test_cache_key_depends_on_text_and_voice(voice, config):
+    import helpers
+
+    helpers.synthesize_mp3('Hello there.', 'en-US')
+    helpers.synthesize_mp3('Hello there!', 'en-US')
+    helpers.synthesize_mp3('Hello there.', 'fr-FR')
+    config['tts_rate'] = '+20%'
+    helpers.synthesize_mp3('Hello there.', 'en-US')
+
+    assert [(instance.text, instance.voice, instance.rate) for instance in voice.instances] == [
+        ('Hello there.', 'en-US-AriaNeural', '+10%'),
+        ('Hello there!', 'en-US-AriaNeural', '+10%'),
+        ('Hello there.', 'fr-FR-DeniseNeural', '+10%'),
+        ('Hello there.', 'en-US-AriaNeural', '+20%'),
+    ]
+    # surrounding whitespace does not change the audio
+    assert TtsCache.make_key(' Hello there. ', *VOICE) == TtsCache.make_key('Hello there.', *VOICE)
+
+
+def test_least_recently_used_audio_is_evicted(tmp_path):
+    cache = TtsCache(tmp_path, max_memory_bytes=250, max_disk_bytes=250)
+    keys = [TtsCache.make_key(f'Sentence {index}', *VOICE) for index in range(3)]
+
+    cache.put(keys[0], b'0' * 100)
+    cache.put(keys[1], b'1' * 100)
+    assert cache.get(keys[0]) == b'0' * 100
+    cache.put(keys[2], b'2' * 100)
+
+    # the second entry was used least recently, in memory and on disk
+    assert list(cache.memory) == [keys[0], keys[2]]
+    assert sorted(path.stem for path in tmp_path.glob('*.mp3')) == sorted([keys[0], keys[2]])
+    assert cache.stats()['disk_bytes'] == 200
+
+    # audio bigger than the cache is not kept
+    cache.put(keys[1], b'1' * 300)
+    assert cache.get(keys[1]) is None
+
+
+def test_speech_is_decoded_in_memory(voice, config, tmp_path):
+    import helpers
+
+    config['tts_cache'] = False
+    audio = helpers.synthesize_speech('Hello there, how are you?', 'en-US')
+
+    # 5 words of 8 frames, 1152 samples each at 44.1kHz
+    assert audio.frame_rate == helpers.EDGE_TTS_SAMPLE_RATE
+    assert audio.channels == helpers.EDGE_TTS_CHANNELS
+    assert len(audio) == pytest.approx(5 * 8 * 1152 / 44.1, abs=30)
+    assert voice.instances[0].saved == []
+    assert not (tmp_path / 'audio').exists()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_speech_to_text.py
+Description: Tests voice input on recorded phrases: transcription while the user talks, and the end of speech to
+             final transcript latency.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+from time import perf_counter
+from audio_capture import AudioCapture, WavFileSource
+from fakes import FakeSttEngine
+from support import write_wav
+from benchmarks.bench_speech_to_text import run, MAX_TRANSCRIPT_DELAY
+
+SPEED = 4.0
+
+
+def test_streamed_transcript_is_ready_when_the_phrase_ends():
+    results = run(phrases=2, speech=2.0, decode_time=0.3, pause_threshold=0.8, speed=SPEED)
+    streaming, final_only = results['streaming'], results['final only']
+
+    assert streaming['texts'] == final_only['texts'] == ['hello there how are you'] * 2
+    assert 0.8 <= streaming['pause'] <= 0.8 + MAX_TRANSCRIPT_DELAY
+    assert streaming['transcript'] <= 0.8 + MAX_TRANSCRIPT_DELAY
+    # the non streaming engine decodes the whole phrase after it ends
+    assert final_only['transcript'] >= streaming['transcript'] + 0.5
+
+
+def test_voice_message_is_transcribed_while_recorded(tmp_path, monkeypatch):
+    import helpers
+
+    wav = write_wav(tmp_path / 'speech.wav', [(2.0, 8000)])
+    capture = AudioCapture(WavFileSource(wav, gap=1.0, speed=SPEED), pause_threshold=0.8, calibration_duration=0.5).start()
+    engine = FakeSttEngine(decode_time=0.1)
+    monkeypatch.setattr(helpers, 'get_audio_capture', lambda: capture)
+    monkeypatch.setattr(helpers, 'get_stt_engine', lambda: engine)
+
+    events = []
+    try:
+        text = helpers.record_audio_message(
+            {'value': False}, 'voice', 'en-US',
+            on_partial=lambda partial: events.append((perf_counter(), partial)),
+            on_speech_start=lambda: events.append((perf_counter(), 'speech start'))
+        )
+        end = perf_counter()
+    finally:
+        capture.close()
+
+    assert text == 'Hello there how are you'
+    assert events[0][1] == 'speech start'
+    partials = [partial for _, partial in events[1:]]
+    assert partials[:3] == ['hello', 'hello there', 'hello there how']
+    # partials come while the user is talking, before the pause ending the phrase
+    assert events[1][0] < end - 0.8 / SPEED
+
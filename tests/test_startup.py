@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_startup.py
+Description: Startup regression test: the text mode chatbot must start fast, without loading the LLM or audio stacks.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+from benchmarks.bench_startup import run, parse_importtime, MAX_STARTUP_MS, LLM_MODULES, AUDIO_MODULES
+
+
+def test_text_mode_starts_without_heavy_modules():
+    result = run(runs=2)
+
+    # none of the heavy stacks is imported with the chatbot in text mode
+    assert {'langchain', 'numpy', 'pydub', 'speech_recognition'} <= set(LLM_MODULES + AUDIO_MODULES)
+    assert result['loaded_on_import'] == []
+    assert result['loaded_on_start'] == []
+    assert result['startup_ms'] <= MAX_STARTUP_MS
+    # the worker is built on another thread, the chat starts without waiting for it
+    assert result['worker_in_background']
+
+
+def test_importtime_output_is_parsed():
+    stderr = '\n'.join([
+        'import time: self [us] | cumulative | imported package',
+        'import time:       120 |        120 |   encodings.utf_8',
+        'import time:      2500 |       4100 | helpers',
+    ])
+
+    assert parse_importtime(stderr) == {'encodings.utf_8': 120, 'helpers': 4100}
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_text_normalizer.py
+Description: Tests the text normalization functions against the original format_string, chunk by chunk, and in linear time on inputs of 1 MB and more.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import random
+from textwrap import dedent
+from text_normalizer import normalize_whitespace, strip_unwanted_chars, normalize_input, StreamNormalizer
+from benchmarks.bench_text_normalizer import run, stream, MAX_SLOWDOWN
+
+ALPHABET = ['a', 'b', ' ', '  ', '\t', '\n', '*', '/', '|', '\\', '.', '?', '!']
+
+
+def format_string(prompt: str) -> str:
+    ''' helpers.format_string before the single pass normalization '''
+
+    prompt = dedent(prompt).replace('\n', ' ').replace('\t', ' ')
+    while '  ' in prompt:
+        prompt = prompt.replace('  ', ' ')
+    return prompt.strip()
+
+
+def random_texts(count: int = 5000) -> list[str]:
+    rng = random.Random(0)
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 30))) for _ in range(count)]
+
+
+def test_normalize_whitespace_matches_format_string():
+    for text in random_texts():
+        assert normalize_whitespace(text) == format_string(text), repr(text)
+
+
+def test_streamed_chunks_join_to_the_normalized_text():
+    rng = random.Random(1)
+
+    for text in random_texts():
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 6))))
+        normalizer = StreamNormalizer()
+        chunks = [normalizer.feed(text[start:end]) for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+        assert ''.join(chunks) + normalizer.flush() == normalize_whitespace(strip_unwanted_chars(text)), repr(text)
+
+
+def test_normalize_input_strips_case_spaces_and_trailing_punctuation():
+    assert normalize_input('  What is\tyour   NAME ?! ') == 'what is your name'
+    assert normalize_input('...') == ''
+    assert normalize_input('.' * 100000 + 'x') == '.' * 100000 + 'x'
+
+
+def test_stream_of_a_large_input():
+    text = 'Hello\t\t*world*  ' * 100000
+
+    assert stream(text, chunk_size=8) == normalize_whitespace(strip_unwanted_chars(text))
+
+
+def test_pathological_inputs_of_1_megabyte_are_linear():
+    results = run(megabytes=2, repeat=1)
+
+    slow = {name: result['slowdown'] for name, result in results.items() if result['slowdown'] > MAX_SLOWDOWN}
+    assert not slow
+    assert max(result['large_seconds'] for result in results.values()) < 2.0
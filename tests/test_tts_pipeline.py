@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: test_tts_pipeline.py
+Description: Tests the time to first audio of the sentence-pipelined TTS, with simulated synthesis and audio output.
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import asyncio
+from time import perf_counter, sleep
+from pydub import AudioSegment
+from audio_player import AudioPlayer, SimulatedOutput
+from tts_pipeline import SentenceSplitter, TtsPipeline
+from tracing import Tracer
+from fakes import ScriptedChatModel
+
+SENTENCES = ['The first sentence is short.', 'The second one takes a little longer to say.', 'And this is the end!']
+
+
+def synthesize(sentence: str) -> AudioSegment:
+    ''' Takes 0.05 seconds, returns 0.1 seconds of silence per word '''
+
+    sleep(0.05)
+    return AudioSegment.silent(duration=100 * len(sentence.split()), frame_rate=24000)
+
+
+async def stream_sentences(pipeline: TtsPipeline, delay: float) -> None:
+    ''' Feed SENTENCES word by word, like a model generating a word every delay seconds '''
+
+    for word in ' '.join(SENTENCES).split(' '):
+        await asyncio.sleep(delay)
+        await pipeline.feed(word + ' ')
+
+    await pipeline.close()
+
+
+def test_sentences_end_on_punctuation_followed_by_a_space():
+    splitter = SentenceSplitter()
+
+    assert splitter.feed('It costs 3.5 euros. Re') == ['It costs 3.5 euros.']
+    assert splitter.feed('ally? Yes') == ['Really?']
+    assert splitter.flush() == ['Yes']
+
+
+def test_first_sentence_plays_while_the_answer_is_generated():
+    async def main() -> TtsPipeline:
+        player = AudioPlayer(output=SimulatedOutput)
+        pipeline = TtsPipeline(synthesize, player.play, stop=player.stop, close=player.close).start()
+        await stream_sentences(pipeline, delay=0.05)
+        await pipeline.join()
+        return pipeline
+
+    start = perf_counter()
+    pipeline = asyncio.run(main())
+    duration = perf_counter() - start
+
+    # 5 words of the first sentence, then its synthesis. The whole answer takes 20 words.
+    assert pipeline.first_audio_latency < 5 * 0.05 + 0.05 + 0.15
+    assert pipeline.first_audio_latency < 20 * 0.05
+    assert pipeline.spoken_text() == ' '.join(SENTENCES)
+
+    # synthesis of a sentence overlaps playback of the previous one
+    speech = sum(0.1 * len(sentence.split()) for sentence in SENTENCES)
+    assert duration < pipeline.first_audio_latency + speech + 0.05 * (len(SENTENCES) - 1)
+
+
+def test_audio_output_is_opened_once_per_answer():
+    events = []
+
+    class Output(SimulatedOutput):
+        def __init__(self, *args) -> None:
+            events.append('open')
+            super().__init__(*args)
+
+        def close(self) -> None:
+            events.append('close')
+
+    async def main() -> None:
+        player = AudioPlayer(output=Output)
+        pipeline = TtsPipeline(synthesize, player.play, stop=player.stop, close=player.close).start()
+        await stream_sentences(pipeline, delay=0)
+        await pipeline.join()
+
+    asyncio.run(main())
+
+    assert events == ['open', 'close']
+
+
+def test_voice_answer_starts_playing_before_it_is_generated(make_chatbot, simulated_speech):
+    answer = ' '.join(SENTENCES)
+    chatbot = make_chatbot(ScriptedChatModel(answers=[answer], first_token_delay=0.05, token_delay=0.05), input_method='voice')
+
+    trace = Tracer(enabled=True).start_turn()
+    asyncio.run(chatbot.generate_model_answer('Hello', trace))
+
+    llm = next(span for span in trace.spans if span['name'] == 'llm')
+    first_audio = trace.marks['first_audio'] - llm['start']
+
+    # the first sentence is 5 words long, the answer 20
+    assert first_audio < 5 * 0.05 + 0.05 + 0.15
+    assert first_audio < 20 * 0.05
+    assert simulated_speech == SENTENCES
+    assert chatbot.messages[-1].content == answer
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: text_normalizer.py
+Description: Single pass text normalization for prompts, answers, user inputs and csv rows, on full strings or chunk by chunk.
+Example: normalize_whitespace(text); strip_unwanted_chars(answer); normalize_input(question); StreamNormalizer().feed(chunk)
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import re
+
+# characters removed from the LLM answers before they are printed, spoken or saved
+UNWANTED_CHARS = re.compile(r'[*|/\\]')
+
+# runs of spaces, tabs and line breaks, collapsed to a single space
+WHITESPACE = re.compile(r'[ \t\n]+')
+
+# punctuation and spaces ending a user input. The lookbehind only lets a match start at the
+# beginning of a run, otherwise every position of a long run not at the end is tried again
+TRAILING_PUNCTUATION = re.compile(r'(?<![\s.!?,;:])[\s.!?,;:]+$')
+
+
+def normalize_whitespace(text: str) -> str:
+    '''Replaces tabs, line breaks and runs of spaces with single spaces and strips the ends,
+    in one pass over the string.
+
+    Args:
+        text (str): string to normalize
+
+    Return:
+        (str): normalized string
+    '''
+
+    return WHITESPACE.sub(' ', text).strip()
+
+
+def strip_unwanted_chars(text: str) -> str:
+    '''Removes characters we don't want to print, speak or save from an LLM answer.
+
+    Args:
+        text (str): answer or answer chunk
+
+    Return:
+        (str): answer without unwanted characters
+    '''
+
+    return UNWANTED_CHARS.sub('', text)
+
+
+def normalize_input(text: str) -> str:
+    ''' Lowercases text, collapses white spaces and removes trailing punctuation so
+    that small typing or transcription variations of the same question compare equal.
+
+    Args:
+        text (str): user input
+
+    Return:
+        (str): normalized input
+    '''
+
+    return TRAILING_PUNCTUATION.sub('', normalize_whitespace(text.lower()))
+
+
+class StreamNormalizer:
+    '''
+    Normalizes streamed text chunk by chunk. Joining the returned chunks gives the same
+    result as normalizing the full text at once: whitespace at the end of a chunk is held
+    back until we know whether more text follows.
+    '''
+
+    def __init__(self, collapse_whitespace: bool = True) -> None:
+        '''Create class instance
+
+        Args:
+            collapse_whitespace (bool): if true, also normalize whitespace as normalize_whitespace does
+        '''
+
+        self.collapse_whitespace = collapse_whitespace
+        self.pending = ''
+        self.started = False
+
+    def feed(self, chunk: str) -> str:
+        '''Normalize the next chunk.
+
+        Args:
+            chunk (str): next chunk of text
+
+        Return:
+            (str): normalized text ready to output, may be empty
+        '''
+
+        chunk = strip_unwanted_chars(chunk)
+
+        if not self.collapse_whitespace:
+            return chunk
+
+        # pending whitespace is already collapsed, so runs across chunks collapse too
+        text = WHITESPACE.sub(' ', self.pending + chunk)
+
+        if not self.started:
+            text = text.lstrip()
+
+        core = text.rstrip()
+        self.pending = text[len(core):]
+
+        if core:
+            self.started = True
+
+        return core
+
+    def flush(self) -> str:
+        '''End of the stream: drop trailing whitespace and reset.
+
+        Return:
+            (str): remaining text, always empty as trailing whitespace is stripped
+        '''
+
+        self.pending = ''
+        self.started = False
+
+        return ''
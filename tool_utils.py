@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: tool_utils.py
+Description: Agent helpers: tool result caching with expiry, an agent executor running the tool calls of a turn concurrently, and token streaming from a running agent.
+Example: @tool @cached_tool(ttl=3600) def my_tool(...); ConcurrentAgentExecutor(agent=agent, tools=tools)
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import json
+import queue
+import functools
+import threading
+import contextvars
+from time import monotonic, perf_counter
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator
+# langchain
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.callbacks import BaseCallbackHandler
+# tracing
+from tracing import current_turn
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# threads running the tool calls of the sync agent path, shared by all agents
+TOOL_POOL = ThreadPoolExecutor(max_workers=config['agent_tool_workers'], thread_name_prefix='tool')
+
+
+def cached_tool(ttl: float = 0, max_entries: int = 128) -> Callable:
+    '''Decorator caching the results of a tool function by arguments. Place it under @tool,
+    so the tool keeps the function name, docstring and signature.
+
+        @tool
+        @cached_tool(ttl=3600)
+        def my_tool(title: str) -> list: ...
+
+    Args:
+        ttl (float): seconds a result stays valid, 0 to never expire
+        max_entries (int): maximum number of cached results, least recently used ones are evicted first
+
+    Return:
+        (Callable): the decorator
+    '''
+
+    def decorator(func: Callable) -> Callable:
+        entries = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = json.dumps([args, kwargs], sort_keys=True, default=str)
+
+            with lock:
+                entry = entries.get(key)
+                if entry and (not entry[1] or entry[1] > monotonic()):
+                    entries.move_to_end(key)
+                    LOG.debug(f"Tool cache hit: {func.__name__}")
+                    return entry[0]
+
+            # concurrent calls with the same arguments may both run the tool, which is harmless
+            result = func(*args, **kwargs)
+
+            with lock:
+                entries[key] = (result, monotonic() + ttl if ttl else 0)
+                entries.move_to_end(key)
+                while len(entries) > max_entries:
+                    entries.popitem(last=False)
+
+            return result
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+
+    return decorator
+
+
+class ConcurrentAgentExecutor(AgentExecutor):
+    '''
+    Agent executor running all the tool calls the model requested in one turn at the same
+    time, on the tool thread pool, and logging how long each call took. The async path of
+    the agent executor already gathers the tool calls, so it only adds the timing.
+
+    It overrides private methods of the langchain AgentExecutor, so langchain is pinned
+    in requirements.txt and a test checks they did not change before upgrading it.
+    '''
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None) -> Iterator:
+        ''' Plan the next step like the parent class, which now submits the tool calls
+        instead of running them, then yield the tool results in the requested order. '''
+
+        futures = []
+
+        for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager):
+            if isinstance(item, Future):
+                futures.append(item)
+            else:
+                yield item
+
+        for future in futures:
+            yield future.result()
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action: AgentAction, run_manager=None) -> Future:
+        ''' Submit a tool call to the thread pool, returns a future of the agent step '''
+
+        # run in a copy of the context so the tool sees the callbacks of the agent run
+        context = contextvars.copy_context()
+        perform = functools.partial(super()._perform_agent_action, name_to_tool_map, color_mapping, agent_action, run_manager)
+
+        return TOOL_POOL.submit(context.run, self._timed, agent_action, perform)
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action: AgentAction, run_manager=None) -> AgentStep:
+        ''' Run a tool call and log its duration '''
+
+        start = perf_counter()
+        try:
+            return await super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        finally:
+            self._record_timing(agent_action, start)
+
+    @classmethod
+    def _timed(cls, agent_action: AgentAction, perform: Callable[[], AgentStep]) -> AgentStep:
+        ''' Run a tool call and log its duration '''
+
+        start = perf_counter()
+        try:
+            return perform()
+        finally:
+            cls._record_timing(agent_action, start)
+
+    @staticmethod
+    def _record_timing(agent_action: AgentAction, start: float) -> None:
+        ''' Log the duration of a tool call and add it to the turn trace '''
+
+        LOG.debug(f"Tool call {agent_action.tool} took {perf_counter() - start:.3f}s")
+        current_turn().add('tool', start, tool=agent_action.tool)
+
+
+class TokenQueueHandler(BaseCallbackHandler):
+    ''' Callback handler pushing the LLM tokens to a queue as soon as they are generated '''
+
+    def __init__(self, token_queue: queue.Queue) -> None:
+        self.token_queue = token_queue
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        # skip empty tokens sent while the model is building tool calls
+        if token:
+            self.token_queue.put(token)
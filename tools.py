@@ -10,50 +10,43 @@ Date: 2024-07-25
 from pathlib import Path
 # langchain
 from langchain_core.tools import tool
+from tool_utils import cached_tool
+from fact_index import get_fact_index
+# config
+from config_loader import get_config
+config = get_config()
 # logger
 from logger import get_logger
 LOG = get_logger(Path(__file__).stem)
 
 
+def search_facts(about: str, query: str) -> list[str]:
+    ''' Returns the facts about a subject most relevant to a query, from the facts file '''
+
+    results = get_fact_index(about).search(query, k=config['facts_top_k'], min_score=config['facts_min_score'])
+    LOG.debug(f"Facts about {about} for '{query}': {[round(score, 3) for _, score in results]}")
+
+    return [fact for fact, _ in results]
+
+
 @tool
-def get_information_about_your_interlocutor(title: str, comment: str) -> None:
-    """Get a list of info about your interlocutor."""
+@cached_tool(ttl=3600)
+def get_information_about_your_interlocutor(query: str) -> list[str]:
+    """Search facts about your interlocutor (name, job, hobbies, tastes...) related to the query."""
 
     LOG.debug("Tool call: get_information_about_your_interlocutor")
 
-    info = [
-        "My name is Alex",
-        "I am currently looking for a job as an AI software developer",
-        "I like coding, trail running and snorkeling",
-        "My favourite color is emerald green",
-        "My favourite movie is Jurassic Park",
-        "My favourite book is La Nuit Des Temps by René Barjavel",
-        "I am a fan of the Harry Potter series",
-        "I am a trail runner and I love running in the mountains. The longest distance I ran is 61 km.",
-        "Sometimes I play blues harmonica, but I suck at it. Don't tell anyone!",
-    ]
+    return search_facts('interlocutor', query)
 
-    return info
 
 @tool
-def get_information_about_yourself(title: str, comment: str) -> None:
-    """Get a list of info about yourself."""
+@cached_tool(ttl=3600)
+def get_information_about_yourself(query: str) -> list[str]:
+    """Search facts about yourself (name, job, hobbies, tastes, memories...) related to the query."""
 
     LOG.debug("Tool call: get_information_about_yourself")
 
-    info = [
-        "Your name is Louise, you are a helpful advisor with a great sense of humor",
-        "You are a NASA rocket scientist and a professional chef",
-        "You have your own Youtube channel called 'Chez Louise' where you teach how to make the best Cheese Fondue",
-        "Your favourite color is yellow",
-        "You are a casual surfer and your favourite movie is Point Break. Patrick Swayze is your hero!",
-        "Your favourite book is The Little Prince by Antoine de Saint-Exupéry",
-        "You are a big fan of Charlie Chaplin's movies, you could talk about them for hours",
-        "You go hiking in the mountains every weekend, it is helping you cope with the pression at work",
-        "Once you got lost and had to spend three nights alone in the mountains eating pine cones and snails. It was a scary experience but you learned a lot from it.",
-    ]
-
-    return info
+    return search_facts('yourself', query)
 
 
 # List of tools
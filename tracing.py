@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: tracing.py
+Description: Per-turn latency tracing of the chat pipeline stages, exported as json lines and Prometheus text with rolling percentiles.
+Example: trace = TRACER.start_turn(session_id); CURRENT_TURN.set(trace); with current_turn().span('llm'): ...; trace.end()
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import os
+import json
+import math
+import uuid
+import queue
+import atexit
+import threading
+import contextvars
+from time import time, perf_counter
+from pathlib import Path
+from collections import deque
+# config
+from config_loader import get_config
+config = get_config()
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# quantiles reported for each stage
+QUANTILES = (0.5, 0.95, 0.99)
+
+# trace of the turn being processed. Tasks and daemon threads started by the turn
+# inherit it, so any stage can add spans without passing the trace around.
+CURRENT_TURN = contextvars.ContextVar('current_turn', default=None)
+
+
+class NullSpan:
+    ''' Span doing nothing, used when tracing is off '''
+
+    def __enter__(self) -> 'NullSpan':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+class NullTurn:
+    '''
+    Turn trace doing nothing, used when tracing is off. All its methods return at once,
+    so instrumented code costs a context variable lookup and a method call.
+    '''
+
+    def span(self, name: str, **attrs) -> NullSpan:
+        return NULL_SPAN
+
+    def add(self, name: str, start: float, end: float = None, **attrs) -> None:
+        pass
+
+    def mark(self, name: str) -> None:
+        pass
+
+    def add_tokens(self, **counts: int) -> None:
+        pass
+
+    def set_origin(self, origin: float = None) -> None:
+        pass
+
+    def end(self, status: str = 'ok') -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+NULL_TURN = NullTurn()
+
+
+class Span:
+    '''
+    Context manager timing a stage of a turn.
+    '''
+
+    __slots__ = ('turn', 'name', 'attrs', 'start')
+
+    def __init__(self, turn: 'TurnTrace', name: str, attrs: dict) -> None:
+        self.turn = turn
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+
+    def __enter__(self) -> 'Span':
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.turn.add(self.name, self.start, perf_counter(), **self.attrs)
+
+
+class TurnTrace:
+    '''
+    Spans of one chat turn. Spans are timed from the creation of the trace. Marks
+    (time to first token, time to first audio) and the turn total are timed from the
+    origin: the moment the user message is complete, which is the end of speech in
+    voice modes. Spans can be added from any thread.
+    '''
+
+    def __init__(self, tracer: 'Tracer', session_id: str = '') -> None:
+        '''Create class instance
+
+        Args:
+            tracer (Tracer): tracer exporting the turn when it ends
+            session_id (str): chat session of the turn
+        '''
+
+        self.tracer = tracer
+        self.session_id = session_id
+        self.turn_id = uuid.uuid4().hex
+        self.timestamp = time()
+        self.start = perf_counter()
+        self.origin = self.start
+
+        self.spans = []
+        self.marks = {}
+        self.tokens = {}
+        self.ended = False
+        self.lock = threading.Lock()
+
+    def span(self, name: str, **attrs) -> Span:
+        '''Time a stage of the turn: with trace.span('llm'): ...
+
+        Args:
+            name (str): stage name
+            **attrs: optional attributes saved with the span
+
+        Return:
+            (Span): context manager recording the span on exit
+        '''
+
+        return Span(self, name, attrs)
+
+    def add(self, name: str, start: float, end: float = None, **attrs) -> None:
+        '''Record a stage timed by the caller.
+
+        Args:
+            name (str): stage name
+            start (float): perf_counter at the start of the stage
+            end (float): perf_counter at the end of the stage, now if not given
+            **attrs: optional attributes saved with the span
+        '''
+
+        end = end or perf_counter()
+        span = {'name': name, 'start': round(start - self.start, 6), 'duration': round(end - start, 6), **attrs}
+
+        with self.lock:
+            self.spans.append(span)
+
+    def mark(self, name: str) -> None:
+        '''Record the time elapsed since the origin, once per name.
+
+        Args:
+            name (str): mark name, like first_token
+        '''
+
+        elapsed = perf_counter() - self.origin
+
+        with self.lock:
+            self.marks.setdefault(name, round(elapsed, 6))
+
+    def add_tokens(self, **counts: int) -> None:
+        '''Add token counts to the turn, like the prompt tokens of each model call.
+
+        Args:
+            **counts (int): token counts by kind, like cached=1024
+        '''
+
+        with self.lock:
+            for kind, count in counts.items():
+                self.tokens[kind] = self.tokens.get(kind, 0) + count
+
+    def set_origin(self, origin: float = None) -> None:
+        '''Set the moment marks are timed from.
+
+        Args:
+            origin (float): perf_counter value, now if not given
+        '''
+
+        self.origin = origin or perf_counter()
+
+    def end(self, status: str = 'ok') -> None:
+        '''End the turn and export it, only the first call counts.
+
+        Args:
+            status (str): ok, interrupted or error
+        '''
+
+        with self.lock:
+            if self.ended:
+                return
+            self.ended = True
+
+            record = {
+                'turn_id': self.turn_id,
+                'session_id': self.session_id,
+                'timestamp': self.timestamp,
+                'status': status,
+                'total': round(perf_counter() - self.origin, 6),
+                'marks': dict(self.marks),
+                'tokens': dict(self.tokens),
+                'spans': list(self.spans),
+            }
+
+        self.tracer.record(record)
+
+
+class Tracer:
+    '''
+    Collects the turn traces. Each turn is appended to a json lines file, and the
+    rolling p50, p95 and p99 of each stage over the last turns are written to a
+    Prometheus text file (node exporter textfile format) and served by the chat server.
+    Recording a turn only updates the metrics in memory, the files are written by a
+    background thread, so the disk is never on the reply path.
+    When disabled, turns are NullTurn instances and nothing is recorded.
+    '''
+
+    def __init__(self, enabled: bool = False, jsonl_path: str | Path = None, prometheus_path: str | Path = None, window: int = 500) -> None:
+        '''Create class instance
+
+        Args:
+            enabled (bool): if false, turns are not traced
+            jsonl_path (str | Path): optional file where each turn is appended as a json line
+            prometheus_path (str | Path): optional file rewritten with the metrics after each turn
+            window (int): number of latest samples per stage the percentiles are computed on
+        '''
+
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.window = window
+
+        # stage -> latest durations, and totals since start
+        self.samples = {}
+        self.sums = {}
+        self.counts = {}
+        self.turns = {}
+        self.tokens = {}
+        self.events = {}
+
+        self.lock = threading.Lock()
+
+        # finished turns waiting to be exported by the writer thread
+        self.queue = queue.Queue()
+        self.thread = None
+
+        for path in (jsonl_path, prometheus_path):
+            if enabled and path:
+                os.makedirs(Path(path).parent, exist_ok=True)
+
+        if enabled and (jsonl_path or prometheus_path):
+            self.thread = threading.Thread(target=self._run, name='tracer', daemon=True)
+            self.thread.start()
+            # export the turns left in the queue on exit
+            atexit.register(self.close)
+
+    def start_turn(self, session_id: str = '') -> TurnTrace | NullTurn:
+        '''Start tracing a turn.
+
+        Args:
+            session_id (str): chat session of the turn
+
+        Return:
+            (TurnTrace | NullTurn): the turn trace, a no-op one if tracing is off
+        '''
+
+        if not self.enabled:
+            return NULL_TURN
+
+        return TurnTrace(self, session_id)
+
+    def record(self, turn: dict) -> None:
+        '''Add a finished turn to the metrics and export it.
+
+        Args:
+            turn (dict): turn record, see TurnTrace.end
+        '''
+
+        with self.lock:
+            self.turns[turn['status']] = self.turns.get(turn['status'], 0) + 1
+
+            for kind, count in turn['tokens'].items():
+                self.tokens[kind] = self.tokens.get(kind, 0) + count
+
+            if turn['status'] == 'ok':
+                # interrupted and failed turns would skew the latencies
+                self._add_sample('turn', turn['total'])
+                for name, elapsed in turn['marks'].items():
+                    self._add_sample(name, elapsed)
+                for span in turn['spans']:
+                    self._add_sample(span['name'], span['duration'])
+
+        if self.thread is not None:
+            self.queue.put(turn)
+
+    def count(self, event: str, value: int = 1) -> None:
+        '''Count an event happening outside of the turn stages, like a retried LLM call.
+
+        Args:
+            event (str): event name
+            value (int): number of events
+        '''
+
+        if not self.enabled:
+            return
+
+        with self.lock:
+            self.events[event] = self.events.get(event, 0) + value
+
+    def flush(self) -> None:
+        ''' Block until all recorded turns are exported '''
+
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self) -> None:
+        ''' Export the recorded turns and stop the writer thread '''
+
+        if self.thread is None or not self.thread.is_alive():
+            return
+
+        self.queue.put(None)
+        self.thread.join()
+
+    def percentiles(self) -> dict[str, dict[float, float]]:
+        ''' Returns the rolling quantiles of each stage {stage: {0.5: seconds, ...}} '''
+
+        with self.lock:
+            return {stage: self._quantiles(samples) for stage, samples in self.samples.items()}
+
+    def prometheus_text(self) -> str:
+        ''' Returns the metrics in Prometheus text exposition format '''
+
+        with self.lock:
+            return self._prometheus_text()
+
+    def _run(self) -> None:
+        ''' Writer thread: export the turns recorded since the last write, in one go '''
+
+        while True:
+            turns = [self.queue.get()]
+
+            # a burst of turns is written with one open and one metrics rewrite
+            while True:
+                try:
+                    turns.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in turns
+            self._export([turn for turn in turns if turn is not None])
+
+            for _ in turns:
+                self.queue.task_done()
+
+            if stop:
+                break
+
+    def _export(self, turns: list[dict]) -> None:
+        ''' Append turns to the json lines file and rewrite the Prometheus file '''
+
+        try:
+            if self.jsonl_path and turns:
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(turn) + '\n' for turn in turns)
+
+            if self.prometheus_path:
+                text = self.prometheus_text()
+                temp_path = f'{self.prometheus_path}.tmp'
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(temp_path, self.prometheus_path)
+
+        except OSError as e:
+            LOG.error(f'Error exporting turn traces: {e}')
+
+    def _add_sample(self, stage: str, duration: float) -> None:
+        ''' Add a stage duration to the rolling window and totals '''
+
+        if stage not in self.samples:
+            self.samples[stage] = deque(maxlen=self.window)
+            self.sums[stage] = 0.0
+            self.counts[stage] = 0
+
+        self.samples[stage].append(duration)
+        self.sums[stage] += duration
+        self.counts[stage] += 1
+
+    @staticmethod
+    def _quantiles(samples: deque) -> dict[float, float]:
+        ''' Nearest-rank quantiles of a list of durations '''
+
+        values = sorted(samples)
+        return {q: values[max(0, math.ceil(q * len(values)) - 1)] for q in QUANTILES}
+
+    def _prometheus_text(self) -> str:
+        ''' Format the metrics, the lock must be held '''
+
+        lines = [
+            f'# HELP ai_chatbot_stage_seconds Latency of the chat pipeline stages, quantiles over the last {self.window} samples.',
+            '# TYPE ai_chatbot_stage_seconds summary',
+        ]
+
+        for stage in sorted(self.samples):
+            for q, value in self._quantiles(self.samples[stage]).items():
+                lines.append(f'ai_chatbot_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'ai_chatbot_stage_seconds_sum{{stage="{stage}"}} {self.sums[stage]:.6f}')
+            lines.append(f'ai_chatbot_stage_seconds_count{{stage="{stage}"}} {self.counts[stage]}')
+
+        lines += [
+            '# HELP ai_chatbot_turns_total Chat turns by status.',
+            '# TYPE ai_chatbot_turns_total counter',
+        ]
+        for status in sorted(self.turns):
+            lines.append(f'ai_chatbot_turns_total{{status="{status}"}} {self.turns[status]}')
+
+        lines += [
+            '# HELP ai_chatbot_tokens_total Tokens of the model calls by kind (prompt, cached and uncached prompt tokens).',
+            '# TYPE ai_chatbot_tokens_total counter',
+        ]
+        for kind in sorted(self.tokens):
+            lines.append(f'ai_chatbot_tokens_total{{kind="{kind}"}} {self.tokens[kind]}')
+
+        lines += [
+            '# HELP ai_chatbot_events_total Events of the chat pipeline, like retried, timed out and hedged LLM calls.',
+            '# TYPE ai_chatbot_events_total counter',
+        ]
+        for event in sorted(self.events):
+            lines.append(f'ai_chatbot_events_total{{event="{event}"}} {self.events[event]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def current_turn() -> TurnTrace | NullTurn:
+    ''' Returns the trace of the turn being processed, a no-op one if none or tracing is off '''
+    return CURRENT_TURN.get() or NULL_TURN
+
+
+# tracer shared by all modules
+TRACER = Tracer(
+    enabled=config['tracing'],
+    jsonl_path=Path(__file__).parent / Path(config['tracing_jsonl']) if config['tracing_jsonl'] else None,
+    prometheus_path=Path(__file__).parent / Path(config['tracing_prometheus']) if config['tracing_prometheus'] else None,
+    window=config['tracing_window'],
+)
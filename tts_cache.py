@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: tts_cache.py
+Description: Content-addressed cache for synthesized speech, with an in-memory LRU in front of an on-disk store.
+Example: key = TtsCache.make_key(text, voice, rate, volume, pitch); audio = cache.get(key)
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import os
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+
+class TtsCache:
+    '''
+    Stores encoded audio data by key. Entries are kept in memory and on disk, both
+    bounded in size. The least recently used entries are evicted first.
+    '''
+
+    def __init__(self, cache_dir: str, max_memory_bytes: int, max_disk_bytes: int) -> None:
+        '''Create class instance
+
+        Args:
+            cache_dir (str): directory where audio files are stored
+            max_memory_bytes (int): maximum size of the in-memory cache
+            max_disk_bytes (int): maximum size of the on-disk cache
+        '''
+
+        self.cache_dir = Path(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        # key -> audio data, least recently used first
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+
+        # key -> file size, least recently used first (restored from file modification times)
+        files = sorted(self.cache_dir.glob('*.mp3'), key=lambda f: f.stat().st_mtime)
+        self.disk = OrderedDict((f.stem, f.stat().st_size) for f in files)
+        self.disk_bytes = sum(self.disk.values())
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+
+        # synthesis and pre-rendering can run on different threads
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate: str, volume: str, pitch: str) -> str:
+        '''Return a key identifying the audio generated from text with the given voice settings.
+
+        Args:
+            text (str): text to synthesize
+            voice (str): edge_tts voice name
+            rate (str): speech rate
+            volume (str): speech volume
+            pitch (str): speech pitch
+
+        Return:
+            (str): sha256 digest
+        '''
+
+        content = '\x1f'.join([text.strip(), voice, rate, volume, pitch])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        '''Return cached audio data, looking in memory first and then on disk.
+
+        Args:
+            key (str): cache key
+
+        Return:
+            (bytes | None): audio data or None if not cached
+        '''
+
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                # audio served from memory is in use, it must not be the first evicted from disk
+                if key in self.disk:
+                    self._touch(key)
+                self.hits += 1
+                return self.memory[key]
+
+            if key in self.disk:
+                try:
+                    data = self._path(key).read_bytes()
+                except OSError as e:
+                    LOG.warning(f'Error reading cached audio {key}: {e}')
+                    self._remove_from_disk(key)
+                else:
+                    # mark as recently used and promote to memory
+                    self._touch(key)
+                    self._add_to_memory(key, data)
+                    self.hits += 1
+                    return data
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        '''Add audio data to the cache.
+
+        Args:
+            key (str): cache key
+            data (bytes): audio data
+        '''
+
+        with self.lock:
+            self._add_to_memory(key, data)
+
+            if key in self.disk or len(data) > self.max_disk_bytes:
+                return
+
+            # write to a temp file first so a crash never leaves a truncated entry
+            path = self._path(key)
+            temp_path = path.with_suffix('.tmp')
+            try:
+                temp_path.write_bytes(data)
+                os.replace(temp_path, path)
+            except OSError as e:
+                LOG.warning(f'Error writing cached audio {key}: {e}')
+                return
+
+            self.disk[key] = len(data)
+            self.disk_bytes += len(data)
+
+            while self.disk_bytes > self.max_disk_bytes:
+                self._remove_from_disk(next(iter(self.disk)))
+
+    def stats(self) -> dict:
+        ''' Return cache counters and sizes '''
+
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_entries': len(self.memory),
+                'memory_bytes': self.memory_bytes,
+                'disk_entries': len(self.disk),
+                'disk_bytes': self.disk_bytes,
+            }
+
+    def _path(self, key: str) -> Path:
+        ''' Return the file path of a cache entry '''
+        return self.cache_dir / f'{key}.mp3'
+
+    def _touch(self, key: str) -> None:
+        ''' Mark a disk entry as recently used, its file modification time keeps the order across restarts '''
+
+        self.disk.move_to_end(key)
+
+        try:
+            os.utime(self._path(key))
+        except OSError as e:
+            LOG.warning(f'Error touching cached audio {key}: {e}')
+
+    def _add_to_memory(self, key: str, data: bytes) -> None:
+        ''' Add an entry to memory and evict least recently used entries above the size limit '''
+
+        if len(data) > self.max_memory_bytes:
+            return
+
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _remove_from_disk(self, key: str) -> None:
+        ''' Delete an entry from disk '''
+
+        self.disk_bytes -= self.disk.pop(key)
+
+        try:
+            os.remove(self._path(key))
+        except OSError as e:
+            LOG.warning(f'Error deleting cached audio {key}: {e}')
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Filename: tts_pipeline.py
+Description: Producer/consumer pipeline splitting an answer into sentences, synthesizing sentence N+1 while sentence N is playing.
+Example: pipeline = TtsPipeline(synthesize, play).start(); await pipeline.feed(chunk); await pipeline.close(); await pipeline.join()
+Author: @alexdjulin
+Date: 2026-10-17
+"""
+
+import re
+import asyncio
+from time import perf_counter
+from pathlib import Path
+from typing import Any, Callable
+from async_utils import run_in_daemon_thread
+from tracing import current_turn
+# logger
+from logger import get_logger
+LOG = get_logger(Path(__file__).stem)
+
+# a sentence ends on punctuation followed by a white space (decimals like 3.5 are not split)
+SENTENCE_END = re.compile(r'(?<=[.!?;:…])\s+')
+
+
+class SentenceSplitter:
+    '''
+    Accumulates text chunks and returns sentences as soon as they are complete.
+    '''
+
+    def __init__(self) -> None:
+        ''' Create class instance '''
+        self.buffer = ''
+
+    def feed(self, chunk: str) -> list[str]:
+        '''Add a text chunk and return the sentences completed by it.
+
+        Args:
+            chunk (str): text chunk, as streamed by the LLM
+
+        Return:
+            (list[str]): complete sentences, in order
+        '''
+
+        self.buffer += chunk
+        parts = SENTENCE_END.split(self.buffer)
+        # last part is an incomplete sentence, keep it for the next chunk
+        self.buffer = parts.pop()
+
+        return [part.strip() for part in parts if part.strip()]
+
+    def flush(self) -> list[str]:
+        '''Return the remaining text as a last sentence and empty the buffer.
+
+        Return:
+            (list[str]): last sentence if any
+        '''
+
+        sentence, self.buffer = self.buffer.strip(), ''
+        return [sentence] if sentence else []
+
+
+def truncate_sentence(sentence: str, fraction: float) -> str:
+    '''Returns the beginning of a sentence, cut at a word boundary. Used to estimate
+    what was said when playback is interrupted.
+
+    Args:
+        sentence (str): full sentence
+        fraction (float): fraction of the sentence audio that was played, from 0 to 1
+
+    Return:
+        (str): words spoken
+    '''
+
+    words = sentence.split()
+    return ' '.join(words[:round(len(words) * fraction)])
+
+
+class TtsPipeline:
+    '''
+    Synthesizes and plays sentences as two asyncio tasks linked by bounded queues, so the
+    next sentence is synthesized while the current one is playing. Sentences are played
+    in order. Blocking synthesis and playback calls run on daemon threads.
+
+    The synthesizer and audio sink are pluggable callables, so any TTS engine or
+    audio output (or a local stand-in) can drive the pipeline.
+    '''
+
+    def __init__(
+        self,
+        synthesize: Callable[[str], Any],
+        play: Callable[[Any], float | None],
+        on_sentence: Callable[[str, int], None] = None,
+        max_pending: int = 2,
+        stop: Callable[[], float | None] = None,
+        close: Callable[[], None] = None
+    ) -> None:
+        '''Create class instance
+
+        Args:
+            synthesize (Callable[[str], Any]): returns audio data from a sentence
+            play (Callable[[Any], float | None]): plays audio data and blocks until done, may return the fraction played
+            on_sentence (Callable[[str, int], None]): optional callback with sentence and index, called when it starts playing
+            max_pending (int): maximum number of sentences waiting in each queue
+            stop (Callable[[], float | None]): optional callback interrupting playback from another thread, may return the fraction played
+            close (Callable[[], None]): optional callback releasing the audio output once the last sentence is played
+        '''
+
+        self.synthesize = synthesize
+        self.play = play
+        self.on_sentence = on_sentence
+        self.max_pending = max_pending
+        self.stop = stop
+        self.close_output = close
+
+        self.splitter = SentenceSplitter()
+        self.text_queue = None
+        self.audio_queue = None
+        self.tasks = []
+
+        # sentences played so far, the last one cut if playback was interrupted
+        self.spoken = []
+        self.playing = False
+
+        # timings
+        self.start_time = None
+        self.first_audio_latency = None
+
+    def start(self) -> 'TtsPipeline':
+        ''' Start synthesis and playback tasks. Must be called from a running event loop. '''
+
+        self.text_queue = asyncio.Queue(maxsize=self.max_pending)
+        self.audio_queue = asyncio.Queue(maxsize=self.max_pending)
+
+        self.start_time = perf_counter()
+        self.tasks = [
+            asyncio.create_task(self._synthesize_worker()),
+            asyncio.create_task(self._play_worker()),
+        ]
+
+        return self
+
+    async def feed(self, chunk: str) -> None:
+        '''Add a text chunk to the pipeline. Complete sentences are sent to synthesis.
+
+        Args:
+            chunk (str): text chunk
+        '''
+
+        for sentence in self.splitter.feed(chunk):
+            await self.text_queue.put(sentence)
+
+    async def close(self) -> None:
+        ''' Send the remaining text to synthesis and signal the end of the answer '''
+
+        for sentence in self.splitter.flush():
+            await self.text_queue.put(sentence)
+
+        await self.text_queue.put(None)
+
+    async def join(self) -> None:
+        ''' Wait until all sentences have been played '''
+
+        await asyncio.gather(*self.tasks)
+
+        if self.first_audio_latency is not None:
+            LOG.debug(f'Time to first audio: {self.first_audio_latency:.3f}s')
+
+    def cancel(self) -> None:
+        ''' Stop synthesis and playback, sentences left in the queues are dropped '''
+
+        for task in self.tasks:
+            task.cancel()
+
+        if self.stop:
+            # playback runs on a thread, cancelling the task does not interrupt it
+            fraction = self.stop()
+            if self.playing and fraction is not None:
+                self.spoken[-1] = truncate_sentence(self.spoken[-1], fraction)
+            self.playing = False
+
+    def spoken_text(self) -> str:
+        ''' Returns the text played so far '''
+        return ' '.join(sentence for sentence in self.spoken if sentence)
+
+    async def _synthesize_worker(self) -> None:
+        ''' Producer: synthesize sentences in order and queue the audio data '''
+
+        while (sentence := await self.text_queue.get()) is not None:
+            try:
+                with current_turn().span('tts'):
+                    audio = await run_in_daemon_thread(self.synthesize, sentence)
+            except Exception as e:
+                LOG.error(f"Error generating audio for '{sentence}': {e}")
+                audio = None
+            # waits if playback is too far behind
+            await self.audio_queue.put((sentence, audio))
+
+        await self.audio_queue.put(None)
+
+    async def _play_worker(self) -> None:
+        ''' Consumer: play audio data in order '''
+
+        while (item := await self.audio_queue.get()) is not None:
+            sentence, audio = item
+
+            if self.first_audio_latency is None:
+                self.first_audio_latency = perf_counter() - self.start_time
+
+            if self.on_sentence:
+                self.on_sentence(sentence, len(self.spoken))
+            self.spoken.append(sentence)
+
+            if audio is None:
+                # synthesis failed, text was printed only
+                continue
+
+            current_turn().mark('first_audio')
+
+            # stays set if this task is cancelled while playing (barge-in while the turn waits
+            # on join), so cancel knows the last sentence is cut and truncates it
+            self.playing = True
+            try:
+                with current_turn().span('playback'):
+                    fraction = await run_in_daemon_thread(self.play, audio)
+            except Exception as e:
+                LOG.error(f'Error playing audio: {e}')
+                self.playing = False
+                continue
+
+            self.playing = False
+
+            if fraction is not None and fraction < 1:
+                # playback was stopped during the sentence
+                self.spoken[-1] = truncate_sentence(sentence, fraction)
+
+        if self.close_output:
+            # the output stays open between sentences, release it after the last one
+            await run_in_daemon_thread(self.close_output)